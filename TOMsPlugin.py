@@ -56,7 +56,8 @@ from qgis.core import (
 from .core.proposalsManager import TOMsProposalsManager
 
 from .expressions import registerFunctions, unregisterFunctions
-from .restrictionTypeUtilsClass import TOMSLayers
+from .core.TOMsDisplayGeometryRenderer import registerRenderer, unregisterRenderer
+from .restrictionTypeUtilsClass import TOMSLayers, Logger
 from .proposals_panel import proposalsPanel
 
 import os.path
@@ -95,6 +96,9 @@ class TOMs:
             if qVersion() > '4.3.3':
                 QCoreApplication.installTranslator(self.translator)
 
+        # Set up log file and collect any relevant messages
+        self.logger = Logger(self.iface)
+
         # Declare instance attributes
         self.actions = []   # ?? check - assume it initialises array of actions
         
@@ -137,6 +141,7 @@ class TOMs:
         """Create the menu entries and toolbar icons inside the QGIS GUI."""
         QgsMessageLog.logMessage("Registering expression functions ... ", tag="TOMs panel")
         registerFunctions()   # Register the Expression functions that we need
+        registerRenderer()
 
         #layerNames = TOMSLayers(self.iface)
         #self.proposalsManager = TOMsProposalsManager(self.iface, layerNames)
@@ -203,6 +208,7 @@ class TOMs:
         """Removes the plugin menu item and icon from QGIS GUI."""
 
         unregisterFunctions()  # unregister all the Expression functions used
+        unregisterRenderer()
 
         # Remove TOMs menu
         """self.menu = self.iface.mainWindow().findChild( QMenu, 'TOMs' )
@@ -231,6 +237,9 @@ class TOMs:
 
         QgsMessageLog.logMessage("Unload comnpleted ... ", tag="TOMs panel")
 
+        # write any outstanding log messages
+        self.logger.close()
+
     def hideMenusToolbars(self):
         ''' Remove the menus and toolbars that we don't want (e.g., the Edit menu)
             There should be a more elegant way to do this by checking the collection of menu items and removing certain ones.
@@ -47,6 +47,11 @@ class RestrictionGeometryTypes(object):
     OUTLINE_BAY_POLYGON = 28
     CROSSOVER = 35
 
+class DisplayLevelOfDetail(object):
+    FULL = 0
+    SIMPLIFIED = 1      # polygons simplified; zig-zags and echelon bays shown as the kerb (offset) line
+    KERB_LINE = 2       # as SIMPLIFIED, with all line shapes shown as the kerb (offset) line
+
 def singleton(myClass):
     # From https://www.youtube.com/watch?v=6IV_FYx6MQA
     instances = {}
@@ -0,0 +1,413 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Recalculates the derived attributes (AzimuthToRoadCentreLine, RoadName, USRN, CPZ, ParkingTariffArea) for all the
+restrictions - e.g., after the road centre line or road casement data has been refreshed.
+
+The reference layers are read once into indexes (see TOMsDerivedAttributes). The restrictions are then read in fid
+order and passed, in chunks, to worker processes. The results for each chunk are written with a single
+changeAttributeValues call, i.e., within one transaction, and the last GeometryID written is recorded in the checkpoint file
+(if given) so that an interrupted run can be resumed. With dryRun, nothing is written and the differences are only
+reported (in diffFile).
+
+From the Python console, e.g.,
+
+    from TOMs.core.TOMsBulkRecompute import TOMsBulkRecompute
+    TOMsBulkRecompute().run(dryRun=True, diffFile="/tmp/derived.csv")
+"""
+
+from qgis.core import (
+    NULL,
+    QgsExpression,
+    QgsFeatureRequest,
+    QgsProject,
+    QgsVectorDataProvider,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+
+import os
+import sys
+import csv
+import json
+import collections
+import multiprocessing
+import concurrent.futures
+
+from ..generateGeometryUtils import generateGeometryUtils
+from .TOMsNearestFeature import TOMsNearestSegmentIndex, TOMsCentreLineIndex, TOMsRoadNameResolver
+from .TOMsZoneIndex import TOMsZoneAttributeIndex, TOMsZoneLocator
+from .TOMsZonePolygonIndex import ZonePolygonIndex
+from .TOMsDerivedAttributes import (
+    AZIMUTH_FIELD,
+    DerivedAttributeIndexes,
+    computeChunk,
+    initWorker,
+    computeWorkerChunk
+)
+from .TOMsDisplayGeometryMaterialiser import TOMsDisplayGeometryMaterialiser
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsBulkRecompute():
+
+    RESTRICTION_LAYERS = ["Bays", "Lines", "Signs", "RestrictionPolygons"]
+
+    # zone layer: restriction field
+    ZONE_FIELDS = {"CPZs": "CPZ",
+                   "ParkingTariffAreas": "ParkingTariffArea"
+                   }
+
+    # as setDefaultRestrictionDetails - the tariff area is only held for bays
+    PTA_LAYERS = ["Bays"]
+
+    DEFAULT_CHUNK_SIZE = 500
+
+    def __init__(self, chunkSize=DEFAULT_CHUNK_SIZE, workers=None):
+        """ workers is the number of worker processes (default: nr of cpus). With 0, all is done within this process """
+
+        self.chunkSize = chunkSize
+        self.workers = workers if workers is not None else max(1, (os.cpu_count() or 1) - 1)
+
+    def run(self, layerNames=None, dryRun=False, diffFile=None, checkpointFile=None, feedback=None):
+        """ Returns {layer name: nr of restrictions changed}
+
+            diffFile (csv): layer, fid, GeometryID, field, current value, new value - for each value changed
+            feedback (QgsFeedback): progress and cancellation
+        """
+
+        if layerNames is None:
+            layerNames = self.RESTRICTION_LAYERS
+
+        checkpoint = self.loadCheckpoint(checkpointFile) if not dryRun else dict()
+
+        indexes = self.buildIndexes()
+        TOMsLog.info("In TOMsBulkRecompute.run. fields available: {}", indexes.availableFields)
+
+        layers = []
+        for layerName in layerNames:
+            projectLayers = QgsProject.instance().mapLayersByName(layerName)
+            if len(projectLayers) == 0:
+                TOMsLog.warning("In TOMsBulkRecompute.run. layer not found: {}", layerName)
+                continue
+            layers.append(projectLayers[0])
+
+        # restriction layers are filtered by date/proposal. Need all the features here
+        unfilteredLayers = dict()
+        total = 0
+        for layer in layers:
+            unfilteredLayer = QgsVectorLayer(layer.source(), layer.name(), layer.providerType())
+            unfilteredLayer.setSubsetString('')
+            unfilteredLayers[layer.id()] = unfilteredLayer
+            total = total + unfilteredLayer.featureCount()
+
+        diffWriter = None
+        diffOutput = None
+        if diffFile is not None:
+            diffOutput = open(diffFile, 'w', newline='')
+            diffWriter = csv.writer(diffOutput)
+            diffWriter.writerow(["Layer", "fid", "GeometryID", "Field", "CurrentValue", "NewValue"])
+
+        pool = self.startPool(indexes)
+
+        nrChanged = dict()
+        progress = Progress(total, feedback)
+
+        try:
+            for layer in layers:
+                if progress.isCanceled():
+                    break
+                nrChanged[layer.name()] = self.recomputeLayer(layer, unfilteredLayers[layer.id()], indexes, pool,
+                                                              dryRun, diffWriter, checkpoint, checkpointFile, progress)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=not progress.isCanceled())
+            if diffOutput is not None:
+                diffOutput.close()
+
+        if not dryRun and not progress.isCanceled() and checkpointFile is not None and os.path.exists(checkpointFile):
+            # finished - a later run starts from the beginning
+            os.remove(checkpointFile)
+
+        TOMsLog.info("In TOMsBulkRecompute.run. changed: {} dryRun: {}", nrChanged, dryRun)
+
+        return nrChanged
+
+    def derivedFields(self, layer, indexes):
+        """ The fields to be recalculated for the restriction layer """
+
+        fields = []
+        for field in indexes.availableFields():
+            if layer.fields().indexFromName(field) < 0:
+                continue
+            if field == AZIMUTH_FIELD and layer.geometryType() != QgsWkbTypes.LineGeometry:
+                continue
+            if field == self.ZONE_FIELDS["ParkingTariffAreas"] and layer.name() not in self.PTA_LAYERS:
+                continue
+            fields.append(field)
+
+        return fields
+
+    def recomputeLayer(self, layer, unfilteredLayer, indexes, pool, dryRun, diffWriter, checkpoint, checkpointFile, progress):
+
+        fields = self.derivedFields(layer, indexes)
+        if len(fields) == 0:
+            return 0
+
+        lastGeometryID = checkpoint.get(layer.name())
+        TOMsLog.info("In TOMsBulkRecompute.recomputeLayer: {} fields: {} resuming after: {}", layer.name(), fields, lastGeometryID)
+
+        provider = unfilteredLayer.dataProvider()
+        if not dryRun and not (provider.capabilities() & QgsVectorDataProvider.ChangeAttributeValues):
+            TOMsLog.warning("In TOMsBulkRecompute.recomputeLayer: {} cannot be changed", layer.name())
+            return 0
+
+        fieldIdxs = dict((field, unfilteredLayer.fields().indexFromName(field)) for field in fields)
+
+        # in GeometryID order - fids are numbered by the provider (in fetch order for a varchar key), so can't be used to resume
+        request = QgsFeatureRequest()
+        request.setSubsetOfAttributes(["GeometryID"] + fields, unfilteredLayer.fields())
+        request.addOrderBy('"GeometryID"')
+
+        if lastGeometryID is not None:
+            resumeFilter = '"GeometryID" > {}'.format(QgsExpression.quotedValue(lastGeometryID))
+            request.setFilterExpression(resumeFilter)
+
+            doneRequest = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([])
+            doneRequest.setFilterExpression('NOT ({})'.format(resumeFilter))
+            progress.add(sum(1 for currFeature in unfilteredLayer.getFeatures(doneRequest)))
+
+        nrChanged = 0
+        pending = collections.deque()     # (future or results, {GeometryID: (fid, current values)})
+        maxPending = max(1, self.workers) * 2
+
+        def completeChunk():
+            nonlocal nrChanged
+            results, currentValues = pending.popleft()
+            if isinstance(results, concurrent.futures.Future):
+                results = results.result()
+            nrChanged = nrChanged + self.writeChunk(layer, provider, fieldIdxs, results, currentValues,
+                                                    dryRun, diffWriter)
+            if not dryRun and len(results) > 0:
+                checkpoint[layer.name()] = results[-1][0]
+                self.saveCheckpoint(checkpointFile, checkpoint)
+            progress.add(len(results))
+
+        records = []
+        currentValues = dict()
+
+        for currFeature in unfilteredLayer.getFeatures(request):
+            if progress.isCanceled():
+                break
+
+            geometryID = currFeature.attribute("GeometryID")
+            azimuthPt, testPt = self.testPoints(currFeature)
+            records.append((geometryID, azimuthPt, testPt))
+            currentValues[geometryID] = (currFeature.id(),
+                                         dict((field, self.value(currFeature.attribute(field))) for field in fields))
+
+            if len(records) >= self.chunkSize:
+                pending.append((self.submit(pool, indexes, fields, records), currentValues))
+                records = []
+                currentValues = dict()
+                while len(pending) >= maxPending:
+                    completeChunk()
+
+        if len(records) > 0 and not progress.isCanceled():
+            pending.append((self.submit(pool, indexes, fields, records), currentValues))
+
+        while len(pending) > 0 and not progress.isCanceled():
+            completeChunk()
+
+        if not dryRun and nrChanged > 0:
+            layer.reload()
+            layer.triggerRepaint()
+
+        return nrChanged
+
+    def submit(self, pool, indexes, fields, records):
+        if pool is None:
+            return computeChunk(indexes, fields, records)
+        return pool.submit(computeWorkerChunk, fields, records)
+
+    def writeChunk(self, layer, provider, fieldIdxs, results, currentValues, dryRun, diffWriter):
+        """ Write the values that have changed (as one changeAttributeValues call). Returns the nr of restrictions changed """
+
+        changes = dict()     # fid (of the provider written to): {field idx: value}
+        geometryIDs = []
+
+        for (geometryID, values) in results:
+            fid, current = currentValues[geometryID]
+            for (field, value) in values.items():
+                if self.isSame(current.get(field), value):
+                    continue
+                if fid not in changes:
+                    geometryIDs.append(geometryID)
+                changes.setdefault(fid, dict())[fieldIdxs[field]] = value
+                if diffWriter is not None:
+                    diffWriter.writerow([layer.name(), fid, geometryID, field, current.get(field), value])
+
+        if len(changes) == 0 or dryRun:
+            return len(changes)
+
+        if not provider.changeAttributeValues(changes):
+            raise RuntimeError("Problem changing {}: {}".format(layer.name(), provider.errors()))
+
+        # keep the companion layers in line (the changes do not pass through the layer's edit buffer). The display
+        # geometry cache is keyed on the attributes used, so the layer.reload() that follows is enough there
+        TOMsDisplayGeometryMaterialiser().materialiseLayer(layer, geometryIDs)
+
+        return len(changes)
+
+    @staticmethod
+    def testPoints(currFeature):
+        """ Returns (point used for the azimuth, point used for the road name and zones) - as (x, y) """
+
+        geom = currFeature.geometry()
+        if geom is None or geom.isNull():
+            return None, None
+
+        if geom.type() == QgsWkbTypes.LineGeometry:
+            line = generateGeometryUtils.getLineForAz(currFeature)
+            if not line:
+                return None, None
+            centroid = geom.centroid().asPoint()
+            return (centroid.x(), centroid.y()), (line[0].x(), line[0].y())
+
+        if geom.type() == QgsWkbTypes.PointGeometry:
+            pt = geom.asMultiPoint()[0] if geom.isMultipart() else geom.asPoint()
+            return None, (pt.x(), pt.y())
+
+        if geom.type() == QgsWkbTypes.PolygonGeometry:
+            ring = geom.asMultiPolygon()[0][0] if geom.isMultipart() else geom.asPolygon()[0]
+            return None, (ring[0].x(), ring[0].y())
+
+        return None, None
+
+    @staticmethod
+    def value(value):
+        return None if value == NULL else value
+
+    @staticmethod
+    def isSame(current, new):
+        if current is None or new is None:
+            return current is None and new is None
+        if isinstance(new, (int, float)) and isinstance(current, (int, float)):
+            return float(current) == float(new)
+        return str(current) == str(new)
+
+    def buildIndexes(self):
+
+        indexes = DerivedAttributeIndexes()
+
+        centreLineLayer = self.referenceLayer(TOMsCentreLineIndex.LAYER_NAME)
+        if centreLineLayer is not None:
+            indexes.centreLines, attributeValues = TOMsNearestSegmentIndex.readLayer(centreLineLayer, [])
+
+        casementLayer = self.referenceLayer(TOMsRoadNameResolver.LAYER_NAME)
+        if casementLayer is not None:
+            indexes.casement, attributeValues = TOMsNearestSegmentIndex.readLayer(casementLayer, TOMsRoadNameResolver.ATTRIBUTES)
+            indexes.casementAttributes = dict((fid, dict((attribute, self.value(value)) for (attribute, value) in values.items()))
+                                              for (fid, values) in attributeValues.items())
+
+        for (zoneLayerName, field) in self.ZONE_FIELDS.items():
+            zoneLayer = self.referenceLayer(zoneLayerName)
+            if zoneLayer is not None:
+                indexes.zones[field] = self.buildZones(zoneLayer, TOMsZoneAttributeIndex.ZONE_LAYERS[zoneLayerName][0])
+
+        return indexes
+
+    @staticmethod
+    def buildZones(zoneLayer, keyField):
+        """ Returns (ZonePolygonIndex keyed by fid, {fid: value of keyField}) - as held by TOMsZoneLocator """
+
+        zoneIndex = ZonePolygonIndex()
+        zoneValues = dict()
+
+        request = QgsFeatureRequest().setSubsetOfAttributes([keyField], zoneLayer.fields())
+        for zone in zoneLayer.getFeatures(request):
+            zoneIndex.addZone(zone.id(), TOMsZoneLocator.zonePolygons(zone.geometry()))
+            zoneValues[zone.id()] = TOMsBulkRecompute.value(zone.attribute(keyField))
+
+        return zoneIndex, zoneValues
+
+    @staticmethod
+    def referenceLayer(layerName):
+        layers = QgsProject.instance().mapLayersByName(layerName)
+        if len(layers) == 0:
+            TOMsLog.warning("In TOMsBulkRecompute. layer not found: {}", layerName)
+            return None
+        return layers[0]
+
+    def startPool(self, indexes):
+
+        if self.workers == 0:
+            return None
+
+        try:
+            context = multiprocessing.get_context("spawn")
+            pythonExecutable = self.pythonExecutable()
+            if pythonExecutable is None:
+                TOMsLog.warning("In TOMsBulkRecompute.startPool. python not found - running without worker processes")
+                return None
+            context.set_executable(pythonExecutable)
+            return concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                          initializer=initWorker, initargs=(indexes,))
+        except (OSError, ValueError) as e:
+            TOMsLog.warning("In TOMsBulkRecompute.startPool. running without worker processes: {}", e)
+            return None
+
+    @staticmethod
+    def pythonExecutable():
+        # within QGIS, sys.executable is (usually) QGIS itself rather than python
+
+        if os.path.basename(sys.executable).lower().startswith("python"):
+            return sys.executable
+
+        for name in ["python3", "python", "python3.exe", "python.exe"]:
+            for directory in [sys.exec_prefix, os.path.join(sys.exec_prefix, "bin")]:
+                candidate = os.path.join(directory, name)
+                if os.path.isfile(candidate):
+                    return candidate
+
+        return None
+
+    @staticmethod
+    def loadCheckpoint(checkpointFile):
+        if checkpointFile is None or not os.path.exists(checkpointFile):
+            return dict()
+        with open(checkpointFile) as f:
+            return json.load(f)
+
+    @staticmethod
+    def saveCheckpoint(checkpointFile, checkpoint):
+        if checkpointFile is None:
+            return
+        with open(checkpointFile + ".tmp", 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(checkpointFile + ".tmp", checkpointFile)
+
+
+class Progress():
+
+    def __init__(self, total, feedback=None):
+        self.total = total
+        self.done = 0
+        self.feedback = feedback
+
+    def add(self, nr):
+        self.done = self.done + nr
+        if self.feedback is not None and self.total > 0:
+            self.feedback.setProgress(100.0 * self.done / self.total)
+
+    def isCanceled(self):
+        return self.feedback is not None and self.feedback.isCanceled()
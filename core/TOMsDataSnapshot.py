@@ -0,0 +1,212 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Data used by the TOMs expression functions - for use from render threads.
+
+The snapshot holds a copy of the project parameters and the layers (lookup tables, zones, road centre line and
+casement) found when it was built on the main thread, so that render threads don't need to refer to the project. It is
+not a frozen copy of the data: lookups, zones and road names are forwarded to the shared indexes (TOMsLookupCache,
+TOMsZoneAttributeIndex, TOMsZoneLocator, TOMsCentreLineIndex and TOMsRoadNameResolver). These are watched from the main
+thread when the snapshot is built, are safe to use from any thread and keep themselves up to date as the layers change,
+so a render sees the data as it is when read. A new snapshot replaces the current one when the parameters change or
+layers are added/removed. Results derived from the data are not held here (see generateGeometryUtils.getMemoisedLabelText).
+"""
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QThread,
+    QTimer
+)
+
+from qgis.core import (
+    QgsProject
+)
+
+from ..restrictionTypeUtilsClass import Singleton, TOMsParamsSnapshot
+from .TOMsLookupCache import TOMsLookupCache
+from .TOMsZoneIndex import TOMsZoneAttributeIndex, TOMsZoneLocator
+from .TOMsNearestFeature import TOMsCentreLineIndex, TOMsRoadNameResolver
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsDataSnapshot():
+
+    LOOKUP_LAYERS = ["TimePeriods", "LengthOfTime", "RestrictionTypes", "BayLineTypes", "SignTypes", "RestrictionPolygonTypes"]
+    ZONE_LAYERS = TOMsZoneAttributeIndex.ZONE_LAYERS
+    CENTRE_LINE_LAYER = TOMsCentreLineIndex.LAYER_NAME
+    CASEMENT_LAYER = TOMsRoadNameResolver.LAYER_NAME
+
+    def __init__(self, params, layers, version):
+        """ params: {param: value}, layers: {layer name: layer} - see build """
+
+        self.__params = dict(params)
+        self.__layers = dict(layers)
+        self.__version = version
+
+    def version(self):
+        return self.__version
+
+    @classmethod
+    def allLayerNames(cls):
+        return cls.LOOKUP_LAYERS + list(cls.ZONE_LAYERS.keys()) + [cls.CENTRE_LINE_LAYER, cls.CASEMENT_LAYER]
+
+    @classmethod
+    def build(cls, version):
+        """ Build a snapshot - and watch its layers within the shared indexes. Main thread only """
+
+        layers = dict()
+
+        for name in cls.allLayerNames():
+            projectLayers = QgsProject.instance().mapLayersByName(name)
+            if len(projectLayers) == 0:
+                continue
+            layer = projectLayers[0]
+
+            if name in cls.LOOKUP_LAYERS:
+                watched = TOMsLookupCache().watchLayer(layer)
+            elif name in cls.ZONE_LAYERS:
+                watched = TOMsZoneAttributeIndex().watchLayer(layer) and TOMsZoneLocator().watchLayer(layer)
+            elif name == cls.CENTRE_LINE_LAYER:
+                watched = TOMsCentreLineIndex().watchLayer(layer)
+            else:
+                watched = TOMsRoadNameResolver().watchLayer(layer)
+
+            if watched:
+                layers[name] = layer
+
+        TOMsLog.debug("In TOMsDataSnapshot.build. version {}: {}", version, list(layers.keys()))
+
+        return cls(TOMsParamsSnapshot().params(), layers, version)
+
+    def hasLayer(self, layerName):
+        return layerName in self.__layers
+
+    def param(self, param):
+        return self.__params.get(param)
+
+    def lookupLabelText(self, layerName, code):
+        if layerName not in self.__layers:
+            return None
+        return TOMsLookupCache().getLabelText(self.__layers[layerName], code)
+
+    def lookupDescription(self, layerName, code):
+        if layerName not in self.__layers:
+            return None
+        return TOMsLookupCache().getDescription(self.__layers[layerName], code)
+
+    def zoneAttributes(self, layerName, zoneKey):
+        if layerName not in self.__layers:
+            return None
+        return TOMsZoneAttributeIndex().getZoneAttributes(layerName, zoneKey, self.__layers[layerName])
+
+    def findZone(self, layerName, point):
+        """ Returns the zone (QgsFeature) containing point (QgsPointXY) - or None """
+
+        if layerName not in self.__layers:
+            return None
+        return TOMsZoneLocator().findZone(self.__layers[layerName], point)
+
+    def azimuthToCentreLine(self, testPt):
+        """ As TOMsCentreLineIndex.azimuthToCentreLine - None if the centre lines are not in the snapshot """
+
+        if self.CENTRE_LINE_LAYER not in self.__layers:
+            return None
+        return TOMsCentreLineIndex().azimuthToCentreLine(testPt)
+
+    def cachedRoadName(self, geom):
+        return TOMsRoadNameResolver().cachedRoadName(geom)
+
+    def roadNameAt(self, testPt, tolerance, geom=None):
+        """ As TOMsRoadNameResolver.roadNameAt - None if the road casement is not in the snapshot """
+
+        if self.CASEMENT_LAYER not in self.__layers:
+            return None
+        return TOMsRoadNameResolver().roadNameAt(testPt, tolerance, geom)
+
+
+class TOMsDataSnapshotManager(metaclass=Singleton):
+    """ Holds the current TOMsDataSnapshot and replaces it when the parameters change or its layers are removed """
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsDataSnapshotManager.init ...")
+
+        self.__snapshot = None
+        self.__version = 0
+        self.__watchedLayers = dict()  # layer id: (layer name, layer)
+        self.__rebuildTimer = None
+
+    def current(self):
+        """ Returns the current snapshot (or None if TOMs is not active). Safe to call from any thread """
+        return self.__snapshot
+
+    def __isMainThread(self):
+        return QThread.currentThread() == QCoreApplication.instance().thread()
+
+    def activate(self):
+        """ Build the snapshot and watch the layers it is built from. Main thread only """
+
+        if not self.__isMainThread():
+            return False
+
+        if self.__rebuildTimer is None:
+            self.__rebuildTimer = QTimer()
+            self.__rebuildTimer.setSingleShot(True)
+            self.__rebuildTimer.setInterval(0)   # changes made together are picked up in one rebuild
+            self.__rebuildTimer.timeout.connect(self.rebuild)
+            QgsProject.instance().customVariablesChanged.connect(self.scheduleRebuild)
+
+        for layerName in TOMsDataSnapshot.allLayerNames():
+            for layer in QgsProject.instance().mapLayersByName(layerName):
+                self.watchLayer(layerName, layer)
+
+        self.rebuild()
+        return True
+
+    def deactivate(self):
+        # the layers stay watched (changes are ignored while there is no snapshot)
+
+        if self.__rebuildTimer is not None:
+            self.__rebuildTimer.stop()
+
+        self.__snapshot = None
+
+    def watchLayer(self, layerName, layer):
+
+        layerId = layer.id()
+        if layerId in self.__watchedLayers:
+            return
+
+        self.__watchedLayers[layerId] = (layerName, layer)
+
+        # changes to the data are picked up by the shared indexes
+        layer.willBeDeleted.connect(lambda: self.forgetLayer(layerId))
+
+    def forgetLayer(self, layerId):
+        self.__watchedLayers.pop(layerId, None)
+        self.scheduleRebuild()
+
+    def scheduleRebuild(self):
+
+        if self.__snapshot is None:
+            return   # not active
+
+        self.__rebuildTimer.start()
+
+    def rebuild(self):
+        """ Replace the current snapshot. Main thread only """
+
+        self.__version += 1
+        # a single assignment, so readers see either the old or the new snapshot
+        self.__snapshot = TOMsDataSnapshot.build(self.__version)
+
+        return self.__snapshot
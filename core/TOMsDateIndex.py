@@ -0,0 +1,361 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+In memory index of the open/close dates of the restrictions within each restriction layer.
+
+A restriction is current at a date D if "OpenDate" <= D AND ("CloseDate" > D OR "CloseDate" IS NULL). The restrictions
+current at a date only change at the open/close dates, so the date filters can use the last of these on or before the
+chosen date ("effective date"). Moving the date within a period without changes then gives the same filter - and the
+layers are not reloaded (see TOMsProposalsManager.updateMapCanvas).
+
+The index is built from an unfiltered copy of the layer and keyed on "RestrictionID" (the fids of the copy are not those
+of the layer - see TOMsFeatureKeys). Edits are applied as they are made - using the edit signals, which are also emitted
+for the layers within the TOMs transaction group (where the committed* signals are not). The index is read again after a
+commit, rollback or reload of the layer and each time the filters are set (see TOMsProposalsManager.updateMapCanvas), so
+that the changes committed by other users are included.
+"""
+
+import datetime
+import functools
+
+from bisect import bisect_right
+
+from qgis.PyQt.QtCore import (
+    QDate,
+    QDateTime
+)
+
+from qgis.core import (
+    NULL,
+    QgsFeatureRequest,
+    QgsVectorLayer
+)
+
+from ..restrictionTypeUtilsClass import Singleton
+from .TOMsFeatureKeys import TOMsFeatureKeys
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class RestrictionIntervals(object):
+    """ Open/close dates (datetime.date) of the restrictions within a layer, by RestrictionID. Sorted arrays are built when first queried after a change """
+
+    def __init__(self):
+        self.__intervals = dict()   # RestrictionID: (OpenDate, CloseDate)
+        self.__openDates = None     # sorted OpenDates ...
+        self.__openKeys = None      # ... and the corresponding RestrictionIDs
+        self.__changeDates = None   # sorted open and close dates ...
+        self.__changeKeys = None    # ... and the corresponding RestrictionIDs
+
+    def __len__(self):
+        return len(self.__intervals)
+
+    def interval(self, restrictionID):
+        return self.__intervals.get(restrictionID)
+
+    def setInterval(self, restrictionID, openDate, closeDate):
+        self.__intervals[restrictionID] = (openDate, closeDate)
+        self.__openDates = None
+
+    def remove(self, restrictionID):
+        if self.__intervals.pop(restrictionID, None) is not None:
+            self.__openDates = None
+
+    def clear(self):
+        self.__intervals = dict()
+        self.__openDates = None
+
+    @staticmethod
+    def isCurrent(interval, date):
+        (openDate, closeDate) = interval
+        return openDate is not None and openDate <= date and (closeDate is None or closeDate > date)
+
+    def __build(self):
+
+        if self.__openDates is not None:
+            return
+
+        opens = sorted((openDate, key) for (key, (openDate, closeDate)) in self.__intervals.items()
+                       if openDate is not None)
+        self.__openDates = [openDate for (openDate, key) in opens]
+        self.__openKeys = [key for (openDate, key) in opens]
+
+        changes = sorted([(openDate, key) for (openDate, key) in opens] +
+                         [(closeDate, key) for (key, (openDate, closeDate)) in self.__intervals.items()
+                          if closeDate is not None])
+        self.__changeDates = [changeDate for (changeDate, key) in changes]
+        self.__changeKeys = [key for (changeDate, key) in changes]
+
+    def currentAt(self, date):
+        """ Returns [RestrictionID] for the restrictions current at date """
+
+        self.__build()
+
+        currentRestrictions = []
+        for key in self.__openKeys[:bisect_right(self.__openDates, date)]:
+            closeDate = self.__intervals[key][1]
+            if closeDate is None or closeDate > date:
+                currentRestrictions.append(key)
+
+        return currentRestrictions
+
+    def changedBetween(self, fromDate, toDate):
+        """ Returns ([RestrictionID] current at toDate but not fromDate, [RestrictionID] current at fromDate but not toDate) """
+
+        self.__build()
+
+        (firstDate, lastDate) = sorted([fromDate, toDate])
+        keys = set(self.__changeKeys[bisect_right(self.__changeDates, firstDate):bisect_right(self.__changeDates, lastDate)])
+
+        opened = []
+        closed = []
+        for key in keys:
+            interval = self.__intervals[key]
+            currentAtFrom = self.isCurrent(interval, fromDate)
+            currentAtTo = self.isCurrent(interval, toDate)
+            if currentAtTo and not currentAtFrom:
+                opened.append(key)
+            elif currentAtFrom and not currentAtTo:
+                closed.append(key)
+
+        return (opened, closed)
+    def effectiveDate(self, date):
+        """ The last open/close date on or before date, i.e., the restrictions current at both dates are the same """
+
+        self.__build()
+
+        if not self.__changeDates:
+            return date
+
+        position = bisect_right(self.__changeDates, date)
+        if position == 0:
+            # nothing is current before the first change
+            return self.__changeDates[0] - datetime.timedelta(days=1)
+
+        return self.__changeDates[position - 1]
+
+
+class TOMsRestrictionDateIndex(metaclass=Singleton):
+
+    FIELDS = ["RestrictionID", "OpenDate", "CloseDate"]
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsRestrictionDateIndex.init ...")
+
+        self.__layers = dict()       # layer id: (restriction layer, unfiltered copy of restriction layer)
+        self.__featureKeys = dict()  # layer id: TOMsFeatureKeys (RestrictionID for the fids of the restriction layer)
+        self.__intervals = dict()    # layer id: RestrictionIntervals (None when to be read again)
+        self.__connections = dict()  # layer id: [(signal, slot)]
+
+    def watchLayer(self, layer):
+        """ Index the open/close dates of the restriction layer and keep them current """
+
+        if layer is None or layer.id() in self.__layers:
+            return
+
+        for field in self.FIELDS:
+            if layer.fields().indexFromName(field) < 0:
+                return
+
+        TOMsLog.debug("In TOMsRestrictionDateIndex.watchLayer: {}", layer.name)
+
+        # the restriction layers are filtered by date/proposal. Need all the features for the index
+        unfilteredLayer = QgsVectorLayer(layer.source(), layer.name(), layer.providerType())
+        unfilteredLayer.setSubsetString('')
+
+        layerId = layer.id()
+        featureKeys = TOMsFeatureKeys(layer, "RestrictionID")
+        self.__layers[layerId] = (layer, unfilteredLayer)
+        self.__featureKeys[layerId] = featureKeys
+        self.__intervals[layerId] = None
+
+        self.__connections[layerId] = [(layer.featureAdded, functools.partial(self.onFeatureChanged, layerId)),
+                                       (layer.attributeValueChanged, functools.partial(self.onAttributeValueChanged, layerId)),
+                                       (layer.featureDeleted, functools.partial(self.onFeatureDeleted, layerId)),
+                                       (layer.afterCommitChanges, functools.partial(self.invalidate, layerId)),
+                                       (layer.afterRollBack, functools.partial(self.invalidate, layerId)),
+                                       (layer.dataSourceChanged, functools.partial(self.invalidate, layerId)),
+                                       # reloaded - e.g., to show changes committed by other users
+                                       (layer.dataProvider().dataChanged, functools.partial(self.invalidate, layerId))
+                                       ] + featureKeys.connections()
+        for (signal, slot) in self.__connections[layerId]:
+            signal.connect(slot)
+
+    def unwatchLayers(self):
+
+        for connections in self.__connections.values():
+            for (signal, slot) in connections:
+                try:
+                    signal.disconnect(slot)
+                except (TypeError, RuntimeError):
+                    # layer already removed
+                    pass
+
+        self.__layers = dict()
+        self.__featureKeys = dict()
+        self.__intervals = dict()
+        self.__connections = dict()
+
+    def invalidate(self, layerId=None):
+        """ Read the layer (or all the layers if layerId is None) again when next required """
+
+        TOMsLog.debug("In TOMsRestrictionDateIndex.invalidate {}", layerId)
+        for currLayerId in self.__intervals:
+            if layerId is None or currLayerId == layerId:
+                self.__intervals[currLayerId] = None
+
+    def refresh(self):
+        """ Read the layers again when next required, e.g., to include the changes committed by other users. The layers
+            being edited are kept, as the unfiltered copies do not see the changes made within the transaction.
+        """
+
+        for (layerId, (layer, unfilteredLayer)) in self.__layers.items():
+            if not layer.isEditable():
+                self.__intervals[layerId] = None
+
+    def intervals(self, layer):
+        """ Returns the RestrictionIntervals for the layer (None if it is not indexed) """
+
+        if layer is None or layer.id() not in self.__layers:
+            return None
+
+        if self.__intervals[layer.id()] is None:
+            self.__load(layer.id())
+
+        return self.__intervals[layer.id()]
+
+    def restrictionsAtDate(self, layer, filterDate):
+        """ Returns [RestrictionID] for the restrictions current at filterDate (QDate) - or None if the layer is not indexed """
+
+        intervals = self.intervals(layer)
+        if intervals is None:
+            return None
+
+        return intervals.currentAt(filterDate.toPyDate())
+
+    def effectiveDate(self, layer, filterDate):
+        """ The date (QDate) to use within the filter for the layer. Gives the same restrictions as filterDate """
+
+        intervals = self.intervals(layer)
+        if intervals is None:
+            return filterDate
+
+        return QDate(intervals.effectiveDate(filterDate.toPyDate()))
+
+    @staticmethod
+    def toDate(value):
+
+        if value is None or value == NULL:
+            return None
+        if isinstance(value, QDateTime):
+            value = value.date()
+        if isinstance(value, QDate):
+            return value.toPyDate() if value.isValid() else None
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date):
+            return value
+
+        value = QDate.fromString(str(value)[:10], 'yyyy-MM-dd')
+        return value.toPyDate() if value.isValid() else None
+
+    def __setFeature(self, intervals, feature):
+
+        restrictionID = TOMsFeatureKeys.value(feature.attribute("RestrictionID"))
+        if restrictionID is None:
+            return
+
+        intervals.setInterval(restrictionID,
+                              self.toDate(feature.attribute("OpenDate")),
+                              self.toDate(feature.attribute("CloseDate")))
+
+    def __load(self, layerId):
+
+        (layer, unfilteredLayer) = self.__layers[layerId]
+
+        TOMsLog.debug("In TOMsRestrictionDateIndex.__load: {}", layer.name)
+
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(self.FIELDS, unfilteredLayer.fields())
+
+        intervals = RestrictionIntervals()
+        for currFeature in unfilteredLayer.getFeatures(request):
+            self.__setFeature(intervals, currFeature)
+
+        self.__intervals[layerId] = intervals
+
+    def onFeatureChanged(self, layerId, fid):
+        """ Feature added (within the edit buffer or - for a transaction group - the database) """
+
+        intervals = self.__intervals.get(layerId)
+        if intervals is None:
+            return
+
+        (layer, unfilteredLayer) = self.__layers[layerId]
+
+        # read through the edited layer - the unfiltered copy does not see edits within a transaction
+        request = QgsFeatureRequest(fid).setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(self.FIELDS, layer.fields())
+        for currFeature in layer.getFeatures(request):
+            self.__featureKeys[layerId].setKey(fid, currFeature.attribute("RestrictionID"))
+            self.__setFeature(intervals, currFeature)
+            return
+
+        # excluded by the layer's filter - read everything again when next required
+        self.invalidate(layerId)
+
+    def onAttributeValueChanged(self, layerId, fid, idx, value):
+
+        intervals = self.__intervals.get(layerId)
+        if intervals is None:
+            return
+
+        (layer, unfilteredLayer) = self.__layers[layerId]
+        fieldName = layer.fields().at(idx).name()
+        if fieldName not in self.FIELDS:
+            return
+
+        featureKeys = self.__featureKeys[layerId]
+        if fieldName == "RestrictionID":
+            restrictionID = featureKeys.remove(fid)
+            if restrictionID is not None:
+                intervals.remove(restrictionID)
+            self.onFeatureChanged(layerId, fid)
+            return
+
+        restrictionID = featureKeys.key(fid)
+        interval = intervals.interval(restrictionID) if restrictionID is not None else None
+        if interval is None:
+            # not known - read everything again when next required
+            self.invalidate(layerId)
+            return
+
+        (openDate, closeDate) = interval
+        if fieldName == "OpenDate":
+            openDate = self.toDate(value)
+        else:
+            closeDate = self.toDate(value)
+
+        intervals.setInterval(restrictionID, openDate, closeDate)
+
+    def onFeatureDeleted(self, layerId, fid):
+
+        intervals = self.__intervals.get(layerId)
+        if intervals is None:
+            return
+
+        restrictionID = self.__featureKeys[layerId].remove(fid)
+        if restrictionID is None:
+            self.invalidate(layerId)
+            return
+
+        intervals.remove(restrictionID)
@@ -0,0 +1,134 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Attributes derived from the reference layers - AzimuthToRoadCentreLine, RoadName/USRN, CPZ and ParkingTariffArea -
+calculated from plain coordinates, as generateGeometryUtils does for a single restriction (setAzimuthToRoadCentreLine,
+setRoadName, getCurrentCPZDetails, getCurrentPTADetails).
+
+No QGIS objects are used, so that the indexes can be pickled and the calculations run in worker processes (see
+TOMsBulkRecompute). The nearest line and zone lookups use the same indexes (SegmentGridIndex,
+ZonePolygonIndex) as TOMsCentreLineIndex, TOMsRoadNameResolver and TOMsZoneLocator.
+"""
+
+import math
+
+AZIMUTH_FIELD = "AzimuthToRoadCentreLine"
+ROAD_NAME_FIELDS = ["RoadName", "USRN"]
+
+TOLERANCE_ROADWIDTH = 25
+
+def azimuthToNearestLine(segmentIndex, x, y, tolerance=TOLERANCE_ROADWIDTH):
+    """ Azimuth from (x, y) to the nearest point on the nearest line (SegmentGridIndex) within the box of size tolerance
+        around it - 0 if there isn't one
+    """
+
+    nearest = segmentIndex.nearestInBox(x, y, tolerance)
+    if nearest is None:
+        return 0
+
+    distance, (nearestX, nearestY), key = nearest
+    return math.degrees(math.atan2(nearestX - x, nearestY - y))
+
+def roadNameAt(segmentIndex, attributeValues, x, y, tolerance):
+    """ Returns (StreetName, USRN) for the casement (SegmentGridIndex, {key: {attribute: value}}) nearest to (x, y)
+        within the box of size tolerance around it - (None, None) if there isn't one
+    """
+
+    nearest = segmentIndex.nearestInBox(x, y, tolerance)
+    if nearest is None:
+        return None, None
+
+    distance, nearestPt, key = nearest
+    attributes = attributeValues.get(key, dict())
+    return attributes.get("StreetName"), attributes.get("USRN")
+
+
+class DerivedAttributeIndexes():
+    """ The indexes needed to derive the attributes. Any of them may be None if the reference layer is not available """
+
+    TOLERANCE_NEARBY = 5.0
+
+    def __init__(self, centreLines=None, casement=None, casementAttributes=None, zones=None):
+        self.centreLines = centreLines                      # SegmentGridIndex
+        self.casement = casement                            # SegmentGridIndex
+        self.casementAttributes = casementAttributes or dict()  # casement key: {"StreetName": ..., "USRN": ...}
+        self.zones = zones or dict()                        # restriction field (e.g., "CPZ"): (ZonePolygonIndex, {zone key: value})
+
+    def availableFields(self):
+        fields = []
+        if self.centreLines is not None:
+            fields.append(AZIMUTH_FIELD)
+        if self.casement is not None:
+            fields.extend(ROAD_NAME_FIELDS)
+        fields.extend(self.zones.keys())
+        return fields
+
+    def azimuthToCentreLine(self, x, y):
+        # as TOMsCentreLineIndex.azimuthToCentreLine
+        return azimuthToNearestLine(self.centreLines, x, y)
+
+    def roadName(self, x, y):
+        # as TOMsRoadNameResolver.roadNameAt
+        return roadNameAt(self.casement, self.casementAttributes, x, y, self.TOLERANCE_NEARBY)
+
+    def zoneValue(self, field, x, y):
+        # as TOMsZoneLocator.findZone - the value for the zone with the lowest key (fid)
+
+        zoneIndex, zoneValues = self.zones[field]
+        key = zoneIndex.findZone(x, y)
+        if key is None:
+            return None
+        return zoneValues.get(key)
+
+    def derivedAttributes(self, fields, azimuthPt, testPt):
+        """ Returns {field: value} for the fields that can be derived for the restriction
+
+            azimuthPt is the point used for the azimuth (the centroid of a line - None for other geometry types) and
+            testPt the point used for the road name and zones (the first vertex).
+        """
+
+        values = dict()
+
+        if AZIMUTH_FIELD in fields and azimuthPt is not None and self.centreLines is not None:
+            values[AZIMUTH_FIELD] = int(self.azimuthToCentreLine(*azimuthPt))
+
+        if testPt is None:
+            return values
+
+        if self.casement is not None and any(field in fields for field in ROAD_NAME_FIELDS):
+            streetName, USRN = self.roadName(*testPt)
+            # as setRoadName - the existing values are kept if no road is found
+            if streetName:
+                for (field, value) in zip(ROAD_NAME_FIELDS, (streetName, USRN)):
+                    if field in fields:
+                        values[field] = value
+
+        for field in self.zones:
+            if field in fields:
+                values[field] = self.zoneValue(field, *testPt)
+
+        return values
+
+
+def computeChunk(indexes, fields, records):
+    """ records is a list of (key, azimuthPt, testPt), e.g., with the GeometryID as key. Returns [(key, {field: value})] """
+    return [(key, indexes.derivedAttributes(fields, azimuthPt, testPt)) for (key, azimuthPt, testPt) in records]
+
+# within worker processes, the indexes are passed once (when the process starts) rather than with each chunk
+
+workerIndexes = None
+
+def initWorker(indexes):
+    global workerIndexes
+    workerIndexes = indexes
+
+def computeWorkerChunk(fields, records):
+    return computeChunk(workerIndexes, fields, records)
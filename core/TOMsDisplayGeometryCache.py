@@ -0,0 +1,200 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Cache for the display geometries generated by ElementGeometryFactory.
+
+The geometry generator expressions (generate_display_geometry / generateDisplayGeometry) are evaluated for every
+feature on every repaint. The generated shape only depends on the feature geometry, a few attributes and the project
+parameters, so the result is kept (bounded, least recently used first out) and only regenerated when one of these changes.
+The level of detail (see generateGeometryUtils.getDisplayLevelOfDetail) is part of the key, so the simplified shapes
+used at smaller scales are held alongside the full ones.
+
+"""
+
+from qgis.core import (
+    QgsMessageLog,
+    QgsGeometry
+)
+
+from collections import OrderedDict
+import threading
+
+from ..constants import DisplayLevelOfDetail
+from ..restrictionTypeUtilsClass import Singleton, TOMsParamsSnapshot
+from .TOMsGeometryElement import ElementGeometryFactory
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+DEFAULT_MAX_ENTRIES = 50000
+
+class TOMsDisplayGeometryCache(metaclass=Singleton):
+
+    # attributes (in addition to the geometry) that determine the generated shape
+    KEY_ATTRIBUTES = ["GeomShapeID",
+                      "AzimuthToRoadCentreLine",
+                      "NrBays",
+                      "BayOrientation"
+                      ]
+
+    def __init__(self, maxEntries=DEFAULT_MAX_ENTRIES):
+
+        TOMsLog.debug("In TOMsDisplayGeometryCache.init ...")
+
+        self.maxEntries = maxEntries
+
+        self.__lock = threading.Lock()
+        self.__geometries = OrderedDict()
+        self.__keysForFeature = dict()
+        self.__paramsVersion = None
+
+        self.__watchedLayers = []
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def getElementGeometry(self, currFeature, levelOfDetail=DisplayLevelOfDetail.FULL):
+        """ Returns the display geometry for the feature - generating it only if it is not already held """
+
+        paramsVersion = TOMsParamsSnapshot().version()
+        if paramsVersion != self.__paramsVersion:
+            # parameters (e.g., BayWidth) have changed. All shapes need to be regenerated
+            self.clear()
+            self.__paramsVersion = paramsVersion
+
+        key = self.__featureKey(currFeature, paramsVersion, levelOfDetail)
+
+        with self.__lock:
+            geometry = self.__geometries.get(key)
+            if geometry is not None:
+                self.__geometries.move_to_end(key)
+                self.__hits += 1
+                return QgsGeometry(geometry)
+            self.__misses += 1
+
+        geometry = ElementGeometryFactory.getElementGeometry(currFeature, levelOfDetail)
+
+        if isinstance(geometry, QgsGeometry):
+            self.__addGeometry(currFeature.id(), key, geometry)
+            return QgsGeometry(geometry)
+
+        return geometry
+
+    def __addGeometry(self, fid, key, geometry):
+
+        with self.__lock:
+            self.__geometries[key] = QgsGeometry(geometry)
+            self.__geometries.move_to_end(key)
+            self.__keysForFeature.setdefault(fid, set()).add(key)
+
+            while len(self.__geometries) > self.maxEntries:
+                (oldKey, _) = self.__geometries.popitem(last=False)
+                self.__discardKeyForFeature(oldKey)
+                self.__evictions += 1
+
+    def __discardKeyForFeature(self, key):
+        fid = key[0]
+        keys = self.__keysForFeature.get(fid)
+        if keys is not None:
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.__keysForFeature[fid]
+
+    def __featureKey(self, currFeature, paramsVersion, levelOfDetail):
+        # feature id + geometry + relevant attributes + project params (version) + level of detail
+
+        geom = currFeature.geometry()
+        geomHash = hash(bytes(geom.asWkb())) if geom else None
+
+        fields = currFeature.fields()
+        attributeValues = []
+        for attributeName in self.KEY_ATTRIBUTES:
+            idx = fields.indexFromName(attributeName)
+            if idx >= 0:
+                attributeValues.append(str(currFeature.attribute(idx)))
+            else:
+                attributeValues.append(None)
+
+        return (currFeature.id(), geomHash, tuple(attributeValues), paramsVersion, levelOfDetail)
+
+    def watchLayer(self, layer):
+        """ Remove generated geometries when the underlying feature is changed """
+
+        if layer is None or layer in self.__watchedLayers:
+            return
+
+        TOMsLog.debug("In TOMsDisplayGeometryCache.watchLayer: {}", layer.name)
+
+        layer.geometryChanged.connect(self.onGeometryChanged)
+        layer.attributeValueChanged.connect(self.onAttributeValueChanged)
+        layer.featureDeleted.connect(self.invalidateFeature)
+
+        self.__watchedLayers.append(layer)
+
+    def unwatchLayers(self):
+
+        for layer in self.__watchedLayers:
+            try:
+                layer.geometryChanged.disconnect(self.onGeometryChanged)
+                layer.attributeValueChanged.disconnect(self.onAttributeValueChanged)
+                layer.featureDeleted.disconnect(self.invalidateFeature)
+            except (TypeError, RuntimeError):
+                # layer already removed
+                pass
+
+        self.__watchedLayers = []
+        self.clear()
+
+    def onGeometryChanged(self, fid, geometry):
+        self.invalidateFeature(fid)
+
+    def onAttributeValueChanged(self, fid, idx, value):
+        self.invalidateFeature(fid)
+
+    def invalidateFeature(self, fid):
+
+        with self.__lock:
+            for key in self.__keysForFeature.pop(fid, set()):
+                self.__geometries.pop(key, None)
+
+    def clear(self):
+
+        TOMsLog.debug("In TOMsDisplayGeometryCache.clear. {}", self.statistics)
+
+        with self.__lock:
+            self.__geometries.clear()
+            self.__keysForFeature.clear()
+
+    def hits(self):
+        return self.__hits
+
+    def misses(self):
+        return self.__misses
+
+    def statistics(self):
+        """ Returns the counters - used to check the effectiveness of the cache """
+
+        requests = self.__hits + self.__misses
+        hitRate = float(self.__hits) / requests if requests > 0 else 0.0
+
+        return {"entries": len(self.__geometries),
+                "maxEntries": self.maxEntries,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+                "hitRate": hitRate
+                }
+
+    def resetStatistics(self):
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
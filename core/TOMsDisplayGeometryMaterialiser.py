@@ -0,0 +1,376 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Writes the display geometry (ElementGeometryFactory output) for restriction layers into companion layers.
+
+For a restriction layer, e.g., "Bays", the generated lines are written to "Bays_DisplayLines" and the generated
+polygons to "Bays_DisplayPolygons". The companion layers hold a copy of the restriction attributes, so that they can be
+styled, labelled and filtered in the same way as the restriction layer - but using stored geometry, i.e., without any
+Python within the render loop. The companion rows are keyed on "GeometryID" (fids are only meaningful for the provider
+that gave them - see TOMsFeatureKeys).
+
+The companion layers need to be present within the project (e.g., tables alongside the restriction tables, styled in
+place of the restriction layers). Restriction layers without them are not materialised. The companion layers are
+rebuilt when they are empty or were generated with different project parameters, and are then kept current using the
+changes committed to the restriction layer. The restriction layers are edited within the TOMs transaction group, where
+the committed* signals are not emitted, so the changed features are collected from the edit signals and applied once
+the changes are committed (afterCommitChanges).
+
+Materialisation is switched on with the project variable "MaterialiseDisplayGeometry".
+"""
+
+import functools
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+
+from ..restrictionTypeUtilsClass import Singleton, TOMsParamsSnapshot
+from .TOMsGeometryElement import ElementGeometryFactory
+from .TOMsFeatureKeys import TOMsFeatureKeys
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsDisplayGeometryMaterialiser(metaclass=Singleton):
+
+    DISPLAY_LAYER_SUFFIXES = {QgsWkbTypes.LineGeometry: "_DisplayLines",
+                              QgsWkbTypes.PolygonGeometry: "_DisplayPolygons"
+                              }
+
+    KEY_FIELD = "GeometryID"
+
+    # project parameters used to generate the geometries. Stored with the companion layers.
+    PARAMS_PROPERTY = "TOMs/DisplayGeometryParams"
+    GEOMETRY_PARAMS = ["BayWidth",
+                       "BayLength",
+                       "BayOffsetFromKerb",
+                       "LineOffsetFromKerb",
+                       "CrossoverShapeWidth"
+                       ]
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsDisplayGeometryMaterialiser.init ...")
+
+        self.__sourceLayers = dict()     # layer id: (restriction layer, unfiltered copy of restriction layer)
+        self.__featureKeys = dict()      # layer id: TOMsFeatureKeys (GeometryID for the fids of the restriction layer)
+        self.__displayLayers = dict()    # layer id: {geometry type: companion layer}
+        self.__displayKeys = dict()      # layer id: {GeometryID: [(geometry type, companion fid)]}
+        self.__pendingKeys = dict()      # layer id: (changed GeometryIDs, deleted GeometryIDs) - to be applied on commit
+        self.__pendingRebuild = set()    # layer ids with changes to features that could not be identified
+        self.__connections = dict()      # layer id: [(signal, slot)]
+
+        QgsProject.instance().customVariablesChanged.connect(self.onParamsChanged)
+
+    def isEnabled(self):
+        return str(TOMsParamsSnapshot().param("MaterialiseDisplayGeometry")).lower() in ["1", "true", "yes"]
+
+    def currentParams(self):
+        params = TOMsParamsSnapshot()
+        return str([(param, params.param(param)) for param in self.GEOMETRY_PARAMS])
+
+    def watchLayer(self, layer):
+        """ Keep the companion layers for the restriction layer current """
+
+        if layer is None or layer.id() in self.__sourceLayers or not self.isEnabled():
+            return
+
+        displayLayers = self.__getDisplayLayers(layer)
+        if len(displayLayers) == 0:
+            TOMsLog.info("In TOMsDisplayGeometryMaterialiser.watchLayer: no companion layers for {}", layer.name)
+            return
+
+        TOMsLog.debug("In TOMsDisplayGeometryMaterialiser.watchLayer: {}", layer.name)
+
+        # the restriction layers are filtered by date/proposal. Need all the features to generate the companion layers
+        unfilteredLayer = QgsVectorLayer(layer.source(), layer.name(), layer.providerType())
+        unfilteredLayer.setSubsetString('')
+
+        layerId = layer.id()
+        featureKeys = TOMsFeatureKeys(layer, self.KEY_FIELD)
+        self.__sourceLayers[layerId] = (layer, unfilteredLayer)
+        self.__featureKeys[layerId] = featureKeys
+        self.__displayLayers[layerId] = displayLayers
+        self.__displayKeys[layerId] = self.__loadDisplayKeys(layerId)
+        self.__pendingKeys[layerId] = (set(), set())
+
+        if self.__needsRebuild(layerId):
+            self.materialiseLayer(layer)
+
+        self.__connections[layerId] = [(layer.featureAdded, functools.partial(self.onFeatureChanged, layerId)),
+                                       (layer.geometryChanged, functools.partial(self.onFeatureChanged, layerId)),
+                                       (layer.attributeValueChanged, functools.partial(self.onAttributeValueChanged, layerId)),
+                                       (layer.featureDeleted, functools.partial(self.onFeatureDeleted, layerId)),
+                                       (layer.committedFeaturesAdded, self.onCommittedFeaturesAdded),
+                                       (layer.afterCommitChanges, functools.partial(self.applyPendingChanges, layerId)),
+                                       (layer.afterRollBack, functools.partial(self.discardPendingChanges, layerId))
+                                       ] + featureKeys.connections()
+        for (signal, slot) in self.__connections[layerId]:
+            signal.connect(slot)
+
+    def unwatchLayers(self):
+
+        for connections in self.__connections.values():
+            for (signal, slot) in connections:
+                try:
+                    signal.disconnect(slot)
+                except (TypeError, RuntimeError):
+                    # layer already removed
+                    pass
+
+        self.__sourceLayers = dict()
+        self.__featureKeys = dict()
+        self.__displayLayers = dict()
+        self.__displayKeys = dict()
+        self.__pendingKeys = dict()
+        self.__pendingRebuild = set()
+        self.__connections = dict()
+
+    def displayLayers(self, layer):
+        """ Returns the companion layers for the restriction layer (empty if it is not materialised) """
+        if layer is None:
+            return []
+        return list(self.__displayLayers.get(layer.id(), dict()).values())
+
+    def materialiseLayer(self, layer, geometryIDs=None):
+        """ (Re)generate the display geometry for the restrictions "geometryIDs" of the restriction layer - or all the
+            restrictions if geometryIDs is None
+        """
+
+        if layer.id() not in self.__sourceLayers:
+            return
+
+        (layer, unfilteredLayer) = self.__sourceLayers[layer.id()]
+        displayLayers = self.__displayLayers[layer.id()]
+
+        TOMsLog.debug("In TOMsDisplayGeometryMaterialiser.materialiseLayer: {} GeometryIDs: {}", layer.name, geometryIDs)
+
+        request = QgsFeatureRequest()
+        if geometryIDs is None:
+            for displayLayer in displayLayers.values():
+                self.__withoutFilter(displayLayer, displayLayer.dataProvider().truncate)
+            self.__displayKeys[layer.id()] = dict()
+        else:
+            geometryIDs = list(geometryIDs)
+            self.removeFeatures(layer, geometryIDs)
+            if len(geometryIDs) == 0:
+                return
+            request.setFilterExpression(TOMsFeatureKeys.filterExpression(self.KEY_FIELD, geometryIDs))
+
+        newFeatures = dict()
+        for currFeature in unfilteredLayer.getFeatures(request):
+            geometry = ElementGeometryFactory.getElementGeometry(currFeature)
+            if not isinstance(geometry, QgsGeometry) or geometry.isNull():
+                TOMsLog.debug("In TOMsDisplayGeometryMaterialiser.materialiseLayer: no geometry for {}",
+                              lambda: currFeature.attribute(self.KEY_FIELD))
+                continue
+
+            geometryType = geometry.type()
+            displayLayer = displayLayers.get(geometryType)
+            if displayLayer is None:
+                continue
+
+            newFeatures.setdefault(geometryType, []).append(self.__displayFeature(currFeature, geometry, displayLayer))
+
+        displayKeys = self.__displayKeys[layer.id()]
+        for (geometryType, features) in newFeatures.items():
+            displayLayer = displayLayers[geometryType]
+            status, addedFeatures = displayLayer.dataProvider().addFeatures(features)
+            if not status:
+                TOMsLog.warning("In TOMsDisplayGeometryMaterialiser.materialiseLayer: problem adding features to {}", displayLayer.name)
+                continue
+            for feature in addedFeatures:
+                displayKeys.setdefault(feature[self.KEY_FIELD], []).append((geometryType, feature.id()))
+
+        currentParams = self.currentParams()
+        for displayLayer in displayLayers.values():
+            displayLayer.setCustomProperty(self.PARAMS_PROPERTY, currentParams)
+            displayLayer.triggerRepaint()
+
+    def removeFeatures(self, layer, geometryIDs):
+
+        displayLayers = self.__displayLayers.get(layer.id())
+        displayKeys = self.__displayKeys.get(layer.id())
+        if displayLayers is None:
+            return
+
+        fidsToDelete = dict()
+        for geometryID in geometryIDs:
+            for (geometryType, displayFid) in displayKeys.pop(geometryID, []):
+                fidsToDelete.setdefault(geometryType, []).append(displayFid)
+
+        for (geometryType, displayFidList) in fidsToDelete.items():
+            displayLayer = displayLayers[geometryType]
+            displayLayer.dataProvider().deleteFeatures(displayFidList)
+            displayLayer.triggerRepaint()
+
+    def onFeatureChanged(self, layerId, fid, *args):
+        # includes acceptance of proposals (open/close dates). New features within the edit buffer (negative fids) are
+        # written on commit - see onCommittedFeaturesAdded
+
+        if layerId not in self.__pendingKeys or fid < 0:
+            return
+
+        geometryID = self.__featureKeys[layerId].key(fid)
+        if geometryID is None:
+            self.__pendingRebuild.add(layerId)
+            return
+
+        (changedKeys, deletedKeys) = self.__pendingKeys[layerId]
+        changedKeys.add(geometryID)
+        deletedKeys.discard(geometryID)
+
+    def onAttributeValueChanged(self, layerId, fid, idx, value):
+
+        if layerId not in self.__pendingKeys or fid < 0:
+            return
+
+        (layer, unfilteredLayer) = self.__sourceLayers[layerId]
+        if layer.fields().at(idx).name() == self.KEY_FIELD:
+            # the rows for the previous GeometryID are replaced
+            self.onFeatureDeleted(layerId, fid)
+
+        self.onFeatureChanged(layerId, fid)
+
+    def onFeatureDeleted(self, layerId, fid):
+
+        if layerId not in self.__pendingKeys or fid < 0:
+            return
+
+        geometryID = self.__featureKeys[layerId].remove(fid)
+        if geometryID is None:
+            self.__pendingRebuild.add(layerId)
+            return
+
+        (changedKeys, deletedKeys) = self.__pendingKeys[layerId]
+        changedKeys.discard(geometryID)
+        deletedKeys.add(geometryID)
+
+    def onCommittedFeaturesAdded(self, layerId, addedFeatures):
+        # only emitted when the layer is edited outside a transaction group
+        self.__materialiseKeys(layerId, [feature.attribute(self.KEY_FIELD) for feature in addedFeatures])
+
+    def applyPendingChanges(self, layerId=None):
+        """ Apply the changes committed to the restriction layer (or all the restriction layers if layerId is None) """
+
+        for (currLayerId, (changedKeys, deletedKeys)) in list(self.__pendingKeys.items()):
+            if layerId is not None and currLayerId != layerId:
+                continue
+
+            self.__pendingKeys[currLayerId] = (set(), set())
+
+            if currLayerId in self.__pendingRebuild:
+                self.__pendingRebuild.discard(currLayerId)
+                self.materialiseLayer(self.__sourceLayers[currLayerId][0])
+                continue
+
+            if len(deletedKeys) > 0:
+                self.removeFeatures(self.__sourceLayers[currLayerId][0], deletedKeys)
+            self.__materialiseKeys(currLayerId, list(changedKeys))
+
+    def discardPendingChanges(self, layerId):
+        if layerId in self.__pendingKeys:
+            self.__pendingKeys[layerId] = (set(), set())
+            self.__pendingRebuild.discard(layerId)
+
+    def onParamsChanged(self):
+        """ Regenerate everything if the parameters used to generate the geometry have changed """
+
+        TOMsParamsSnapshot().refresh()
+
+        for (layerId, (layer, unfilteredLayer)) in list(self.__sourceLayers.items()):
+            if self.__needsRebuild(layerId):
+                self.materialiseLayer(layer)
+
+    def __materialiseKeys(self, layerId, geometryIDs):
+        geometryIDs = [geometryID for geometryID in geometryIDs if TOMsFeatureKeys.value(geometryID) is not None]
+        if layerId in self.__sourceLayers and len(geometryIDs) > 0:
+            self.materialiseLayer(self.__sourceLayers[layerId][0], geometryIDs)
+
+    def __needsRebuild(self, layerId):
+
+        if len(self.__displayKeys[layerId]) == 0:
+            return True
+
+        currentParams = self.currentParams()
+        for displayLayer in self.__displayLayers[layerId].values():
+            if displayLayer.customProperty(self.PARAMS_PROPERTY) != currentParams:
+                return True
+
+        return False
+
+    def __getDisplayLayers(self, layer):
+        """ Find the companion layers within the project """
+
+        displayLayers = dict()
+
+        for (geometryType, suffix) in self.DISPLAY_LAYER_SUFFIXES.items():
+            displayLayerName = layer.name() + suffix
+
+            projectLayers = QgsProject.instance().mapLayersByName(displayLayerName)
+            if len(projectLayers) == 0:
+                continue
+
+            if projectLayers[0].fields().indexFromName(self.KEY_FIELD) < 0:
+                TOMsLog.warning("In TOMsDisplayGeometryMaterialiser: {} has no field {}", displayLayerName, self.KEY_FIELD)
+                continue
+
+            displayLayers[geometryType] = projectLayers[0]
+
+        return displayLayers
+
+    def __loadDisplayKeys(self, layerId):
+
+        displayKeys = dict()
+
+        for (geometryType, displayLayer) in self.__displayLayers[layerId].items():
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([self.KEY_FIELD], displayLayer.fields())
+            displayFeatures = self.__withoutFilter(displayLayer, lambda: list(displayLayer.getFeatures(request)))
+            for displayFeature in displayFeatures:
+                displayKeys.setdefault(displayFeature[self.KEY_FIELD], []).append((geometryType, displayFeature.id()))
+
+        return displayKeys
+
+    def __displayFeature(self, currFeature, geometry, displayLayer):
+
+        if QgsWkbTypes.isMultiType(displayLayer.wkbType()):
+            geometry = QgsGeometry(geometry)
+            geometry.convertToMultiType()
+
+        displayFields = displayLayer.fields()
+        sourceFields = currFeature.fields()
+
+        attributes = []
+        for field in displayFields:
+            idx = sourceFields.indexFromName(field.name())
+            attributes.append(currFeature.attribute(idx) if idx >= 0 else None)
+
+        displayFeature = QgsFeature(displayFields)
+        displayFeature.setGeometry(geometry)
+        displayFeature.setAttributes(attributes)
+        return displayFeature
+
+    def __withoutFilter(self, displayLayer, action):
+        # the companion layers carry the same date/proposal filter as the restriction layers. Need to consider all features here
+        subsetString = displayLayer.subsetString()
+        if len(subsetString) > 0:
+            displayLayer.setSubsetString('')
+        try:
+            return action()
+        finally:
+            if len(subsetString) > 0:
+                displayLayer.setSubsetString(subsetString)
@@ -0,0 +1,342 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Renderer that generates the display geometry once for each feature drawn, rather than once for each geometry
+generator symbol layer.
+
+TOMsDisplayGeometryRenderer wraps the renderer from the style (e.g., the rule based renderer in TOMs_Bays.qml). For
+each feature, the display geometry is generated (through TOMsDisplayGeometryCache) and made available to the symbol
+layers as the variable @toms_display_geometry. The geometry generator expressions are converted by TOMsStyleConverter
+to
+
+    coalesce(@toms_display_geometry, generate_display_geometry(...))
+
+so the styles still work without the renderer (e.g., if the project is opened without the plugin). Labels are
+registered after the feature has been drawn, so any label expressions using generate_display_geometry find the
+geometry in the cache.
+
+The renderer is used for the restriction layers when the project variable "UseDisplayGeometryRenderer" is set. It is
+not saved within the project: the wrapped renderer is written in its place (see TOMsStyleConverter.onWriteMapLayer).
+"""
+
+from qgis.core import (
+    QgsApplication,
+    QgsExpressionContextScope,
+    QgsFeatureRenderer,
+    QgsGeometry,
+    QgsGeometryGeneratorSymbolLayer,
+    QgsProject,
+    QgsReadWriteContext,
+    QgsRenderContext,
+    QgsRendererAbstractMetadata,
+    QgsVectorLayer
+)
+
+import re
+import copy
+import xml.etree.ElementTree as ElementTree
+
+from ..restrictionTypeUtilsClass import TOMsParamsSnapshot
+from ..generateGeometryUtils import generateGeometryUtils
+from .TOMsDisplayGeometryCache import TOMsDisplayGeometryCache
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+DISPLAY_GEOMETRY_VARIABLE = "toms_display_geometry"
+
+class TOMsDisplayGeometryRenderer(QgsFeatureRenderer):
+
+    RENDERER_TYPE = "TOMsDisplayGeometryRenderer"
+
+    def __init__(self, embeddedRenderer=None):
+        super().__init__(self.RENDERER_TYPE)
+        self.__embeddedRenderer = None
+        self.setEmbeddedRenderer(embeddedRenderer)
+
+    def embeddedRenderer(self):
+        return self.__embeddedRenderer
+
+    def setEmbeddedRenderer(self, subRenderer):
+        self.__embeddedRenderer = subRenderer
+        if subRenderer is not None:
+            # the layer renderer takes these from this renderer
+            self.setOrderBy(subRenderer.orderBy())
+            self.setOrderByEnabled(subRenderer.orderByEnabled())
+            self.setUsingSymbolLevels(subRenderer.usingSymbolLevels())
+            self.setForceRasterRender(subRenderer.forceRasterRender())
+
+    def clone(self):
+        return TOMsDisplayGeometryRenderer(self.__embeddedRenderer.clone() if self.__embeddedRenderer is not None else None)
+
+    def startRender(self, context, fields):
+        super().startRender(context, fields)
+        self.__embeddedRenderer.startRender(context, fields)
+
+    def stopRender(self, context):
+        self.__embeddedRenderer.stopRender(context)
+        super().stopRender(context)
+
+    def renderFeature(self, feature, context, layer=-1, selected=False, drawVertexMarker=False):
+
+        geometry = None
+        try:
+            geometry = TOMsDisplayGeometryCache().getElementGeometry(
+                feature, generateGeometryUtils.getDisplayLevelOfDetail(context.expressionContext()))
+        except Exception as e:
+            TOMsLog.warning("In TOMsDisplayGeometryRenderer.renderFeature: {} {}", feature.id, e)
+
+        scope = QgsExpressionContextScope()
+        scope.setVariable(DISPLAY_GEOMETRY_VARIABLE, geometry if isinstance(geometry, QgsGeometry) else None, True)
+
+        # the scope is only needed while the symbol layers for this feature are drawn
+        context.expressionContext().appendScope(scope)
+        try:
+            return self.__embeddedRenderer.renderFeature(feature, context, layer, selected, drawVertexMarker)
+        finally:
+            context.expressionContext().popScope()
+
+    def usedAttributes(self, context):
+        # the attributes used to generate the display geometry may not be referenced within the style
+        return set(self.__embeddedRenderer.usedAttributes(context)) | set(TOMsDisplayGeometryCache.KEY_ATTRIBUTES)
+
+    def filterNeedsGeometry(self):
+        return self.__embeddedRenderer.filterNeedsGeometry()
+
+    def filter(self, fields):
+        return self.__embeddedRenderer.filter(fields)
+
+    def capabilities(self):
+        return self.__embeddedRenderer.capabilities()
+
+    def symbols(self, context):
+        return self.__embeddedRenderer.symbols(context)
+
+    def symbolForFeature(self, feature, context):
+        return self.__embeddedRenderer.symbolForFeature(feature, context)
+
+    def originalSymbolForFeature(self, feature, context):
+        return self.__embeddedRenderer.originalSymbolForFeature(feature, context)
+
+    def symbolsForFeature(self, feature, context):
+        return self.__embeddedRenderer.symbolsForFeature(feature, context)
+
+    def originalSymbolsForFeature(self, feature, context):
+        return self.__embeddedRenderer.originalSymbolsForFeature(feature, context)
+
+    def willRenderFeature(self, feature, context):
+        return self.__embeddedRenderer.willRenderFeature(feature, context)
+
+    def legendKeysForFeature(self, feature, context):
+        return self.__embeddedRenderer.legendKeysForFeature(feature, context)
+
+    def legendSymbolItems(self):
+        return self.__embeddedRenderer.legendSymbolItems()
+
+    def legendSymbolItemsCheckable(self):
+        return self.__embeddedRenderer.legendSymbolItemsCheckable()
+
+    def legendSymbolItemChecked(self, key):
+        return self.__embeddedRenderer.legendSymbolItemChecked(key)
+
+    def checkLegendSymbolItem(self, key, state=True):
+        self.__embeddedRenderer.checkLegendSymbolItem(key, state)
+
+    def setLegendSymbolItem(self, key, symbol):
+        self.__embeddedRenderer.setLegendSymbolItem(key, symbol)
+
+    def dump(self):
+        return "{}: {}".format(self.RENDERER_TYPE, self.__embeddedRenderer.dump())
+
+    def save(self, doc, context):
+        element = doc.createElement("renderer-v2")
+        element.setAttribute("type", self.RENDERER_TYPE)
+
+        # read by QgsFeatureRenderer.load (for this renderer), so needed here as well as within the embedded renderer
+        element.setAttribute("symbollevels", "1" if self.usingSymbolLevels() else "0")
+        element.setAttribute("forceraster", "1" if self.forceRasterRender() else "0")
+        element.setAttribute("enableorderby", "1" if self.orderByEnabled() else "0")
+        orderByElement = doc.createElement("orderby")
+        self.orderBy().save(orderByElement)
+        element.appendChild(orderByElement)
+
+        if self.__embeddedRenderer is not None:
+            element.appendChild(self.__embeddedRenderer.save(doc, context))
+        return element
+
+    @classmethod
+    def create(cls, element, context):
+        embeddedElement = element.firstChildElement("renderer-v2")
+        if embeddedElement.isNull():
+            return None
+        return cls(QgsFeatureRenderer.load(embeddedElement, context))
+
+
+class TOMsDisplayGeometryRendererMetadata(QgsRendererAbstractMetadata):
+
+    def __init__(self):
+        super().__init__(TOMsDisplayGeometryRenderer.RENDERER_TYPE, "TOMs display geometry")
+
+    def createRenderer(self, element, context):
+        return TOMsDisplayGeometryRenderer.create(element, context)
+
+
+def registerRenderer():
+    registry = QgsApplication.rendererRegistry()
+    if TOMsDisplayGeometryRenderer.RENDERER_TYPE not in registry.renderersList():
+        registry.addRenderer(TOMsDisplayGeometryRendererMetadata())
+    QgsProject.instance().writeMapLayer.connect(TOMsStyleConverter.onWriteMapLayer)
+
+def unregisterRenderer():
+    try:
+        QgsProject.instance().writeMapLayer.disconnect(TOMsStyleConverter.onWriteMapLayer)
+    except TypeError:
+        # not connected
+        pass
+    QgsApplication.rendererRegistry().removeRenderer(TOMsDisplayGeometryRenderer.RENDERER_TYPE)
+
+
+class TOMsStyleConverter():
+    """ Converts styles (layers or QML files) to use TOMsDisplayGeometryRenderer """
+
+    DISPLAY_GEOMETRY_FUNCTIONS = re.compile(r"^\s*(generate_display_geometry|generateDisplayGeometry)\s*\(.*\)\s*$", re.DOTALL)
+    CONVERTED_PREFIX = "coalesce(@{},".format(DISPLAY_GEOMETRY_VARIABLE)
+
+    @classmethod
+    def convertExpression(cls, expression):
+        """ Returns the converted geometry generator expression - or None if it does not need to be converted """
+
+        if expression is None or expression.replace(" ", "").startswith(cls.CONVERTED_PREFIX):
+            return None
+        if not cls.DISPLAY_GEOMETRY_FUNCTIONS.match(expression):
+            return None
+        return "{} {})".format(cls.CONVERTED_PREFIX, expression.strip())
+
+    @classmethod
+    def convertSymbol(cls, symbol):
+        """ Convert the geometry generator symbol layers within symbol. Returns the nr converted """
+
+        nrConverted = 0
+        if symbol is None:
+            return nrConverted
+
+        for symbolLayer in symbol.symbolLayers():
+            if isinstance(symbolLayer, QgsGeometryGeneratorSymbolLayer):
+                expression = cls.convertExpression(symbolLayer.geometryExpression())
+                if expression is not None:
+                    symbolLayer.setGeometryExpression(expression)
+                    nrConverted = nrConverted + 1
+            nrConverted = nrConverted + cls.convertSymbol(symbolLayer.subSymbol())
+
+        return nrConverted
+
+    @classmethod
+    def convertLayer(cls, layer):
+        """ Wrap the renderer for the layer. Returns True if the layer has been changed """
+
+        renderer = layer.renderer()
+        if renderer is None or renderer.type() == TOMsDisplayGeometryRenderer.RENDERER_TYPE:
+            return False
+
+        embeddedRenderer = renderer.clone()
+        nrConverted = 0
+        for symbol in embeddedRenderer.symbols(QgsRenderContext()):
+            nrConverted = nrConverted + cls.convertSymbol(symbol)
+
+        if nrConverted == 0:
+            return False
+
+        TOMsLog.debug("In TOMsStyleConverter.convertLayer: {} symbol layers converted: {}", layer.name, nrConverted)
+
+        layer.setRenderer(TOMsDisplayGeometryRenderer(embeddedRenderer))
+        layer.triggerRepaint()
+        return True
+
+    @staticmethod
+    def restoreLayer(layer):
+        """ Replace the renderer by the one it wraps (the converted expressions work without it) """
+
+        renderer = layer.renderer()
+        if renderer is None or renderer.type() != TOMsDisplayGeometryRenderer.RENDERER_TYPE:
+            return False
+
+        layer.setRenderer(renderer.embeddedRenderer().clone())
+        layer.triggerRepaint()
+        return True
+
+    @staticmethod
+    def onWriteMapLayer(layer, layerElement, document):
+        """ Write the wrapped renderer to the project, so that it can be opened without the plugin. The layer is not changed """
+
+        if not isinstance(layer, QgsVectorLayer):
+            return
+
+        renderer = layer.renderer()
+        if renderer is None or renderer.type() != TOMsDisplayGeometryRenderer.RENDERER_TYPE:
+            return
+
+        rendererElement = layerElement.firstChildElement("renderer-v2")
+        if rendererElement.isNull():
+            return
+
+        TOMsLog.debug("In TOMsStyleConverter.onWriteMapLayer: {}", layer.name)
+        layerElement.replaceChild(renderer.embeddedRenderer().save(document, QgsReadWriteContext()), rendererElement)
+
+    @classmethod
+    def convertQml(cls, qml):
+        """ Returns the converted QML (text) """
+
+        doctype = ""
+        if qml.lstrip().startswith("<!DOCTYPE"):
+            doctype = qml.lstrip().split("\n", 1)[0] + "\n"
+
+        root = ElementTree.fromstring(qml)
+
+        nrConverted = 0
+        for element in root.iter():
+            # <prop k="geometryModifier" v=...> or (later versions) <Option name="geometryModifier" value=...>
+            for (nameAttribute, valueAttribute) in [("k", "v"), ("name", "value")]:
+                if element.get(nameAttribute) == "geometryModifier":
+                    expression = cls.convertExpression(element.get(valueAttribute))
+                    if expression is not None:
+                        element.set(valueAttribute, expression)
+                        nrConverted = nrConverted + 1
+
+        renderer = root.find("renderer-v2")
+        if renderer is not None and nrConverted > 0:
+            index = list(root).index(renderer)
+            root.remove(renderer)
+            wrapper = ElementTree.Element("renderer-v2", {"type": TOMsDisplayGeometryRenderer.RENDERER_TYPE})
+            for attribute in ["symbollevels", "forceraster", "enableorderby"]:
+                if renderer.get(attribute) is not None:
+                    wrapper.set(attribute, renderer.get(attribute))
+            orderBy = renderer.find("orderby")
+            if orderBy is not None:
+                wrapper.append(copy.deepcopy(orderBy))
+            wrapper.text = renderer.text
+            wrapper.append(renderer)
+            wrapper.tail = renderer.tail
+            root.insert(index, wrapper)
+
+        return doctype + ElementTree.tostring(root, encoding="unicode")
+
+    @classmethod
+    def convertQmlFile(cls, path, outputPath=None):
+
+        with open(path, encoding="utf-8") as qmlFile:
+            qml = qmlFile.read()
+
+        with open(outputPath or path, "w", encoding="utf-8") as qmlFile:
+            qmlFile.write(cls.convertQml(qml))
+
+    @staticmethod
+    def isEnabled():
+        return str(TOMsParamsSnapshot().param("UseDisplayGeometryRenderer")).lower() in ["1", "true", "yes"]
@@ -0,0 +1,98 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Key values ("GeometryID", "RestrictionID") of the features of a layer by feature id.
+
+A fid is only meaningful for the provider that gave it. The restriction tables have a varchar primary key, for which the
+postgres provider numbers the features in the order they are fetched - so a separately opened copy of a layer gives the
+same rows different fids, and the fids are different again in the next session. The edit signals give the fids of the
+layer being edited. These are translated into key values here, reading through the layer itself.
+
+A feature can no longer be read once it is deleted, and may not be read once an edit takes it outside the layer's
+filter (e.g., when it is closed). The keys of the features shown are therefore read when editing starts (and when the
+filter changes while editing).
+"""
+
+from qgis.core import (
+    NULL,
+    QgsExpression,
+    QgsFeatureRequest
+)
+
+class TOMsFeatureKeys():
+
+    def __init__(self, layer, keyField):
+
+        self.layer = layer
+        self.keyField = keyField
+        self.__keys = dict()   # fid: key value
+
+        if layer.isEditable():
+            self.load()
+
+    def connections(self):
+        """ (signal, slot) pairs to be connected while the layer is watched """
+        return [(self.layer.editingStarted, self.load),
+                (self.layer.subsetStringChanged, self.onSubsetStringChanged),
+                (self.layer.dataSourceChanged, self.clear)
+                ]
+
+    @staticmethod
+    def filterExpression(keyField, keys):
+        """ Expression selecting the features with the given key values """
+        return '"{keyField}" IN ({keys})'.format(keyField=keyField, keys=",".join(QgsExpression.quotedValue(key) for key in keys))
+
+    @staticmethod
+    def value(value):
+        return None if value is None or value == NULL else value
+
+    def load(self):
+        """ Read the keys of the features shown by the layer """
+
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([self.keyField], self.layer.fields())
+
+        for currFeature in self.layer.getFeatures(request):
+            key = self.value(currFeature.attribute(self.keyField))
+            if key is not None:
+                self.__keys[currFeature.id()] = key
+
+    def onSubsetStringChanged(self):
+        if self.layer.isEditable():
+            self.load()
+
+    def key(self, fid):
+        """ Returns the key value for the feature fid of the layer - or None if it is not known """
+
+        key = self.__keys.get(fid)
+        if key is not None:
+            return key
+
+        request = QgsFeatureRequest(fid).setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([self.keyField], self.layer.fields())
+        for currFeature in self.layer.getFeatures(request):
+            key = self.value(currFeature.attribute(self.keyField))
+            if key is not None:
+                self.__keys[fid] = key
+
+        return key
+
+    def setKey(self, fid, key):
+        key = self.value(key)
+        if key is not None:
+            self.__keys[fid] = key
+
+    def remove(self, fid):
+        """ Returns the key value held for fid (None if it is not known) - and forgets it """
+        return self.__keys.pop(fid, None)
+
+    def clear(self):
+        self.__keys = dict()
@@ -0,0 +1,214 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Display geometry generation on plain coordinates - no QGIS objects are used.
+
+Lines are lists of (x, y) tuples and the results are coordinate lists, so the calculations can be run in other
+processes (e.g., for bulk regeneration). TOMsGeometryElement (ElementGeometryFactory) uses these functions and converts
+the results to QgsGeometry.
+"""
+
+import math
+
+DEFAULT_ZIGZAG_WAVELENGTH = 3.0
+
+def checkDegrees(Az):
+    newAz = Az
+
+    if Az >= float(360):
+        newAz = Az - float(360)
+    elif Az < float(0):
+        newAz = Az + float(360)
+
+    return newAz
+
+def cosdir_azim(azim):
+    az = math.radians(azim)
+    cosa = math.sin(az)
+    cosb = math.cos(az)
+    return cosa, cosb
+
+def azimuth(pt1, pt2):
+    # as QgsPointXY.azimuth
+    return math.atan2(pt2[0] - pt1[0], pt2[1] - pt1[1]) * 180.0 / math.pi
+
+def turnToCL(Az1, Az2):
+    # function to determine direction of turn to road centre (Az1 = Az of current line; Az2 = Az to roadCentreline)
+
+    AzCL = Az1 - 90.0
+    if AzCL < 0:
+        AzCL = AzCL + 360.0
+
+    # Need to check quadrant
+    if AzCL >= 0.0 and AzCL <= 90.0:
+        if Az2 >= 270.0 and Az2 <= 359.999:
+            AzCL = AzCL + 360
+    elif Az2 >= 0 and Az2 <= 90:
+        if AzCL >= 270.0 and AzCL <= 359.999:
+            Az2 = Az2 + 360
+
+    g = abs(float(AzCL) - float(Az2))
+
+    if g < 90:
+        Turn = -90
+    else:
+        Turn = 90
+
+    return Turn
+
+def calcBisector(prevAz, currAz, Turn, WidthRest):
+    # function to return Az of bisector
+
+    prevAzA = checkDegrees(prevAz + float(Turn))
+    currAzA = checkDegrees(currAz + float(Turn))
+
+    diffAz = prevAzA - currAzA
+
+    diffAngle = diffAz / float(2)
+    bisectAz = prevAzA - diffAngle
+
+    diffAngle_rad = math.radians(diffAngle)
+    distToPt = float(WidthRest) / math.cos(diffAngle_rad)
+
+    return bisectAz, distToPt
+
+def getReverseAzimuth(Az):
+    if (Az + 180) > 360:
+        AzimuthToCentreLine = Az - 180
+    else:
+        AzimuthToCentreLine = Az + 180
+    return AzimuthToCentreLine
+
+def checkFeatureIsBay(restGeomType):
+    if restGeomType < 10 or (restGeomType >= 20 and restGeomType < 30):
+        return True
+    else:
+        return False
+
+def getShape(line, shpExtent, AzimuthToCentreLine, offset, restGeomType, orientation):
+    """ Returns (ptsList, parallelPtsList) - the outline of the shape at shpExtent from the kerb line "line" and the
+        line at offset from it - see TOMsGeometryElement.getShape
+    """
+
+    if len(line) < 2:
+        raise ValueError("In getShape. line needs at least two vertices")
+
+    ptsList = []
+    parallelPtsList = []
+    diffEchelonAz = 0
+
+    # now loop through each of the vertices and process as required
+    for i in range(len(line) - 1):
+
+        x, y = line[i]
+        Az = checkDegrees(azimuth(line[i], line[i + 1]))
+
+        if i == 0:
+            # determine which way to turn towards CL
+            Turn = turnToCL(Az, AzimuthToCentreLine)
+
+            newAz = checkDegrees(Az + Turn)
+            cosa, cosb = cosdir_azim(newAz)
+
+            ptsList.append((x + (float(offset) * cosa), y + (float(offset) * cosb)))
+            parallelPtsList.append((x + (float(offset) * cosa), y + (float(offset) * cosb)))
+
+            # Now add the point at the extent. If it is an echelon bay, adjust the angle
+            if restGeomType in [5, 25]:  # echelon
+                if not str(orientation).isnumeric():
+                    orientation = AzimuthToCentreLine
+                diffEchelonAz = checkDegrees(orientation - newAz)
+                newAz = Az + Turn + diffEchelonAz
+                cosa, cosb = cosdir_azim(newAz)
+
+            ptsList.append((x + (float(shpExtent) * cosa), y + (float(shpExtent) * cosb)))
+
+        else:
+            # need to work out half of bisected angle
+            newAz, distWidth = calcBisector(prevAz, Az, Turn, shpExtent)
+
+            cosa, cosb = cosdir_azim(newAz + diffEchelonAz)
+            ptsList.append((x + (float(distWidth) * cosa), y + (float(distWidth) * cosb)))
+            parallelPtsList.append((x + (float(offset) * cosa), y + (float(offset) * cosb)))
+
+        prevAz = Az
+
+    # last point. Use Azimuth from last segment
+    lastX, lastY = line[len(line) - 1]
+
+    newAz = Az + Turn + diffEchelonAz
+    cosa, cosb = cosdir_azim(newAz)
+    ptsList.append((lastX + (float(shpExtent) * cosa), lastY + (float(shpExtent) * cosb)))
+
+    # add end point (without any consideration of Echelon)
+    newAz = Az + Turn
+    cosa, cosb = cosdir_azim(newAz)
+    ptsList.append((lastX + (float(offset) * cosa), lastY + (float(offset) * cosb)))
+    parallelPtsList.append((lastX + (float(offset) * cosa), lastY + (float(offset) * cosb)))
+
+    return ptsList, parallelPtsList
+
+def lineLength(lines):
+    return sum(math.hypot(x2 - x1, y2 - y1) for line in lines for ((x1, y1), (x2, y2)) in zip(line[:-1], line[1:]))
+
+def interpolate(lines, distance):
+    """ Returns the point at distance along the lines (taken one after the other) - as QgsGeometry.interpolate """
+
+    distanceTraversed = 0.0
+    lastPt = None
+
+    for line in lines:
+        for ((x1, y1), (x2, y2)) in zip(line[:-1], line[1:]):
+            segmentLength = math.hypot(x2 - x1, y2 - y1)
+            if segmentLength > 0.0 and distance <= distanceTraversed + segmentLength:
+                fraction = (distance - distanceTraversed) / segmentLength
+                return (x1 + (x2 - x1) * fraction, y1 + (y2 - y1) * fraction)
+            distanceTraversed = distanceTraversed + segmentLength
+            lastPt = (x2, y2)
+
+    return lastPt
+
+def getZigZag(lines, AzimuthToCentreLine, offset, shpExtent, wavelength=DEFAULT_ZIGZAG_WAVELENGTH):
+    """ Returns the zig-zag vertices along the kerb line(s) - see TOMsGeometryElement.getZigZag """
+
+    line = lines[0]
+    if len(line) < 2:
+        raise ValueError("In getZigZag. line needs at least two vertices")
+
+    length = lineLength(lines)
+
+    NrSegments = int(length / wavelength)    # e.g., length = 33, wavelength = 4
+    interval = int(length/float(NrSegments) * 10000) / 10000
+
+    Az = azimuth(line[0], line[1])
+    Turn = turnToCL(Az, AzimuthToCentreLine)
+    cosa, cosb = cosdir_azim(Az + Turn)
+
+    firstX, firstY = line[0]
+    ptsList = [(firstX + (float(offset) * cosa), firstY + (float(offset) * cosb)),
+               (firstX + (float(shpExtent) * cosa), firstY + (float(shpExtent) * cosb))]
+
+    distanceAlongLine = 0.0
+    for countSegments in range(NrSegments):
+
+        distanceAlongLine = distanceAlongLine + interval / 2
+        ptX, ptY = interpolate(lines, distanceAlongLine)
+        ptsList.append((ptX + (float(offset) * cosa), ptY + (float(offset) * cosb)))
+
+        distanceAlongLine = distanceAlongLine + interval / 2
+        ptX, ptY = interpolate(lines, distanceAlongLine)
+        ptsList.append((ptX + (float(shpExtent) * cosa), ptY + (float(shpExtent) * cosb)))
+
+    # deal with last point
+    lastX, lastY = line[len(line) - 1]
+    ptsList.append((lastX + (float(offset) * cosa), lastY + (float(offset) * cosb)))
+
+    return ptsList
@@ -22,35 +22,44 @@ from qgis.PyQt.QtWidgets import (
 from qgis.core import (
     QgsMessageLog, QgsFeature, QgsGeometry, QgsGeometryUtils,
     QgsFeatureRequest,
-    QgsRectangle, QgsPointXY, QgsWkbTypes
+    QgsRectangle, QgsPointXY, QgsWkbTypes, QgsLineString
 )
 
 from ..constants import (
     ProposalStatus,
     RestrictionAction,
     RestrictionLayers,
-    RestrictionGeometryTypes
+    RestrictionGeometryTypes,
+    DisplayLevelOfDetail
 )
 
 from abc import ABCMeta, abstractstaticmethod, abstractmethod
-from ..restrictionTypeUtilsClass import TOMsParams
+from ..restrictionTypeUtilsClass import TOMsParamsSnapshot
 from ..generateGeometryUtils import generateGeometryUtils
+from . import TOMsGeometryKernel
+from . import TOMsGeometryCore
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
 
 class TOMsGeometryElement(QObject):
+
+    # use the vectorised (NumPy) vertex calculations when available
+    useGeometryKernel = TOMsGeometryKernel.HAS_NUMPY
+
     def __init__(self, currFeature):
         super().__init__()
 
-        QgsMessageLog.logMessage("In TOMsGeometryElement.init: " + str(currFeature.attribute("GeometryID")), tag="TOMs panel")
+        TOMsLog.debug("In TOMsGeometryElement.init: {}", currFeature.attribute("GeometryID"))
 
-        params = TOMsParams()
-        params.getParams()
+        params = TOMsParamsSnapshot()
 
         self.currFeature = currFeature
-        self.BayWidth = float(params.setParam("BayWidth"))
-        self.BayLength = float(params.setParam("BayLength"))
-        self.BayOffsetFromKerb = float(params.setParam("BayOffsetFromKerb"))
-        self.LineOffsetFromKerb = float(params.setParam("LineOffsetFromKerb"))
-        self.CrossoverShapeWidth = float(params.setParam("CrossoverShapeWidth"))
+        self.BayWidth = float(params.param("BayWidth"))
+        self.BayLength = float(params.param("BayLength"))
+        self.BayOffsetFromKerb = float(params.param("BayOffsetFromKerb"))
+        self.LineOffsetFromKerb = float(params.param("LineOffsetFromKerb"))
+        self.CrossoverShapeWidth = float(params.param("CrossoverShapeWidth"))
 
         self.currRestGeomType = currFeature.attribute("GeomShapeID")
         self.currAzimuthToCentreLine = float(currFeature.attribute("AzimuthToRoadCentreLine"))
@@ -58,13 +67,13 @@ class TOMsGeometryElement(QObject):
         self.nrBays = 0
         self.currBayOrientation = 0
 
-        QgsMessageLog.logMessage("In TOMsGeometryElement.init: checking for bay ", tag="TOMs panel")
+        TOMsLog.debug("In TOMsGeometryElement.init: checking for bay ")
 
         if self.checkFeatureIsBay(self.currRestGeomType) == True:
             self.nrBays = float(currFeature.attribute("NrBays"))
             self.currBayOrientation = currFeature.attribute("BayOrientation")
 
-        QgsMessageLog.logMessage("In TOMsGeometryElement.init: finished ", tag="TOMs panel")
+        TOMsLog.debug("In TOMsGeometryElement.init: finished ")
 
     @abstractmethod
     def getElementGeometry(self):
@@ -78,17 +87,20 @@ class TOMsGeometryElement(QObject):
             return False
 
     def generatePolygon(self, listGeometryPairs):
+        return TOMsGeometryElement.combineGeometryPairs(listGeometryPairs)
+
+    @staticmethod
+    def combineGeometryPairs(listGeometryPairs):
         # ... and combine the two paired geometries. NB: May be more than one pair
 
-        QgsMessageLog.logMessage("In generatePolygon ... ", tag="TOMs panel")
+        TOMsLog.debug("In generatePolygon ... ")
 
         outputGeometry = QgsGeometry()
 
         for (shape, line) in listGeometryPairs:
 
-            QgsMessageLog.logMessage("In generatePolygon:  shape ********: " + shape.asWkt(), tag="TOMs panel")
-            QgsMessageLog.logMessage("In generatePolygon:  line ********: " + line.asWkt(),
-                                     tag="TOMs panel")
+            TOMsLog.debug("In generatePolygon:  shape ********: {}", shape.asWkt)
+            TOMsLog.debug("In generatePolygon:  line ********: {}", line.asWkt)
 
             newGeometry = shape.combine(line)
 
@@ -109,15 +121,14 @@ class TOMsGeometryElement(QObject):
                 res = outputGeometry.addPointsXY(newGeometry.asPolyline(), QgsWkbTypes.PolygonGeometry)
 
                 if res != QgsGeometry.OperationResult.Success:
-                    QgsMessageLog.logMessage(
-                        "In generatePolygon: NOT able to add part  ...", tag="TOMs panel")
+                    TOMsLog.warning("In generatePolygon: NOT able to add part  ...")
 
         return outputGeometry
 
     def generateMultiLineShape(self, listGeometries):
         # ... and combine the geometries. NB: May be more than one
 
-        QgsMessageLog.logMessage("In generateMultiLineShape ... ", tag="TOMs panel")
+        TOMsLog.debug("In generateMultiLineShape ... ")
 
         outputGeometry = QgsGeometry()
 
@@ -126,14 +137,13 @@ class TOMsGeometryElement(QObject):
             res = outputGeometry.addPointsXY(shape.asPolyline(), QgsWkbTypes.LineGeometry)
 
             if res != QgsGeometry.OperationResult.Success:
-                QgsMessageLog.logMessage(
-                    "In generateMultiLineShape: NOT able to add part  ...", tag="TOMs panel")
+                TOMsLog.warning("In generateMultiLineShape: NOT able to add part  ...")
 
         return outputGeometry
 
     def getLine(self, AzimuthToCentreLine=None):
 
-        QgsMessageLog.logMessage("In getLine ... ", tag="TOMs panel")
+        TOMsLog.debug("In getLine ... ")
 
         if AzimuthToCentreLine is None:
             AzimuthToCentreLine = self.currAzimuthToCentreLine
@@ -141,7 +151,7 @@ class TOMsGeometryElement(QObject):
 
     def getShape(self, shpExtent=None, AzimuthToCentreLine=None, offset=None):
 
-        QgsMessageLog.logMessage("In getShape ... ", tag="TOMs panel")
+        TOMsLog.debug("In getShape ... ")
 
         feature = self.currFeature
         restGeomType = self.currRestGeomType
@@ -171,6 +181,11 @@ class TOMsGeometryElement(QObject):
                 Move for defined distance (typically 0.25m) along perpendicular and create last point
         """
 
+        if self.useGeometryKernel:
+            coords = TOMsGeometryKernel.lineCoordinates(feature.geometry())
+            if coords is not None and len(coords) > 1:
+                return self.getShapeFromKernel(coords, shpExtent, AzimuthToCentreLine, offset)
+
         line = generateGeometryUtils.getLineForAz(feature)
 
         # QgsMessageLog.logMessage("In getDisplayGeometry:  nr of pts = " + str(len(line)), tag="TOMs panel")
@@ -178,137 +193,28 @@ class TOMsGeometryElement(QObject):
         if len(line) == 0:
             return 0
 
-        # Now have a valid set of points
-
-        ptsList = []
-        parallelPtsList = []
-        nextAz = 0
-        diffEchelonAz = 0
-
-        # now loop through each of the vertices and process as required. New geometry points are added to ptsList
-
-        for i in range(len(line) - 1):
-
-            # QgsMessageLog.logMessage("In getDisplayGeometry: i = " + str(i), tag="TOMs panel")
-
-            Az = generateGeometryUtils.checkDegrees(line[i].azimuth(line[i + 1]))
-
-            # QgsMessageLog.logMessage("In getDisplayGeometry: geometry: " + str(line[i].x()) + " " + str(line[i+1].x()) + " " + str(Az), tag="TOMs panel")
-
-            # if this is the first point
-
-            if i == 0:
-                # determine which way to turn towards CL
-                # QgsMessageLog.logMessage("In generate_display_geometry: considering first point", tag="TOMs panel")
-
-                Turn = generateGeometryUtils.turnToCL(Az, AzimuthToCentreLine)
-
-                newAz = generateGeometryUtils.checkDegrees(Az + Turn)
-                # QgsMessageLog.logMessage("In generate_display_geometry: newAz: " + str(newAz), tag="TOMs panel")
-                cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: cosa : " + str(cosa) + " " + str(cosb), tag="TOMs panel")
-
-                # dx = float(offset) * cosa
-                # dy = float(offset) * cosb
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: dx: " + str(dx) + " dy: " + str(dy), tag="TOMs panel")
-
-                ptsList.append(
-                    QgsPointXY(line[i].x() + (float(offset) * cosa), line[i].y() + (float(offset) * cosb)))
-
-                parallelPtsList.append(
-                    QgsPointXY(line[i].x() + (float(offset) * cosa), line[i].y() + (float(offset) * cosb)))
-                # QgsMessageLog.logMessage("In geomType: added point 1 ", tag="TOMs panel")
-
-                # Now add the point at the extent. If it is an echelon bay:
-                #   a. calculate the difference between the first Az and the echelon Az (??), and
-                #   b. adjust the angle
-                #   c. *** also need to adjust the length *** Not yet implemented
-
-                # if restGeomType == 5 or restGeomType == 25:  # echelon
-                if restGeomType in [5, 25]:  # echelon
-                    QgsMessageLog.logMessage("In geomType: orientation: " + str(orientation), tag="TOMs panel")
-                    if not str(orientation).isnumeric():
-                        orientation = AzimuthToCentreLine
-                    diffEchelonAz = generateGeometryUtils.checkDegrees(orientation - newAz)
-                    newAz = Az + Turn + diffEchelonAz
-                    QgsMessageLog.logMessage("In geomType: newAz: " + str(newAz) + " diffEchelonAz: " + str(diffEchelonAz),
-                                             tag="TOMs panel")
-                    cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
-                    pass
-
-                ptsList.append(
-                    QgsPointXY(line[i].x() + (float(shpExtent) * cosa),
-                             line[i].y() + (float(shpExtent) * cosb)))
-                # QgsMessageLog.logMessage("In geomType: added point 2 ", tag="TOMs panel")
-
-                # ptsList.append(newPoint)
-                # QgsMessageLog.logMessage("In geomType: after append ", tag="TOMs panel")
-
-                # ptsList.append(QgsPoint(line[i].x()+(float(bayWidth)*cosa), line[i].y()+(float(bayWidth)*cosb)))
-
-            else:
-
-                # now pass along the feature
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: considering point: " + str(i), tag="TOMs panel")
-
-                # need to work out half of bisected angle
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: prevAz: " + str(prevAz) + " currAz: " + str(Az), tag="TOMs panel")
-
-                newAz, distWidth = generateGeometryUtils.calcBisector(prevAz, Az, Turn, shpExtent)
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: newAz: " + str(newAz), tag="TOMs panel")
-
-                cosa, cosb = generateGeometryUtils.cosdir_azim(newAz + diffEchelonAz)
-                ptsList.append(
-                    QgsPointXY(line[i].x() + (float(distWidth) * cosa), line[i].y() + (float(distWidth) * cosb)))
-
-                parallelPtsList.append(
-                    QgsPointXY(line[i].x() + (float(offset) * cosa), line[i].y() + (float(offset) * cosb)))
-            # QgsMessageLog.logMessage("In generate_display_geometry: point appended", tag="TOMs panel")
-
-            prevAz = Az
+        ptsList, parallelPtsList = TOMsGeometryCore.getShape([(pt.x(), pt.y()) for pt in line], shpExtent,
+                                                             AzimuthToCentreLine, offset, restGeomType, orientation)
 
-            # QgsMessageLog.logMessage("In generate_display_geometry: newPoint 1: " + str(ptsList[1].x()) + " " + str(ptsList[1].y()), tag="TOMs panel")
+        newLine = QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for (x, y) in ptsList])
+        parallelLine = QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for (x, y) in parallelPtsList])
 
-            # have reached the end of the feature. Now need to deal with last point.
-            # Use Azimuth from last segment but change the points
-
-            # QgsMessageLog.logMessage("In generate_display_geometry: feature processed. Now at last point ", tag="TOMs panel")
-
-            # standard bay
-        newAz = Az + Turn + diffEchelonAz
-        # QgsMessageLog.logMessage("In generate_display_geometry: newAz: " + str(newAz), tag="TOMs panel")
-        cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
-
-        ptsList.append(QgsPointXY(line[len(line) - 1].x() + (float(shpExtent) * cosa),
-                                line[len(line) - 1].y() + (float(shpExtent) * cosb)))
-
-        # add end point (without any consideration of Echelon)
-
-        newAz = Az + Turn
-        cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
+        return newLine, parallelLine
 
-        ptsList.append(QgsPointXY(line[len(line) - 1].x() + (float(offset) * cosa),
-                                line[len(line) - 1].y() + (float(offset) * cosb)))
-        parallelPtsList.append(QgsPointXY(line[len(line) - 1].x() + (float(offset) * cosa),
-                                line[len(line) - 1].y() + (float(offset) * cosb)))
+    def getShapeFromKernel(self, coords, shpExtent, AzimuthToCentreLine, offset):
+        # same as getShape, but with all the vertices calculated together
 
-        newLine = QgsGeometry.fromPolylineXY(ptsList)
-        #parallelPtsList.reverse()
-        parallelLine = QgsGeometry.fromPolylineXY(parallelPtsList)
+        ptsList, parallelPtsList = TOMsGeometryKernel.getShape(coords, shpExtent, AzimuthToCentreLine, offset,
+                                                               self.currRestGeomType, self.currBayOrientation)
 
-        # QgsMessageLog.logMessage("In getDisplayGeometry:  newLine ********: " + newLine.asWkt(), tag="TOMs panel")
-        # QgsMessageLog.logMessage("In getDisplayGeometry:  parallelLine ********: " + parallelLine.asWkt(), tag="TOMs panel")
+        newLine = QgsGeometry(QgsLineString(ptsList[:, 0].tolist(), ptsList[:, 1].tolist()))
+        parallelLine = QgsGeometry(QgsLineString(parallelPtsList[:, 0].tolist(), parallelPtsList[:, 1].tolist()))
 
         return newLine, parallelLine
 
     def getZigZag(self, wavelength=None, shpExtent=None):
 
-        QgsMessageLog.logMessage("In getZigZag ... ", tag="TOMs panel")
+        TOMsLog.debug("In getZigZag ... ")
 
         if not wavelength:
             wavelength = 3.0
@@ -320,67 +226,27 @@ class TOMsGeometryElement(QObject):
         if len(line) == 0:
             return 0
 
-        ptsList = []
-
         length = self.currFeature.geometry().length()
 
         NrSegments = int(length / wavelength)    # e.g., length = 33, wavelength = 4
         interval = int(length/float(NrSegments) * 10000) / 10000
 
-        QgsMessageLog.logMessage("In getZigZag. LengthLine: " + str(length) + " NrSegments = " + str(NrSegments) + "; interval: " + str(interval), tag="TOMs panel")
-
-        Az = line[0].azimuth(line[1])
-
-        # QgsMessageLog.logMessage("In getZigZag. Az = " + str(Az) + "; AzCL = " + str(self.currAzimuthToCentreLine) + "; line[0]: " + line[0].asWkt() + "; line[1]: " + line[1].asWkt(), tag="TOMs panel")
-
-        Turn = generateGeometryUtils.turnToCL(Az, self.currAzimuthToCentreLine)
-
-        newAz = Az + Turn
-        # QgsMessageLog.logMessage("In generate_display_geometry: newAz: " + str(newAz), tag="TOMs panel")
-        cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
-
-        # deal with two points
-        ptsList.append(
-            QgsPointXY(line[0].x() + (float(offset) * cosa), line[0].y() + (float(offset) * cosb)))
-
-        ptsList.append(
-            QgsPointXY(line[0].x() + (float(shpExtent) * cosa),
-                     line[0].y() + (float(shpExtent) * cosb)))
-
-        distanceAlongLine = 0.0
-        countSegments = 0
-        while countSegments < (NrSegments):
-
-            countSegments = countSegments + 1
-
-            distanceAlongLine = distanceAlongLine + interval / 2
-
-            interpolatedPointC = self.currFeature.geometry().interpolate(distanceAlongLine).asPoint()
-
-            QgsMessageLog.logMessage("In getZigZag. PtC = " + str(interpolatedPointC.x()) + ": " + str(interpolatedPointC.y()) + "; distanceAlongLine = " + str(distanceAlongLine), tag="TOMs panel")
-            # QgsMessageLog.logMessage("In getZigZag. offset = " + str(float(offset)) + "; cosa = " + str(cosa) + "; cosb = " + str(cosb), tag="TOMs panel")
+        TOMsLog.debug("In getZigZag. LengthLine: {} NrSegments = {}; interval: {}", length, NrSegments, interval)
 
-            QgsMessageLog.logMessage("In getZigZag. newC x = " + str(interpolatedPointC.x() + (float(offset) * cosa)) + "; y = " + str(interpolatedPointC.y() + (float(offset) * cosb)), tag="TOMs panel")
+        if self.useGeometryKernel and self.currFeature.geometry().constGet().partCount() == 1:
+            coords = TOMsGeometryKernel.lineCoordinates(self.currFeature.geometry())
+            if coords is not None and len(coords) > 1:
+                Az = line[0].azimuth(line[1])
+                Turn = TOMsGeometryCore.turnToCL(Az, self.currAzimuthToCentreLine)
+                cosa, cosb = TOMsGeometryCore.cosdir_azim(Az + Turn)
 
-            ptsList.append(QgsPointXY(interpolatedPointC.x() + (float(offset) * cosa), interpolatedPointC.y() + (float(offset) * cosb)))
+                zigzagPts = TOMsGeometryKernel.getZigZag(coords, cosa, cosb, offset, shpExtent, interval, NrSegments)
+                return QgsGeometry(QgsLineString(zigzagPts[:, 0].tolist(), zigzagPts[:, 1].tolist()))
 
-            distanceAlongLine = distanceAlongLine+interval/2
+        ptsList = TOMsGeometryCore.getZigZag(TOMsGeometryCoreAdapter.featureLines(self.currFeature.geometry()),
+                                             self.currAzimuthToCentreLine, offset, shpExtent, wavelength)
 
-            interpolatedPointD = self.currFeature.geometry().interpolate(distanceAlongLine).asPoint()
-
-            # QgsMessageLog.logMessage("In getZigZag. PtD = " + interpolatedPointD.asWkt() + "; distanceAlongLine = " + str(distanceAlongLine), tag="TOMs panel")
-
-            ptsList.append(QgsPointXY(interpolatedPointD.x() + (float(shpExtent) * cosa),
-                     interpolatedPointD.y() + (float(shpExtent) * cosb)))
-
-        # deal with last point
-        ptsList.append(
-            QgsPointXY(line[len(line) - 1].x() + (float(offset) * cosa),
-                     line[len(line) - 1].y() + (float(offset) * cosb)))
-
-        newLine = QgsGeometry.fromPolylineXY(ptsList)
-
-        return newLine
+        return QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for (x, y) in ptsList])
 
 
 """ ***** """
@@ -388,7 +254,7 @@ class TOMsGeometryElement(QObject):
 class generatedGeometryBayLineType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryBayLineType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryBayLineType ... ")
 
     def getElementGeometry(self):
         outputGeometry, parallelLine = self.getShape()
@@ -398,7 +264,7 @@ class generatedGeometryBayLineType(TOMsGeometryElement):
 class generatedGeometryHalfOnHalfOffLineType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryHalfOnHalfOffLineType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryHalfOnHalfOffLineType ... ")
 
     def getElementGeometry(self):
 
@@ -411,7 +277,7 @@ class generatedGeometryHalfOnHalfOffLineType(TOMsGeometryElement):
 class generatedGeometryOnPavementLineType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryOnPavementLineType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryOnPavementLineType ... ")
 
     def getElementGeometry(self):
         outputGeometry, parallelLine = self.getShape(self.BayWidth, generateGeometryUtils.getReverseAzimuth(self.currAzimuthToCentreLine))
@@ -421,7 +287,7 @@ class generatedGeometryOnPavementLineType(TOMsGeometryElement):
 class generatedGeometryPerpendicularLineType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryPerpendicularLineType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryPerpendicularLineType ... ")
 
     def getElementGeometry(self):
         outputGeometry, parallelLine = self.getShape(self.BayLength)
@@ -431,7 +297,7 @@ class generatedGeometryPerpendicularLineType(TOMsGeometryElement):
 class generatedGeometryEchelonLineType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryEchelonLineType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryEchelonLineType ... ")
 
     def getElementGeometry(self):
         outputGeometry, parallelLine = self.getShape(self.BayLength)
@@ -441,7 +307,7 @@ class generatedGeometryEchelonLineType(TOMsGeometryElement):
 class generatedGeometryPerpendicularOnPavementLineType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryPerpendicularOnPavementLineType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryPerpendicularOnPavementLineType ... ")
 
     def getElementGeometry(self):
         outputGeometry, parallelLine = self.getShape(self.BayLength, generateGeometryUtils.getReverseAzimuth(self.currAzimuthToCentreLine))
@@ -451,7 +317,7 @@ class generatedGeometryPerpendicularOnPavementLineType(TOMsGeometryElement):
 class generatedGeometryOutlineShape(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryOutlineShape ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryOutlineShape ... ")
 
     def getElementGeometry(self):
         return self.currFeature.geometry()
@@ -460,7 +326,7 @@ class generatedGeometryOutlineShape(TOMsGeometryElement):
 class generatedGeometryLineType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryLineType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryLineType ... ")
 
     def getElementGeometry(self):
         outputGeometry, parallelLine = self.getLine()
@@ -470,7 +336,7 @@ class generatedGeometryLineType(TOMsGeometryElement):
 class generatedGeometryZigZagType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryZigZagType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryZigZagType ... ")
 
     def getElementGeometry(self):
 
@@ -482,7 +348,7 @@ class generatedGeometryZigZagType(TOMsGeometryElement):
 class generatedGeometryBayPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryBayPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryBayPolygonType ... ")
 
     def getElementGeometry(self):
 
@@ -496,7 +362,7 @@ class generatedGeometryBayPolygonType(TOMsGeometryElement):
 class generatedGeometryHalfOnHalfOffPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryHalfOnHalfOffPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryHalfOnHalfOffPolygonType ... ")
 
     def getElementGeometry(self):
         # QgsMessageLog.logMessage("In generatedGeometryHalfOnHalfOffPolygonType ... BayWidth/2 = " + str((self.BayWidth)/2), tag="TOMs panel")
@@ -512,7 +378,7 @@ class generatedGeometryHalfOnHalfOffPolygonType(TOMsGeometryElement):
 class generatedGeometryOnPavementPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryOnPavementPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryOnPavementPolygonType ... ")
 
     def getElementGeometry(self):
 
@@ -525,7 +391,7 @@ class generatedGeometryOnPavementPolygonType(TOMsGeometryElement):
 class generatedGeometryPerpendicularPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryPerpendicularPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryPerpendicularPolygonType ... ")
 
     def getElementGeometry(self):
 
@@ -538,7 +404,7 @@ class generatedGeometryPerpendicularPolygonType(TOMsGeometryElement):
 class generatedGeometryEchelonPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryPerpendicularPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryPerpendicularPolygonType ... ")
 
     def getElementGeometry(self):
 
@@ -551,7 +417,7 @@ class generatedGeometryEchelonPolygonType(TOMsGeometryElement):
 class generatedGeometryPerpendicularOnPavementPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryPerpendicularPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryPerpendicularPolygonType ... ")
 
     def getElementGeometry(self):
 
@@ -564,7 +430,7 @@ class generatedGeometryPerpendicularOnPavementPolygonType(TOMsGeometryElement):
 class generatedGeometryOutlineBayPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryOutlineBayPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryOutlineBayPolygonType ... ")
 
     def getElementGeometry(self):
 
@@ -574,7 +440,7 @@ class generatedGeometryOutlineBayPolygonType(TOMsGeometryElement):
 class generatedGeometryCrossoverPolygonType(TOMsGeometryElement):
     def __init__(self, currFeature):
         super().__init__(currFeature)
-        QgsMessageLog.logMessage("In factory. generatedGeometryPerpendicularPolygonType ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. generatedGeometryPerpendicularPolygonType ... ")
 
     def getElementGeometry(self):
 
@@ -588,11 +454,39 @@ class generatedGeometryCrossoverPolygonType(TOMsGeometryElement):
 
 class ElementGeometryFactory():
 
+    # shapes shown as the kerb (offset) line when less detail is needed
+    KERB_LINE_TYPES = {DisplayLevelOfDetail.SIMPLIFIED: [RestrictionGeometryTypes.ECHELON,
+                                                         RestrictionGeometryTypes.ZIG_ZAG],
+                       DisplayLevelOfDetail.KERB_LINE: [RestrictionGeometryTypes.PARALLEL_BAY,
+                                                        RestrictionGeometryTypes.HALF_ON_HALF_OFF,
+                                                        RestrictionGeometryTypes.ON_PAVEMENT,
+                                                        RestrictionGeometryTypes.PERPENDICULAR,
+                                                        RestrictionGeometryTypes.ECHELON,
+                                                        RestrictionGeometryTypes.PERPENDICULAR_ON_PAVEMENT,
+                                                        RestrictionGeometryTypes.ZIG_ZAG,
+                                                        RestrictionGeometryTypes.PERPENDICULAR_ON_PAVEMENT_POLYGON,
+                                                        RestrictionGeometryTypes.CROSSOVER]
+                       }
+
+    # shapes that are simplified (they need to remain polygons for the fill symbols)
+    POLYGON_TYPES = [RestrictionGeometryTypes.PARALLEL_BAY_POLYGON,
+                     RestrictionGeometryTypes.HALF_ON_HALF_OFF_POLYGON,
+                     RestrictionGeometryTypes.ON_PAVEMENT_POLYGON,
+                     RestrictionGeometryTypes.PERPENDICULAR_POLYGON,
+                     RestrictionGeometryTypes.ECHELON_POLYGON]
+
+    PIXEL_SIZE = 0.00028   # m (at 1:1)
+
     @staticmethod
-    def getElementGeometry(currFeature):
+    def getElementGeometry(currFeature, levelOfDetail=DisplayLevelOfDetail.FULL):
 
         currRestGeomType = currFeature.attribute("GeomShapeID")
-        QgsMessageLog.logMessage("In factory. getElementGeometry " + str(currFeature.attribute("GeometryID")) + ":" + str(currRestGeomType), tag="TOMs panel")
+        TOMsLog.debug("In factory. getElementGeometry {}:{}", currFeature.attribute("GeometryID"), currRestGeomType)
+
+        if levelOfDetail != DisplayLevelOfDetail.FULL:
+            geometry = ElementGeometryFactory.getReducedElementGeometry(currFeature, currRestGeomType, levelOfDetail)
+            if geometry is not None:
+                return geometry
 
         try:
             if currRestGeomType == RestrictionGeometryTypes.PARALLEL_BAY:
@@ -652,4 +546,41 @@ class ElementGeometryFactory():
             raise AssertionError("Restriction Geometry Type NOT found")
 
         except AssertionError as _e:
-            QgsMessageLog.logMessage("In ElementGeometryFactory. TYPE not found or something else ... ", tag="TOMs panel")
+            TOMsLog.warning("In ElementGeometryFactory. TYPE not found or something else ... ")
+
+    @staticmethod
+    def getReducedElementGeometry(currFeature, currRestGeomType, levelOfDetail):
+        """ The geometry to show when less detail is needed - or None if the full shape is to be used """
+
+        if currRestGeomType in ElementGeometryFactory.KERB_LINE_TYPES.get(levelOfDetail, []):
+            return generatedGeometryLineType(currFeature).getElementGeometry()
+
+        if currRestGeomType in ElementGeometryFactory.POLYGON_TYPES:
+            geometry = ElementGeometryFactory.getElementGeometry(currFeature)
+            tolerance = ElementGeometryFactory.simplifyTolerance(levelOfDetail)
+            if isinstance(geometry, QgsGeometry) and tolerance > 0.0:
+                simplified = geometry.simplify(tolerance)
+                if simplified is not None and not simplified.isEmpty():
+                    return simplified
+            return geometry
+
+        return None
+
+    @staticmethod
+    def simplifyTolerance(levelOfDetail):
+        # half a pixel at the scale from which the level of detail is used
+        scale = generateGeometryUtils.getLevelOfDetailScales().get(levelOfDetail)
+        if scale is None:
+            return 0.0
+        return scale * ElementGeometryFactory.PIXEL_SIZE / 2.0
+
+
+class TOMsGeometryCoreAdapter():
+    """ Conversion between QgsGeometry and the plain coordinates used by TOMsGeometryCore """
+
+    @staticmethod
+    def featureLines(geometry):
+        # lines (as lists of (x, y)) making up the restriction geometry
+        if geometry.isMultipart():
+            return [[(pt.x(), pt.y()) for pt in line] for line in geometry.asMultiPolyline()]
+        return [[(pt.x(), pt.y()) for pt in geometry.asPolyline()]]
@@ -0,0 +1,182 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Vectorised (NumPy) versions of the vertex loops within TOMsGeometryCore.
+
+The functions work on the kerb line as an (n, 2) array of coordinates and reproduce the calculations of
+TOMsGeometryCore.getShape (azimuths, turn towards the centre line, bisectors and echelon adjustment) for all
+vertices at once - using the TOMsGeometryCore functions for the first and last vertices. The zig-zag vertices (TOMsGeometryElement.getZigZag) are found by arc-length arithmetic on the
+same array rather than by interpolating each point. NumPy is optional - if it is not available HAS_NUMPY is False and the original loops are used.
+
+"""
+
+import struct
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+from . import TOMsGeometryCore
+
+WKB_LINESTRING = 2
+WKB_MULTILINESTRING = 5
+
+def lineCoordinates(geom):
+    """ Returns the vertices of the (first) line within the geometry as an (n, 2) array.
+
+        Only 2D LineString and MultiLineString geometries are read (directly from the WKB). None is returned for
+        anything else so that the caller can fall back to the original code.
+    """
+
+    if not HAS_NUMPY or geom is None or geom.isNull():
+        return None
+
+    wkb = bytes(geom.asWkb())
+    if len(wkb) < 9:
+        return None
+
+    byteOrder = '<' if wkb[0] == 1 else '>'
+    (wkbType,) = struct.unpack_from(byteOrder + 'I', wkb, 1)
+    pos = 5
+
+    if wkbType == WKB_MULTILINESTRING:
+        # take the first line as the one we are interested in (as in getLineForAz)
+        (nrLines,) = struct.unpack_from(byteOrder + 'I', wkb, pos)
+        if nrLines == 0:
+            return None
+        pos = pos + 4
+        byteOrder = '<' if wkb[pos] == 1 else '>'
+        (wkbType,) = struct.unpack_from(byteOrder + 'I', wkb, pos + 1)
+        pos = pos + 5
+
+    if wkbType != WKB_LINESTRING:
+        return None
+
+    (nrPts,) = struct.unpack_from(byteOrder + 'I', wkb, pos)
+    pos = pos + 4
+
+    return np.frombuffer(wkb, dtype=np.dtype(byteOrder + 'f8'), count=2 * nrPts, offset=pos).reshape(nrPts, 2)
+
+def checkDegrees(Az):
+    # array version of TOMsGeometryCore.checkDegrees
+    return np.where(Az >= 360.0, Az - 360.0, np.where(Az < 0.0, Az + 360.0, Az))
+
+def cosdir_azim(Az):
+    # array version of TOMsGeometryCore.cosdir_azim
+    az = np.radians(Az)
+    return np.sin(az), np.cos(az)
+
+def segmentAzimuths(coords):
+    # azimuth (degrees, 0 - 360) of each segment - as QgsPointXY.azimuth followed by checkDegrees
+    delta = np.diff(coords, axis=0)
+    return checkDegrees(np.degrees(np.arctan2(delta[:, 0], delta[:, 1])))
+
+def getShape(coords, shpExtent, AzimuthToCentreLine, offset, restGeomType, orientation):
+    """ Returns the outer and parallel point lists (as arrays) for the kerb line "coords" - see TOMsGeometryCore.getShape
+
+        coords needs to have at least two vertices.
+    """
+
+    shpExtent = float(shpExtent)
+    offset = float(offset)
+
+    nrPts = len(coords)
+    Az = segmentAzimuths(coords)
+
+    # determine which way to turn towards CL (using the first segment)
+    firstAz = float(Az[0])
+    Turn = TOMsGeometryCore.turnToCL(firstAz, AzimuthToCentreLine)
+
+    newAz = TOMsGeometryCore.checkDegrees(firstAz + Turn)
+    cosa, cosb = TOMsGeometryCore.cosdir_azim(newAz)
+    firstOffsetPt = (coords[0, 0] + (offset * cosa), coords[0, 1] + (offset * cosb))
+
+    diffEchelonAz = 0
+    if restGeomType in [5, 25]:  # echelon
+        if not str(orientation).isnumeric():
+            orientation = AzimuthToCentreLine
+        diffEchelonAz = TOMsGeometryCore.checkDegrees(orientation - newAz)
+        newAz = firstAz + Turn + diffEchelonAz
+        cosa, cosb = TOMsGeometryCore.cosdir_azim(newAz)
+
+    firstExtentPt = (coords[0, 0] + (shpExtent * cosa), coords[0, 1] + (shpExtent * cosb))
+
+    # intermediate vertices - bisector of the adjoining segments (calcBisector)
+    prevAzA = checkDegrees(Az[:-1] + float(Turn))
+    currAzA = checkDegrees(Az[1:] + float(Turn))
+    diffAngle = (prevAzA - currAzA) / float(2)
+    bisectAz = prevAzA - diffAngle
+    distWidth = shpExtent / np.cos(np.radians(diffAngle))
+
+    cosa, cosb = cosdir_azim(bisectAz + diffEchelonAz)
+    innerCoords = coords[1:nrPts - 1]
+    extentPts = np.column_stack((innerCoords[:, 0] + (distWidth * cosa), innerCoords[:, 1] + (distWidth * cosb)))
+    offsetPts = np.column_stack((innerCoords[:, 0] + (offset * cosa), innerCoords[:, 1] + (offset * cosb)))
+
+    # last vertex. Use Azimuth from last segment
+    lastAz = float(Az[-1])
+    lastPt = coords[nrPts - 1]
+
+    cosa, cosb = TOMsGeometryCore.cosdir_azim(lastAz + Turn + diffEchelonAz)
+    lastExtentPt = (lastPt[0] + (shpExtent * cosa), lastPt[1] + (shpExtent * cosb))
+
+    # add end point (without any consideration of Echelon)
+    cosa, cosb = TOMsGeometryCore.cosdir_azim(lastAz + Turn)
+    lastOffsetPt = (lastPt[0] + (offset * cosa), lastPt[1] + (offset * cosb))
+
+    ptsList = np.vstack(([firstOffsetPt, firstExtentPt], extentPts, [lastExtentPt, lastOffsetPt]))
+    parallelPtsList = np.vstack(([firstOffsetPt], offsetPts, [lastOffsetPt]))
+
+    return ptsList, parallelPtsList
+
+def interpolate(coords, distances):
+    """ Returns the points (as an (m, 2) array) at each of the distances along the line "coords" - as QgsGeometry.interpolate
+
+        The distances need to lie within the length of the line.
+    """
+
+    delta = np.diff(coords, axis=0)
+    segmentLengths = np.hypot(delta[:, 0], delta[:, 1])
+    distanceToVertex = np.concatenate(([0.0], np.cumsum(segmentLengths)))
+
+    segment = np.clip(np.searchsorted(distanceToVertex, distances, side='right') - 1, 0, len(segmentLengths) - 1)
+    lengths = segmentLengths[segment]
+    fraction = np.divide(distances - distanceToVertex[segment], lengths,
+                         out=np.zeros(len(segment)), where=lengths > 0.0)
+
+    return coords[segment] + fraction[:, np.newaxis] * delta[segment]
+
+def getZigZag(coords, cosa, cosb, offset, shpExtent, interval, NrSegments):
+    """ Returns the zig-zag vertices (as an array) for the kerb line "coords" - see TOMsGeometryElement.getZigZag
+
+        Each segment (of length interval) has a vertex at offset half way along and one at shpExtent at its end.
+    """
+
+    offset = float(offset)
+    shpExtent = float(shpExtent)
+
+    # distances accumulated as in the original loop (so that they are identical)
+    distances = np.cumsum(np.full(2 * NrSegments, interval / 2))
+    linePts = interpolate(coords, distances)
+
+    extents = np.tile([offset, shpExtent], NrSegments)
+    zigzagPts = np.column_stack((linePts[:, 0] + (extents * cosa), linePts[:, 1] + (extents * cosb)))
+
+    firstPt = coords[0]
+    lastPt = coords[len(coords) - 1]
+
+    return np.vstack(([(firstPt[0] + (offset * cosa), firstPt[1] + (offset * cosb)),
+                       (firstPt[0] + (shpExtent * cosa), firstPt[1] + (shpExtent * cosb))],
+                      zigzagPts,
+                      [(lastPt[0] + (offset * cosa), lastPt[1] + (offset * cosb))]))
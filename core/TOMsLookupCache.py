@@ -0,0 +1,161 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+In memory copies of the lookup layers (TimePeriods, LengthOfTime, ...).
+
+The label expression functions need the LabelText/Description for a code for every restriction that is labelled.
+Each lookup layer is read once into a dictionary (Code: (LabelText, Description)) and re-read only after the layer is
+edited or reloaded. The layers are watched from the main thread (see watchLayer); until then rows are queried individually.
+"""
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QThread
+)
+
+from qgis.core import (
+    NULL,
+    QgsFeatureRequest
+)
+
+import threading
+
+from ..restrictionTypeUtilsClass import Singleton
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsLookupCache(metaclass=Singleton):
+
+    CODE_FIELD = "Code"
+    LABEL_TEXT_FIELD = "LabelText"
+    DESCRIPTION_FIELD = "Description"
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsLookupCache.init ...")
+
+        self.__lock = threading.Lock()
+        self.__lookups = dict()       # layer id: {code: (LabelText, Description)}
+        self.__watchedLayers = dict()  # layer id: layer
+
+    def getLabelText(self, lookupLayer, code):
+        return self.__lookup(lookupLayer, code)[0]
+
+    def getDescription(self, lookupLayer, code):
+        return self.__lookup(lookupLayer, code)[1]
+
+    def __lookup(self, lookupLayer, code):
+
+        key = self.codeKey(code)
+        if key is None:
+            return (None, None)
+
+        with self.__lock:
+            lookup = self.__lookups.get(lookupLayer.id())
+
+        if lookup is None:
+            if not self.watchLayer(lookupLayer):
+                # not able to watch the layer from here, so can't hold a copy. Look up the single row
+                return self.__queryLayer(lookupLayer, code)
+            lookup = self.__loadLayer(lookupLayer)
+
+        return lookup.get(key, (None, None))
+
+    def watchLayer(self, lookupLayer):
+        """ Invalidate the copy of the lookup layer when it is edited or reloaded. Returns False if the layer can't be watched """
+
+        layerId = lookupLayer.id()
+
+        with self.__lock:
+            if layerId in self.__watchedLayers:
+                return True
+
+        # connections made from a render thread would not be delivered
+        if QThread.currentThread() != QCoreApplication.instance().thread():
+            return False
+
+        with self.__lock:
+            self.__watchedLayers[layerId] = lookupLayer
+
+        lookupLayer.dataChanged.connect(lambda: self.invalidate(layerId))
+        lookupLayer.dataSourceChanged.connect(lambda: self.invalidate(layerId))
+        lookupLayer.willBeDeleted.connect(lambda: self.forget(layerId))
+
+        return True
+
+    def __queryLayer(self, lookupLayer, code):
+
+        query = "\"{}\" = {}".format(self.CODE_FIELD, code)
+        request = QgsFeatureRequest().setFilterExpression(query)
+
+        fields = lookupLayer.fields()
+        idxLabelText = fields.indexFromName(self.LABEL_TEXT_FIELD)
+        idxDescription = fields.indexFromName(self.DESCRIPTION_FIELD)
+
+        for row in lookupLayer.getFeatures(request):
+            return (row.attribute(idxLabelText) if idxLabelText >= 0 else None,
+                    row.attribute(idxDescription) if idxDescription >= 0 else None)  # make assumption that only one row
+
+        return (None, None)
+
+    @staticmethod
+    def codeKey(code):
+        # codes are compared as numbers where possible (as in the original query "Code" = <code>)
+        if code is None or code == NULL:
+            return None
+        try:
+            value = float(code)
+        except (TypeError, ValueError):
+            return str(code)
+        if value.is_integer():
+            return int(value)
+        return value
+
+    def __loadLayer(self, lookupLayer):
+
+        TOMsLog.debug("In TOMsLookupCache. loading {}", lookupLayer.name)
+
+        fields = lookupLayer.fields()
+        idxCode = fields.indexFromName(self.CODE_FIELD)
+        idxLabelText = fields.indexFromName(self.LABEL_TEXT_FIELD)
+        idxDescription = fields.indexFromName(self.DESCRIPTION_FIELD)
+
+        lookup = dict()
+        if idxCode >= 0:
+            for row in lookupLayer.getFeatures():
+                key = self.codeKey(row.attribute(idxCode))
+                if key is None or key in lookup:
+                    continue   # make assumption that only one row
+                lookup[key] = (row.attribute(idxLabelText) if idxLabelText >= 0 else None,
+                               row.attribute(idxDescription) if idxDescription >= 0 else None)
+        else:
+            TOMsLog.warning("In TOMsLookupCache. {} field not found in {}", self.CODE_FIELD, lookupLayer.name)
+
+        with self.__lock:
+            self.__lookups[lookupLayer.id()] = lookup
+
+        return lookup
+
+    def invalidate(self, layerId):
+        # the layer has been edited or reloaded. It is read again when next required
+        TOMsLog.debug("In TOMsLookupCache.invalidate {}", layerId)
+        with self.__lock:
+            self.__lookups.pop(layerId, None)
+
+    def forget(self, layerId):
+        with self.__lock:
+            self.__lookups.pop(layerId, None)
+            self.__watchedLayers.pop(layerId, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__lookups.clear()
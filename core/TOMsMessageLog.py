@@ -0,0 +1,146 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Logging for TOMs with levels, per module switches and deferred formatting.
+
+Each module creates its own log, e.g.,
+
+    TOMsLog = TOMsMessageLog.getLog(__name__)
+    TOMsLog.debug("In getShape: {} {}", fid, geometry.asWkt)
+
+The message is only formatted (using str.format) if it will be output. Any callable arguments (e.g., geometry.asWkt)
+are only called at that point, so disabled messages cost (almost) nothing.
+
+The settings are held in QSettings:
+
+    TOMs/logging/level              DEBUG, INFO, WARNING or ERROR (default INFO)
+    TOMs/logging/modules/<module>   level for an individual module (or "off")
+    TOMs/logging/fileOnly           true - write to the log file (QGIS_LOGFILE_PATH) and not to the QGIS message log
+"""
+
+from qgis.PyQt.QtCore import (
+    QSettings
+)
+
+from qgis.core import (
+    Qgis,
+    QgsMessageLog
+)
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {"DEBUG": DEBUG,
+               "INFO": INFO,
+               "WARNING": WARNING,
+               "ERROR": ERROR,
+               "OFF": OFF
+               }
+
+QGIS_LEVELS = {DEBUG: Qgis.Info,
+               INFO: Qgis.Info,
+               WARNING: Qgis.Warning,
+               ERROR: Qgis.Critical
+               }
+
+SETTINGS_GROUP = "TOMs/logging/"
+DEFAULT_LEVEL = INFO
+TOMS_TAG = "TOMs panel"
+
+class TOMsMessageLog():
+
+    __logs = dict()
+    __settingsLoaded = False
+    __defaultLevel = DEFAULT_LEVEL
+    __fileOnly = False
+    __fileWriter = None
+
+    def __init__(self, module):
+        self.module = module
+        self.level = DEFAULT_LEVEL
+        self.updateLevel()
+
+    @classmethod
+    def getLog(cls, moduleName):
+        """ Returns the log for the module (using the last part of the module name, e.g., "TOMsGeometryElement") """
+
+        module = moduleName.rsplit(".", 1)[-1]
+        log = cls.__logs.get(module)
+        if log is None:
+            cls.__loadSettings()
+            log = TOMsMessageLog(module)
+            cls.__logs[module] = log
+        return log
+
+    @classmethod
+    def reloadSettings(cls):
+        cls.__settingsLoaded = False
+        cls.__loadSettings()
+        for log in cls.__logs.values():
+            log.updateLevel()
+
+    @classmethod
+    def __loadSettings(cls):
+        if cls.__settingsLoaded:
+            return
+
+        settings = QSettings()
+        cls.__defaultLevel = cls.levelFromName(settings.value(SETTINGS_GROUP + "level", ""), DEFAULT_LEVEL)
+        cls.__fileOnly = str(settings.value(SETTINGS_GROUP + "fileOnly", "false")).lower() in ["1", "true", "yes"]
+        cls.__settingsLoaded = True
+
+    @staticmethod
+    def levelFromName(levelName, default):
+        return LEVEL_NAMES.get(str(levelName).upper(), default)
+
+    @classmethod
+    def setFileWriter(cls, fileWriter):
+        """ Set the function used to write messages to the log file - fileWriter(message, tag, level) """
+        cls.__fileWriter = fileWriter
+
+    def updateLevel(self):
+        moduleLevel = QSettings().value(SETTINGS_GROUP + "modules/" + self.module, "")
+        self.level = self.levelFromName(moduleLevel, TOMsMessageLog.__defaultLevel)
+
+    def isEnabledFor(self, level):
+        return level >= self.level
+
+    def debug(self, message, *args):
+        if DEBUG >= self.level:
+            self.__output(DEBUG, message, args)
+
+    def info(self, message, *args):
+        if INFO >= self.level:
+            self.__output(INFO, message, args)
+
+    def warning(self, message, *args):
+        if WARNING >= self.level:
+            self.__output(WARNING, message, args)
+
+    def error(self, message, *args):
+        if ERROR >= self.level:
+            self.__output(ERROR, message, args)
+
+    def __output(self, level, message, args):
+
+        if len(args) > 0:
+            message = message.format(*[arg() if callable(arg) else arg for arg in args])
+
+        qgisLevel = QGIS_LEVELS[level]
+        fileWriter = TOMsMessageLog.__fileWriter
+
+        if TOMsMessageLog.__fileOnly and fileWriter is not None:
+            fileWriter(message, TOMS_TAG, qgisLevel)
+        else:
+            QgsMessageLog.logMessage(message, tag=TOMS_TAG, level=qgisLevel)
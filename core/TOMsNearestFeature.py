@@ -0,0 +1,276 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Nearest feature lookups against the road network layers (RoadCentreLine, ...) using a segment index.
+
+The index for a layer is built on first use and dropped (to be rebuilt when next required) when the layer is edited
+or reloaded. As with the other TOMs indexes, a layer needs to be watched from the main thread before its index is used.
+"""
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QThread
+)
+
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsWkbTypes
+)
+
+import threading
+
+from ..restrictionTypeUtilsClass import Singleton
+from .TOMsSegmentIndex import SegmentGridIndex, DEFAULT_CELL_SIZE
+from .TOMsDerivedAttributes import TOLERANCE_ROADWIDTH, azimuthToNearestLine, roadNameAt
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsNearestSegmentIndex():
+    """ Segment index (with selected attributes) for the layer "layerName" """
+
+    def __init__(self, layerName, attributes=None, cellSize=DEFAULT_CELL_SIZE):
+
+        self.layerName = layerName
+        self.attributes = attributes or []
+        self.cellSize = cellSize
+
+        self.__lock = threading.RLock()
+        self.__index = None
+        self.__attributeValues = dict()   # fid: {attribute: value}
+        self.__watchedLayer = None
+        self.__watchedLayerId = None
+        self.__invalidatedCallbacks = []
+
+    def layer(self):
+        layers = QgsProject.instance().mapLayersByName(self.layerName)
+        if len(layers) == 0:
+            return None
+        return layers[0]
+
+    def addInvalidatedCallback(self, callback):
+        """ callback() is called whenever the index is dropped, e.g., to clear results derived from it """
+        self.__invalidatedCallbacks.append(callback)
+
+    def isAvailable(self):
+        """ The index can only be used once the layer is watched """
+
+        with self.__lock:
+            if self.__watchedLayerId is not None:
+                return True
+
+        return self.watchLayer(self.layer())
+
+    def watchLayer(self, layer):
+
+        if layer is None:
+            return False
+
+        layerId = layer.id()
+
+        with self.__lock:
+            if layerId == self.__watchedLayerId:
+                return True
+
+        # connections made from a render thread would not be delivered
+        if QThread.currentThread() != QCoreApplication.instance().thread():
+            return False
+
+        TOMsLog.debug("In TOMsNearestSegmentIndex.watchLayer: {}", self.layerName)
+
+        with self.__lock:
+            self.__watchedLayer = layer
+            self.__watchedLayerId = layerId
+        self.invalidate()
+
+        layer.dataChanged.connect(lambda: self.invalidate(layerId))
+        layer.dataSourceChanged.connect(lambda: self.invalidate(layerId))
+        layer.willBeDeleted.connect(lambda: self.forget(layerId))
+
+        return True
+
+    def invalidate(self, layerId=None):
+
+        with self.__lock:
+            if layerId is not None and layerId != self.__watchedLayerId:
+                return
+            self.__index = None
+            self.__attributeValues = dict()
+
+        for callback in self.__invalidatedCallbacks:
+            callback()
+
+    def forget(self, layerId):
+        with self.__lock:
+            if layerId == self.__watchedLayerId:
+                self.__watchedLayer = None
+                self.__watchedLayerId = None
+        self.invalidate()
+
+    def segmentIndex(self):
+        """ Returns the SegmentGridIndex for the layer (building it if necessary) - keys are the feature ids """
+
+        with self.__lock:
+            if self.__index is None:
+                self.__buildIndex()
+            return self.__index
+
+    def contents(self):
+        """ Returns (SegmentGridIndex, {fid: {attribute: value}}) for the layer - from the same build of the index """
+
+        with self.__lock:
+            segmentIndex = self.segmentIndex()
+            return segmentIndex, self.__attributeValues
+
+    def __buildIndex(self):
+
+        TOMsLog.debug("In TOMsNearestSegmentIndex. building index for {}", self.layerName)
+
+        if self.__watchedLayer is None:
+            self.__index = SegmentGridIndex(self.cellSize)
+            self.__attributeValues = dict()
+            return
+
+        self.__index, self.__attributeValues = self.readLayer(self.__watchedLayer, self.attributes, self.cellSize)
+
+    @classmethod
+    def readLayer(cls, layer, attributes, cellSize=DEFAULT_CELL_SIZE):
+        """ Returns (SegmentGridIndex with the fids as keys, {fid: {attribute: value}}) for the layer """
+
+        segmentIndex = SegmentGridIndex(cellSize)
+        attributeValues = dict()
+
+        request = QgsFeatureRequest().setSubsetOfAttributes(attributes, layer.fields())
+        for currFeature in layer.getFeatures(request):
+            for line in cls.featureLines(currFeature.geometry()):
+                segmentIndex.addLine(currFeature.id(), [(pt.x(), pt.y()) for pt in line])
+            attributeValues[currFeature.id()] = dict((attribute, currFeature.attribute(attribute)) for attribute in attributes)
+
+        return segmentIndex, attributeValues
+
+    @staticmethod
+    def featureLines(geom):
+        """ Returns the lines (lists of QgsPointXY) making up the geometry - polygons are represented by their rings """
+
+        if geom is None or geom.isNull():
+            return []
+
+        if QgsWkbTypes.isCurvedType(geom.wkbType()):
+            geom = QgsGeometry(geom.constGet().segmentize())
+
+        if geom.type() == QgsWkbTypes.LineGeometry:
+            if geom.isMultipart():
+                return geom.asMultiPolyline()
+            return [geom.asPolyline()]
+
+        if geom.type() == QgsWkbTypes.PolygonGeometry:
+            if geom.isMultipart():
+                return [ring for polygon in geom.asMultiPolygon() for ring in polygon]
+            return geom.asPolygon()
+
+        return []
+
+
+class TOMsCentreLineIndex(metaclass=Singleton):
+    """ Azimuth from a point to the nearest road centre line - with the results held for each point """
+
+    LAYER_NAME = "RoadCentreLine"
+    MAX_MEMO_ENTRIES = 100000
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsCentreLineIndex.init ...")
+
+        self.__memo = dict()
+        self.__segmentIndex = TOMsNearestSegmentIndex(self.LAYER_NAME)
+        self.__segmentIndex.addInvalidatedCallback(self.clearMemo)
+
+    def watchLayer(self, layer):
+        return self.__segmentIndex.watchLayer(layer)
+
+    def clearMemo(self):
+        self.__memo = dict()
+
+    def azimuthToCentreLine(self, testPt):
+        """ Returns the azimuth from testPt (QgsPointXY) to the nearest point on the road centre line (0 if there is no
+            centre line within TOLERANCE_ROADWIDTH) - or None if the index is not available.
+        """
+
+        key = (testPt.x(), testPt.y())
+        memo = self.__memo
+        Az = memo.get(key)
+        if Az is not None:
+            return Az
+
+        if not self.__segmentIndex.isAvailable():
+            return None
+
+        # centre lines that intersect the box around the point (as in the original feature request)
+        Az = azimuthToNearestLine(self.__segmentIndex.segmentIndex(), testPt.x(), testPt.y(), TOLERANCE_ROADWIDTH)
+
+        if len(memo) >= self.MAX_MEMO_ENTRIES:
+            memo.clear()
+        memo[key] = Az
+
+        return Az
+
+
+class TOMsRoadNameResolver(metaclass=Singleton):
+    """ StreetName/USRN of the nearest road casement - with the results held for each feature geometry """
+
+    LAYER_NAME = "RoadCasement"
+    ATTRIBUTES = ["StreetName", "USRN"]
+    MAX_MEMO_ENTRIES = 100000
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsRoadNameResolver.init ...")
+
+        self.__memo = dict()
+        self.__segmentIndex = TOMsNearestSegmentIndex(self.LAYER_NAME, self.ATTRIBUTES)
+        self.__segmentIndex.addInvalidatedCallback(self.clearMemo)
+
+    def watchLayer(self, layer):
+        return self.__segmentIndex.watchLayer(layer)
+
+    def clearMemo(self):
+        self.__memo = dict()
+
+    @staticmethod
+    def geometryKey(geom):
+        return bytes(geom.asWkb())
+
+    def cachedRoadName(self, geom):
+        """ Returns (StreetName, USRN) found previously for the geometry - or None """
+        return self.__memo.get(self.geometryKey(geom))
+
+    def roadNameAt(self, testPt, tolerance, geom=None):
+        """ Returns (StreetName, USRN) for the casement nearest to testPt (QgsPointXY) that lies within the box of
+            size tolerance around it ((None, None) if there isn't one) - or None if the index is not available.
+
+            The result is held for geom (the feature geometry that testPt was taken from).
+        """
+
+        if not self.__segmentIndex.isAvailable():
+            return None
+
+        segmentIndex, attributeValues = self.__segmentIndex.contents()
+        roadName = roadNameAt(segmentIndex, attributeValues, testPt.x(), testPt.y(), tolerance)
+
+        if geom is not None:
+            memo = self.__memo
+            if len(memo) >= self.MAX_MEMO_ENTRIES:
+                memo.clear()
+            memo[self.geometryKey(geom)] = roadName
+
+        return roadName
@@ -35,17 +35,24 @@ from ..constants import (
     RestrictionAction,
     RestrictionLayers
 )
+from .TOMsProposalMembership import TOMsProposalMembership
+from .TOMsProposalFilter import TOMsProposalFilter
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
 
 class TOMsProposal(ProposalTypeUtilsMixin, QObject):
     def __init__(self, proposalsManager, proposalNr=None):
         QObject.__init__(self)
-        QgsMessageLog.logMessage("In TOMsProposal:init. ... ", tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal:init. ... ")
         self.proposalsManager = proposalsManager
         self.tableNames = self.proposalsManager.tableNames
+        self.membership = None
+        self.boundingBox = None
 
         self.setProposalsLayer()
 
-        QgsMessageLog.logMessage("In TOMsProposal:init. ... proposals layer set ", tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal:init. ... proposals layer set ")
 
         if proposalNr is not None:
             self.setProposal(proposalNr)
@@ -55,7 +62,7 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
         self.proposalsLayer = self.tableNames.setLayer("Proposals")
 
         if self.proposalsLayer is None:
-            QgsMessageLog.logMessage("In TOMsProposal:setProposalsLayer. Proposals layer NOT set !!!", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal:setProposalsLayer. Proposals layer NOT set !!!")
             return False
         else:
             idxProposalID = self.proposalsLayer.fields().indexFromName("ProposalID")
@@ -64,13 +71,19 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
             self.idxOpenDate = self.proposalsLayer.fields().indexFromName("ProposalOpenDate")
             self.idxProposalStatusID = self.proposalsLayer.fields().indexFromName("ProposalStatusID")
 
-        QgsMessageLog.logMessage("In TOMsProposal:setProposalsLayer... ", tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal:setProposalsLayer... ")
 
     def setProposal(self, proposalID):
 
         self.thisProposalNr = proposalID
         self.setProposalsLayer()
 
+        # the restrictions in the proposal are read when first required
+        if self.membership is not None and self.membership.proposalID != proposalID:
+            self.membership.release()
+            self.membership = None
+            self.boundingBox = None
+
         if (proposalID is not None):
             query = '\"ProposalID\" = {proposalID}'.format(proposalID=proposalID)
             request = QgsFeatureRequest().setFilterExpression(query)
@@ -98,10 +111,7 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
 
         self.proposalsLayer.addFeature(self.thisProposal)  # TH (added for v3)
 
-        QgsMessageLog.logMessage(
-            "In TOMsProposal:createProposal - attributes: (fid=" + str(self.thisProposal.id()) + ") " + str(
-                self.thisProposal.attributes()),
-            tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal:createProposal - attributes: (fid={}) {}", self.thisProposal.id, self.thisProposal.attributes)
 
         return self
 
@@ -144,7 +154,7 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
     def acceptProposal(self):
 
         currProposalID = self.thisProposalNr
-        QgsMessageLog.logMessage("In TOMsProposal.acceptProposal - " + str(self.thisProposalNr), tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal.acceptProposal - {}", self.thisProposalNr)
 
         """ Steps in acceptance are:
         1. Set new open/close dates for restrictions ( remember to clear filter )
@@ -164,31 +174,23 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
                 currFilter = self.tableNames.setLayer(currlayerName).subsetString()
                 self.tableNames.setLayer(currlayerName).setSubsetString('')
 
-                for currRestrictionID, currRestrictionInProposalDetails in restrictionList:
+                for currRestrictionID, currActionOnAcceptance in restrictionList:
                     currRestrictionInProposal = TOMsProposalElement(self.proposalsManager, currlayerID, None, currRestrictionID)
-                    status = currRestrictionInProposal.acceptActionOnProposalElement(currRestrictionInProposalDetails.attribute("ActionOnProposalAcceptance")) # Finding the correct action could go to ProposalElement
+                    status = currRestrictionInProposal.acceptActionOnProposalElement(currActionOnAcceptance) # Finding the correct action could go to ProposalElement
                     if status == False:
-                        QgsMessageLog.logMessage(
-                            "In TOMsProposal:acceptProposal. " + str(
-                                currRestrictionID) + " error on Action",
-                            tag="TOMs panel")
+                        TOMsLog.warning("In TOMsProposal:acceptProposal. {} error on Action", currRestrictionID)
                         return status
 
             # Now update tile revision nrs
-            QgsMessageLog.logMessage("In TOMsProposal:acceptProposal. Updating tile revision nrs",
-                tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal:acceptProposal. Updating tile revision nrs")
             proposalTileDictionary = self.getProposalTileDictionaryForDate()
 
             for tileNr, tile in proposalTileDictionary.items():
-                QgsMessageLog.logMessage("In TOMsProposal.acceptProposal: current tile " + str(tile["id"]) + " current RevisionNr: " + str(
-                    tile["RevisionNr"]) + " RevisionDate: " + str(tile["LastRevisionDate"]), tag="TOMs panel")
+                TOMsLog.debug("In TOMsProposal.acceptProposal: current tile {} current RevisionNr: {} RevisionDate: {}", tile["id"], tile["RevisionNr"], tile["LastRevisionDate"])
                 currTile = TOMsTile(self.proposalsManager, tileNr)
                 status = currTile.updateTileRevisionNr(currProposalID)
                 if status == False:
-                    QgsMessageLog.logMessage(
-                        "In TOMsProposal:acceptProposal. " + str(
-                            tileNr) + " error updating tile revision details",
-                        tag="TOMs panel")
+                    TOMsLog.warning("In TOMsProposal:acceptProposal. {} error updating tile revision details", tileNr)
                     return status
 
             # Now update Proposal
@@ -200,11 +202,11 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
 
     def rejectProposal(self):
 
-        QgsMessageLog.logMessage("In TOMsProposal.rejectProposal - " + str(self.thisProposalNr), tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal.rejectProposal - {}", self.thisProposalNr)
         status = self.setProposalStatusID(ProposalStatus.REJECTED)
 
         if status:
-            QgsMessageLog.logMessage("In TOMsProposal.rejectProposal.  Proposal Rejected ... ", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal.rejectProposal.  Proposal Rejected ... ")
             #self.proposalsManager.newProposalCreated.emit(0)
 
         return status
@@ -221,52 +223,67 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
 
     def __getRestrictionsInProposalForLayerForAction(self, layerID, actionOnAcceptance=None):
         # Will return a list of restrictions within a Proposal subject to actionOnAcceptance
+        return self.getMembership().restrictionsForLayer(layerID, actionOnAcceptance)
 
-        self.RestrictionsInProposalsLayer = self.tableNames.setLayer("RestrictionsInProposals")
-
-        query = ("\"ProposalID\" = {proposalID} AND \"RestrictionTableID\" = {layerID}").format(proposalID= str(self.thisProposalNr), layerID=str(layerID))
-
-        if actionOnAcceptance is not None:
-            query = ("{query} AND \"ActionOnProposalAcceptance\" = {actionOnAcceptance}").format(query=query, actionOnAcceptance=str(actionOnAcceptance))
-
-        QgsMessageLog.logMessage("In __getRestrictionsInProposalForLayerForAction. query: " + str(query), tag="TOMs panel")
-        request = QgsFeatureRequest().setFilterExpression(query)
-
-        restrictionList = []
-        for restrictionInProposalDetails in self.RestrictionsInProposalsLayer.getFeatures(request):
-            restrictionList.append([restrictionInProposalDetails["RestrictionID"], restrictionInProposalDetails])
-
-        return restrictionList
+    def getMembership(self):
+        # the rows of "RestrictionsInProposals" for this proposal
+        if self.membership is None:
+            self.membership = TOMsProposalMembership(self.tableNames.setLayer("RestrictionsInProposals"), self.thisProposalNr)
+        return self.membership
 
     def getProposalBoundingBox(self):
 
-        # Need to remember that filters are in operation, so need to ensure that Restriction features are available
-        QgsMessageLog.logMessage("In getProposalBoundingBox.", tag="TOMs panel")
+        # Need to remember that filters are in operation, so features are read from unfiltered copies of the layers
+        # (leaving the filters shown on the map untouched). Kept until the restrictions in the proposal change or
+        # changes to the restrictions are committed (see TOMsProposalsManager.refreshMapCanvas)
+        TOMsLog.debug("In getProposalBoundingBox.")
         currProposalID = self.thisProposalNr
-        geometryBoundingBox = QgsRectangle()
 
-        if currProposalID > 0:  # need to consider a proposal
+        if currProposalID is None or currProposalID <= 0:
+            return QgsRectangle()
 
-            for (layerID, layerName) in self.getRestrictionLayersList():
-                currLayer = self.tableNames.setLayer(layerName)
-                restrictionStr = self.__getRestrictionsListForLayerForAction(layerID)
-                #QgsMessageLog.logMessage("In getProposalBoundingBox. (" + layerName + ") request:" + restrictionStr, tag="TOMs panel")
+        membership = self.getMembership()
+        version = (membership.version(), self.proposalsManager.restrictionsVersion())
+        if self.boundingBox is not None and self.boundingBox[0] == version:
+            return QgsRectangle(self.boundingBox[1])
+
+        proposalFilter = TOMsProposalFilter(self.tableNames.setLayer("RestrictionsInProposals"))
+        geometryBoundingBox = QgsRectangle()
+        editing = False
 
-                #currLayer.blockSignals(True)
-                # unset filter to get geometries of closed features
-                layerFilterString = currLayer.subsetString()
-                QgsMessageLog.logMessage("In getProposalBoundingBox. (" + layerName + ") filter 1:" + layerFilterString, tag="TOMs panel")
-                currLayer.setSubsetString(None)
+        for (layerID, layerName) in self.getRestrictionLayersList():
+            if layerID not in membership.restrictionLayerIDs():
+                continue
 
-                query = '"RestrictionID" IN ({restrictions})'.format(restrictions=restrictionStr)
+            currLayer = self.tableNames.setLayer(layerName)
+            unfilteredLayer = self.proposalsManager.unfilteredLayer(currLayer)
 
-                request = QgsFeatureRequest().setFilterExpression(query)
+            request = QgsFeatureRequest().setSubsetOfAttributes([])
+            if proposalFilter.usesSubquery(currLayer):
+                unfilteredLayer.setSubsetString('"RestrictionID" IN ({restrictions})'.format(
+                    restrictions=proposalFilter.restrictionsInProposalQuery(currProposalID, layerID)))
+            else:
+                unfilteredLayer.setSubsetString('')
+                request.setFilterExpression('"RestrictionID" IN ({restrictions})'.format(
+                    restrictions=self.__getRestrictionsListForLayerForAction(layerID)))
+
+            for currRestriction in unfilteredLayer.getFeatures(request):
+                geometryBoundingBox.combineExtentWith(currRestriction.geometry().boundingBox())
+
+            if currLayer.isEditable():
+                # the copy has its own connection, so doesn't see the changes within the TOMs transaction. The layer
+                # itself does (for the restrictions its filter shows, i.e., those being opened)
+                editing = True
+                request = QgsFeatureRequest().setSubsetOfAttributes([])
+                request.setFilterExpression('"RestrictionID" IN ({restrictions})'.format(
+                    restrictions=self.__getRestrictionsListForLayerForAction(layerID)))
                 for currRestriction in currLayer.getFeatures(request):
                     geometryBoundingBox.combineExtentWith(currRestriction.geometry().boundingBox())
 
-                currLayer.setSubsetString(layerFilterString)
-                #currLayer.blockSignals(False)
-                QgsMessageLog.logMessage("In getProposalBoundingBox. (" + currLayer.name() + ") filter 1:" + currLayer.subsetString(), tag="TOMs panel")
+            TOMsLog.debug("In getProposalBoundingBox. ({}) {}", layerName, geometryBoundingBox.toString)
+
+        if not editing:
+            self.boundingBox = (version, QgsRectangle(geometryBoundingBox))
 
         return geometryBoundingBox
 
@@ -276,7 +293,7 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
             revisionDate = self.proposalsManager.date()
 
         # returns list of tiles in the proposal and their current revision numbers
-        QgsMessageLog.logMessage("In TOMsProposal.getProposalTileDictionaryForDate. considering Proposal: " + str (self.getProposalNr()) + " for " + str(revisionDate), tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal.getProposalTileDictionaryForDate. considering Proposal: {} for {}", self.getProposalNr, revisionDate)
         dictTilesInProposal = dict()
 
         # Logic is:
@@ -287,12 +304,14 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
 
             # loop through all the layers that might have restrictions
             for (layerID, layerName) in self.getRestrictionLayersList():
+                if layerID not in self.getMembership().restrictionLayerIDs():
+                    continue
 
                 # clear filter
                 currFilter = self.tableNames.setLayer(layerName).subsetString()
                 self.tableNames.setLayer(layerName).setSubsetString('')
 
-                for (currRestrictionID, restrictionInProposalObject) in self.__getRestrictionsInProposalForLayerForAction(layerID):
+                for (currRestrictionID, currActionOnAcceptance) in self.__getRestrictionsInProposalForLayerForAction(layerID):
 
                     currRestriction = ProposalElementFactory.getProposalElement(self.proposalsManager, layerID, None, currRestrictionID)
                     dictTilesInProposal.update(currRestriction.getTilesForRestriction(revisionDate))
@@ -324,7 +343,7 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
             currTileObject = TOMsTile(self.proposalsManager)
             for currTileRecord in self.tableNames.setLayer("MapGrid").getFeatures():
 
-                QgsMessageLog.logMessage("In TOMsProposal.getProposalTileDictionaryForDate. Current. Tile: " + str(currTileRecord.attribute("id")), tag="TOMs panel")
+                TOMsLog.debug("In TOMsProposal.getProposalTileDictionaryForDate. Current. Tile: {}", currTileRecord.attribute("id"))
 
                 status = currTileObject.setTile(currTileRecord.attribute("id"))
                 lastRevisionNr, lastProposalOpendate = currTileObject.getTileRevisionNrAtDate(revisionDate)
@@ -333,13 +352,13 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
                     dictTilesInProposal[currTileObject.thisTileNr] = currTileRecord
 
         for tileNr, tile in dictTilesInProposal.items():
-            QgsMessageLog.logMessage("In TOMsProposal.getProposalTileDictionaryForDate: " + str(tile["id"]) + " RevisionNr: " + str(tile["RevisionNr"]) + " RevisionDate: " + str(tile["LastRevisionDate"]), tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal.getProposalTileDictionaryForDate: {} RevisionNr: {} RevisionDate: {}", tile["id"], tile["RevisionNr"], tile["LastRevisionDate"])
 
         return dictTilesInProposal
 
     def updateTileRevisionNrsInProposal(self, dictTilesInProposal):
 
-        QgsMessageLog.logMessage("In TOMsProposal:updateTileRevisionNrsInProposal.", tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal:updateTileRevisionNrsInProposal.")
         # Increment the relevant tile numbers
 
         currRevisionDate = self.getProposalOpenDate()
@@ -357,7 +376,7 @@ class TOMsProposal(ProposalTypeUtilsMixin, QObject):
 
             lastRevisionNr, lastProposalOpendate = currTile.getTileRevisionNrAtDate(currRevisionDate)
             currRevisionNr = currTile["RevisionNr"]
-            QgsMessageLog.logMessage("In updateTileRevisionNrs. tile" + str (tileNr) + " currRevNr: " + str(currRevisionNr), tag="TOMs panel")
+            TOMsLog.debug("In updateTileRevisionNrs. tile{} currRevNr: {}", tileNr, currRevisionNr)
             if currRevisionNr is None:
                 MapGridLayer.changeAttributeValue(currTile.id(),MapGridLayer.fields().indexFromName("RevisionNr"), 1)
             else:
@@ -401,18 +420,18 @@ class TOMsTile(QObject):
     def setTilesLayer(self):
         self.tilesLayer = self.tableNames.setLayer("MapGrid")
         if self.tilesLayer is None:
-            QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer. tilesLayer layer NOT set !!!", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal:setTilesLayer. tilesLayer layer NOT set !!!")
         else:
             self.tileLayerFields = self.tilesLayer.fields()
             self.idxTileNr = self.tilesLayer.fields().indexFromName("id")
             self.idxRevisionNr = self.tilesLayer.fields().indexFromName("RevisionNr")
             self.idxLastRevisionDate = self.tilesLayer.fields().indexFromName("LastRevisionDate")
-        QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer... MapGrid ", tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposal:setTilesLayer... MapGrid ")
 
         self.tilesInAcceptedProposalsLayer = self.tableNames.setLayer("TilesInAcceptedProposals")
         if self.tilesInAcceptedProposalsLayer is None:
-            QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer. tilesInAcceptedProposalsLayer layer NOT set !!!", tag="TOMs panel")
-        QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer... tilesInAcceptedProposalsLayer ", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal:setTilesLayer. tilesInAcceptedProposalsLayer layer NOT set !!!")
+        TOMsLog.debug("In TOMsProposal:setTilesLayer... tilesInAcceptedProposalsLayer ")
 
     def setTile(self, tileNr):
 
@@ -427,12 +446,10 @@ class TOMsTile(QObject):
             for tile in self.tilesLayer.getFeatures(request):
                 self.thisTile = tile  # make assumption that only one row
                 #self.thisTile.setFields(self.tileLayerFields)
-                QgsMessageLog.logMessage("In TOMsProposal:setTile... tile found ",
-                                         tag="TOMs panel")
+                TOMsLog.debug("In TOMsProposal:setTile... tile found ")
                 return True
 
-        QgsMessageLog.logMessage("In TOMsProposal:setTile... tile NOT found ",
-                                         tag="TOMs panel")
+        TOMsLog.warning("In TOMsProposal:setTile... tile NOT found ")
         return False # either not found or 0
 
     def tile(self):
@@ -445,7 +462,7 @@ class TOMsTile(QObject):
         return self.thisTile.attribute("RevisionNr")
 
     def setRevisionNr(self, value):
-        QgsMessageLog.logMessage("In TOMsTile:setRevisionNr newRevisionNr: " + str(value), tag="TOMs panel")
+        TOMsLog.debug("In TOMsTile:setRevisionNr newRevisionNr: {}", value)
         #self.thisTile[self.idxRevisionNr] = value
         self.tilesLayer.changeAttributeValue(self.thisTile.id(), self.idxRevisionNr, value)
         #return self.thisTile.setAttribute("RevisionNr", value)
@@ -460,7 +477,7 @@ class TOMsTile(QObject):
 
     def getTileRevisionNrAtDate(self, filterDate=None):
 
-        QgsMessageLog.logMessage("In TOMsTile:getTileRevisionNrAtDate.", tag="TOMs panel")
+        TOMsLog.debug("In TOMsTile:getTileRevisionNrAtDate.")
 
         if filterDate is None:
             filterDate = self.proposalsManager.date()
@@ -469,7 +486,7 @@ class TOMsTile(QObject):
 
         queryString = "\"TileNr\" = " + str(self.thisTileNr)
 
-        QgsMessageLog.logMessage("In getTileRevisionNrAtDate: queryString: " + str(queryString), tag="TOMs panel")
+        TOMsLog.debug("In getTileRevisionNrAtDate: queryString: {}", queryString)
 
         expr = QgsExpression(queryString)
 
@@ -486,18 +503,12 @@ class TOMsTile(QObject):
             #lastProposalOpendate = self.proposalsManager.getProposalOpenDate(lastProposalID)
             lastProposalOpendate = tileProposal.getProposalOpenDate()
 
-            QgsMessageLog.logMessage(
-                "In getTileRevisionNrAtDate: last Proposal: " + str(lastProposalID) + "; " + str(lastRevisionNr),
-                tag="TOMs panel")
+            TOMsLog.debug("In getTileRevisionNrAtDate: last Proposal: {}; {}", lastProposalID, lastRevisionNr)
 
-            QgsMessageLog.logMessage(
-                "In getTileRevisionNrAtDate: last Proposal open date: " + str(lastProposalOpendate) + "; filter date: " + str(filterDate),
-                tag="TOMs panel")
+            TOMsLog.debug("In getTileRevisionNrAtDate: last Proposal open date: {}; filter date: {}", lastProposalOpendate, filterDate)
 
             if lastProposalOpendate <= filterDate:
-                QgsMessageLog.logMessage(
-                    "In getTileRevisionNrAtDate: using Proposal: " + str(lastProposalID) + "; " + str(lastRevisionNr),
-                    tag="TOMs panel")
+                TOMsLog.debug("In getTileRevisionNrAtDate: using Proposal: {}; {}", lastProposalID, lastRevisionNr)
                 return lastRevisionNr, lastProposalOpendate
 
         return None, None
@@ -511,14 +522,11 @@ class TOMsTile(QObject):
         else:
             currProposal = TOMsProposal(self.proposalsManager, currProposalID)
 
-        QgsMessageLog.logMessage(
-            "In TOMsTile:updateTileRevisionNr. tile " + str(self.thisTileNr) + " currRevNr: " + str(self.revisionNr()) + " ProposalID: " + str(currProposal.getProposalNr()), tag="TOMs panel")
+        TOMsLog.debug("In TOMsTile:updateTileRevisionNr. tile {} currRevNr: {} ProposalID: {}", self.thisTileNr, self.revisionNr, currProposal.getProposalNr)
 
         # check that there are no revisions beyond this date
         if self.lastRevisionDate() > currProposal.getProposalOpenDate():
-            QgsMessageLog.logMessage(
-                "In updateTileRevisionNr. tile" + str(self.thisTileNr) + " revision numbers are out of sync",
-                tag="TOMs panel")
+            TOMsLog.debug("In updateTileRevisionNr. tile{} revision numbers are out of sync", self.thisTileNr)
             QMessageBox.information(self.proposalsManager.iface.mainWindow(), "ERROR", ("In updateTileRevisionNr. tile" + str(self.thisTileNr) + " revision numbers are out of sync"))
             return False
 
@@ -527,8 +535,7 @@ class TOMsTile(QObject):
         else:
             newRevisionNr = self.revisionNr() + 1
 
-        QgsMessageLog.logMessage(
-            "In TOMsTile:updateTileRevisionNr. tile " + str(self.thisTileNr) + " newRevisionNr: " + str(newRevisionNr) + " revisionDate: " + str(currProposal.getProposalOpenDate()), tag="TOMs panel")
+        TOMsLog.debug("In TOMsTile:updateTileRevisionNr. tile {} newRevisionNr: {} revisionDate: {}", self.thisTileNr, newRevisionNr, currProposal.getProposalOpenDate)
 
         updateStatus = self.setRevisionNr(newRevisionNr)
         self.setLastRevisionDate(currProposal.getProposalOpenDate())
@@ -554,7 +561,7 @@ class TOMsProposalElement(QObject):
     def __init__(self, proposalsManager, layerID, restriction, restrictionID):
         #def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__()
-        QgsMessageLog.logMessage("In TOMsProposalElement.init. Creating Proposal Element ... " + str(layerID) + ";" + str(restriction), tag="TOMs panel")
+        TOMsLog.debug("In TOMsProposalElement.init. Creating Proposal Element ... {};{}", layerID, restriction)
         self.proposalsManager = proposalsManager
         self.currProposal = self.proposalsManager.currentProposalObject()
         self.tableNames = self.proposalsManager.tableNames
@@ -569,8 +576,7 @@ class TOMsProposalElement(QObject):
         elif restrictionID is not None:
             self.setElement(restrictionID)
 
-        QgsMessageLog.logMessage(
-        "In factory. Creating Proposal Element ... " + str(self.thisElement), tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating Proposal Element ... {}", self.thisElement)
 
     def getGeometryID(self):
         return self.thisElement.attribute("GeometryID")
@@ -578,8 +584,8 @@ class TOMsProposalElement(QObject):
     def setThisLayer(self):
         self.thisLayer = self.proposalsManager.getRestrictionLayerFromID(self.layerID)
         if self.thisLayer is None:
-            QgsMessageLog.logMessage("In TOMsProposalElement:setThisLayer. layer NOT set !!! for " + str(self.layerID), tag="TOMs panel")
-        QgsMessageLog.logMessage("In TOMsProposalElement:setThisLayer ... ", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposalElement:setThisLayer. layer NOT set !!! for {}", self.layerID)
+        TOMsLog.debug("In TOMsProposalElement:setThisLayer ... ")
 
     def setElement(self, restrictionID):
         self.thisRestrictionID = restrictionID
@@ -590,7 +596,7 @@ class TOMsProposalElement(QObject):
             request = QgsFeatureRequest().setFilterExpression(query)
             for element in self.thisLayer.getFeatures(request):
                 self.thisElement = element  # make assumption that only one row
-                QgsMessageLog.logMessage("In TOMsProposalElement:setElement ... " + str(self.getGeometryID()), tag="TOMs panel")
+                TOMsLog.debug("In TOMsProposalElement:setElement ... {}", self.getGeometryID)
                 return True
 
         QMessageBox.information(self.proposalsManager.iface.mainWindow(), "ERROR", ("RestrictionID: \'{restrictionID}\' not found within layer {layerName}".format(restrictionID=restrictionID, layerName=self.thisLayer.name())))
@@ -602,16 +608,15 @@ class TOMsProposalElement(QObject):
     def getTilesForRestriction(self, filterDate):
         # get the tile(s) for a given restriction
 
-        QgsMessageLog.logMessage("In getTilesForRestriction. ", tag="TOMs panel")
+        TOMsLog.debug("In getTilesForRestriction. ")
 
         self.tilesLayer = self.tableNames.setLayer("MapGrid")
         idxTileID = self.tableNames.setLayer("MapGrid").fields().indexFromName("id")
 
         dictTilesInRestriction = dict()
 
-        QgsMessageLog.logMessage(
-            "In factory. Creating Proposal Element ... " + str(self.thisRestrictionID) + ";" + str(self.thisElement.geometry().asWkt()), tag="TOMs panel")
-        QgsMessageLog.logMessage("In getTilesForRestriction. restGeom " + self.thisElement.geometry().boundingBox().asWktPolygon(), tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating Proposal Element ... {};{}", self.thisRestrictionID, self.thisElement.geometry().asWkt)
+        TOMsLog.debug("In getTilesForRestriction. restGeom {}", self.thisElement.geometry().boundingBox().asWktPolygon)
 
         request = QgsFeatureRequest().setFilterRect(self.thisElement.geometry().boundingBox()).setFlags(QgsFeatureRequest.ExactIntersect)
 
@@ -625,8 +630,7 @@ class TOMsProposalElement(QObject):
             if tile.geometry().intersects(self.thisElement.geometry()):
                 # get revision number and add tile to list
                 # currRevisionNrForTile = self.getTileRevisionNr(tile)
-                QgsMessageLog.logMessage("In getTileForRestriction. Tile: " + str(tile.attribute("id")) + "; " + str(
-                    tile.attribute("RevisionNr")) + "; " + str(tile.attribute("LastRevisionDate")), tag="TOMs panel")
+                TOMsLog.debug("In getTileForRestriction. Tile: {}; {}; {}", tile.attribute("id"), tile.attribute("RevisionNr"), tile.attribute("LastRevisionDate"))
 
                 # check revision nr, etc
 
@@ -657,9 +661,7 @@ class TOMsProposalElement(QObject):
 
                 dictTilesInRestriction[currTileNr] = tile
 
-                QgsMessageLog.logMessage(
-                    "In getTileForRestriction. len tileSet: " + str(len(dictTilesInRestriction)),
-                    tag="TOMs panel")
+                TOMsLog.debug("In getTileForRestriction. len tileSet: {}", len(dictTilesInRestriction))
 
                 pass
 
@@ -673,9 +675,7 @@ class TOMsProposalElement(QObject):
         currProposalOpenDate = self.currProposal.getProposalOpenDate()
 
         # update the Open/Close date for the restriction
-        QgsMessageLog.logMessage("In updateProposalElement. layer: " + str(
-            self.thisLayer.name()) + " currRestId: " + self.thisRestrictionID + " Opendate: " + str(
-            currProposalOpenDate), tag="TOMs panel")
+        TOMsLog.debug("In updateProposalElement. layer: {} currRestId: {} Opendate: {}", self.thisLayer.name, self.thisRestrictionID, currProposalOpenDate)
 
         # clear filter currRestrictionLayer.setSubsetString("")  **** need to make sure this is done ...
 
@@ -684,15 +684,13 @@ class TOMsProposalElement(QObject):
                                                             self.thisLayer.fields().indexFromName(
                                                                       "OpenDate"),
                                                                   currProposalOpenDate)
-            QgsMessageLog.logMessage(
-                "In updateRestriction. " + self.thisRestrictionID + " Opened", tag="TOMs panel")
+            TOMsLog.debug("In updateRestriction. {} Opened", self.thisRestrictionID)
         else:  # Close
             statusUpd = self.thisLayer.changeAttributeValue(self.thisElement.id(),
                                                             self.thisLayer.fields().indexFromName(
                                                                       "CloseDate"),
                                                                   currProposalOpenDate)
-            QgsMessageLog.logMessage(
-                "In updateRestriction. " + self.thisRestrictionID + " Closed", tag="TOMs panel")
+            TOMsLog.debug("In updateRestriction. {} Closed", self.thisRestrictionID)
 
         return statusUpd
 
@@ -702,7 +700,7 @@ class TOMsProposalElement(QObject):
 class TOMsRestriction(TOMsProposalElement):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating TOMsRestriction ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating TOMsRestriction ... ")
 
     def getDisplayGeometry(self):
         pass
@@ -710,7 +708,7 @@ class TOMsRestriction(TOMsProposalElement):
 class Bay(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating BAY ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating BAY ... ")
 
     def getGeometryID(self):
         pass
@@ -721,7 +719,7 @@ class Bay(TOMsRestriction):
 class Line(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating LINE ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating LINE ... ")
 
     def getGeometryID(self):
         pass
@@ -732,7 +730,7 @@ class Line(TOMsRestriction):
 class Sign(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating SIGN ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating SIGN ... ")
 
     def getGeometryID(self):
         pass
@@ -743,7 +741,7 @@ class Sign(TOMsRestriction):
 class TOMsPolygonRestriction(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating POLYGON ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating POLYGON ... ")
 
     def getZoneType(self):
         pass
@@ -754,7 +752,7 @@ class TOMsPolygonRestriction(TOMsRestriction):
 class PedestrianZone(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating PedestrianZone ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating PedestrianZone ... ")
 
     def getGeometryID(self):
         pass
@@ -766,7 +764,7 @@ class PedestrianZone(TOMsRestriction):
 class CPZ(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating CPZ ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating CPZ ... ")
 
     def getGeometryID(self):
         pass
@@ -777,7 +775,7 @@ class CPZ(TOMsRestriction):
 class PTA(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating PTA ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating PTA ... ")
 
     def getGeometryID(self):
         pass
@@ -788,7 +786,7 @@ class PTA(TOMsRestriction):
 class TOMsLabel(TOMsProposalElement):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating Label ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating Label ... ")
 
     def getGeometryID(self):
         pass
@@ -797,7 +795,7 @@ class ProposalElementFactory():
 
     @staticmethod
     def getProposalElement(proposalsManager, proposalElementType, restriction, RestrictionID):
-        QgsMessageLog.logMessage("In factory. getProposalElement ... " + str(proposalElementType) + ";" + str(restriction), tag="TOMs panel")
+        TOMsLog.debug("In factory. getProposalElement ... {};{}", proposalElementType, restriction)
         try:
             if proposalElementType == RestrictionLayers.BAYS:
                 return Bay(proposalsManager, proposalElementType, restriction, RestrictionID)
@@ -814,7 +812,7 @@ class ProposalElementFactory():
                 return PTA(proposalsManager, proposalElementType, restriction, RestrictionID)
             raise AssertionError("Restriction Type NOT found")
         except AssertionError as _e:
-            QgsMessageLog.logMessage("In ProposalElementFactory. TYPE not found or something else ... ", tag="TOMs panel")
+            TOMsLog.warning("In ProposalElementFactory. TYPE not found or something else ... ")
 
 class RestrictionPolygonFactory():
 
@@ -831,7 +829,6 @@ class RestrictionPolygonFactory():
                 return RestrictionPolygonFactory()
             raise AssertionError("Proposal Type NOT found")
         except AssertionError as _e:
-            QgsMessageLog.logMessage("In ProposalElementFactory. TYPE not found or something else ... ",
-                                     tag="TOMs panel")
+            TOMsLog.warning("In ProposalElementFactory. TYPE not found or something else ... ")
 
 
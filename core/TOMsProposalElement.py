@@ -33,12 +33,15 @@ from ..constants import (
 
 from abc import ABCMeta, abstractstaticmethod
 from ..core.TOMsProposal import (TOMsTile)
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
 
 class TOMsProposalElement(QObject):
     def __init__(self, proposalsManager, layerID, restriction, restrictionID):
         #def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__()
-        QgsMessageLog.logMessage("In factory. Creating Proposal Element ... " + str(layerID) + ";" + str(restriction), tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating Proposal Element ... {};{}", layerID, restriction)
         self.proposalsManager = proposalsManager
         self.currProposal = self.proposalsManager.currentProposalObject()
         self.tableNames = self.proposalsManager.tableNames
@@ -49,8 +52,7 @@ class TOMsProposalElement(QObject):
         if restriction is not None:
             self.thisElement = restriction
             self.thisRestrictionID = restrictionID
-            QgsMessageLog.logMessage(
-                "In factory. Creating Proposal Element ... " + str(self.thisElement), tag="TOMs panel")
+            TOMsLog.debug("In factory. Creating Proposal Element ... {}", self.thisElement)
         elif restrictionID is not None:
             self.setElement(restrictionID)
 
@@ -60,8 +62,8 @@ class TOMsProposalElement(QObject):
     def setThisLayer(self):
         self.thisLayer = self.proposalsManager.getRestrictionLayerFromID(self.layerID)
         if self.thisLayer is None:
-            QgsMessageLog.logMessage("In TOMsProposalElement:setThisLayer. layer NOT set !!! for " + str(self.layerID), tag="TOMs panel")
-        QgsMessageLog.logMessage("In TOMsProposalElement:setThisLayer ... ", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposalElement:setThisLayer. layer NOT set !!! for {}", self.layerID)
+        TOMsLog.debug("In TOMsProposalElement:setThisLayer ... ")
 
     def setElement(self, restrictionID):
         self.thisRestrictionID = restrictionID
@@ -72,7 +74,7 @@ class TOMsProposalElement(QObject):
             request = QgsFeatureRequest().setFilterExpression(query)
             for element in self.thisLayer.getFeatures(request):
                 self.thisElement = element  # make assumption that only one row
-                QgsMessageLog.logMessage("In TOMsProposalElement:setElement ... " + str(self.getGeometryID()), tag="TOMs panel")
+                TOMsLog.debug("In TOMsProposalElement:setElement ... {}", self.getGeometryID)
                 return True
 
         QMessageBox.information(self.iface.mainWindow(), "ERROR", ("RestrictionID: \'{restrictionID}\' not found within layer {layerName}".format(restrictionID=restrictionID, layerName=self.thisLayer.name())))
@@ -84,16 +86,15 @@ class TOMsProposalElement(QObject):
     def getTilesForRestriction(self, filterDate):
         # get the tile(s) for a given restriction
 
-        QgsMessageLog.logMessage("In getTilesForRestriction. ", tag="TOMs panel")
+        TOMsLog.debug("In getTilesForRestriction. ")
 
         self.tilesLayer = self.tableNames.setLayer("MapGrid")
         idxTileID = self.tableNames.setLayer("MapGrid").fields().indexFromName("id")
 
         dictTilesInRestriction = dict()
 
-        QgsMessageLog.logMessage(
-            "In factory. Creating Proposal Element ... " + str(self.thisRestrictionID) + ";" + str(self.thisElement.geometry().asWkt()), tag="TOMs panel")
-        QgsMessageLog.logMessage("In getTilesForRestriction. restGeom " + self.thisElement.geometry().boundingBox().asWktPolygon(), tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating Proposal Element ... {};{}", self.thisRestrictionID, self.thisElement.geometry().asWkt)
+        TOMsLog.debug("In getTilesForRestriction. restGeom {}", self.thisElement.geometry().boundingBox().asWktPolygon)
 
         request = QgsFeatureRequest().setFilterRect(self.thisElement.geometry().boundingBox()).setFlags(QgsFeatureRequest.ExactIntersect)
 
@@ -107,8 +108,7 @@ class TOMsProposalElement(QObject):
             if tile.geometry().intersects(self.thisElement.geometry()):
                 # get revision number and add tile to list
                 # currRevisionNrForTile = self.getTileRevisionNr(tile)
-                QgsMessageLog.logMessage("In getTileForRestriction. Tile: " + str(tile.attribute("id")) + "; " + str(
-                    tile.attribute("RevisionNr")) + "; " + str(tile.attribute("LastRevisionDate")), tag="TOMs panel")
+                TOMsLog.debug("In getTileForRestriction. Tile: {}; {}; {}", tile.attribute("id"), tile.attribute("RevisionNr"), tile.attribute("LastRevisionDate"))
 
                 # check revision nr, etc
 
@@ -139,9 +139,7 @@ class TOMsProposalElement(QObject):
 
                 dictTilesInRestriction[currTileNr] = tile
 
-                QgsMessageLog.logMessage(
-                    "In getTileForRestriction. len tileSet: " + str(len(dictTilesInRestriction)),
-                    tag="TOMs panel")
+                TOMsLog.debug("In getTileForRestriction. len tileSet: {}", len(dictTilesInRestriction))
 
                 pass
 
@@ -155,9 +153,7 @@ class TOMsProposalElement(QObject):
         currProposalOpenDate = self.currProposal.getProposalOpenDate()
 
         # update the Open/Close date for the restriction
-        QgsMessageLog.logMessage("In updateProposalElement. layer: " + str(
-            self.thisLayer.name()) + " currRestId: " + self.thisRestrictionID + " Opendate: " + str(
-            currProposalOpenDate), tag="TOMs panel")
+        TOMsLog.debug("In updateProposalElement. layer: {} currRestId: {} Opendate: {}", self.thisLayer.name, self.thisRestrictionID, currProposalOpenDate)
 
         # clear filter currRestrictionLayer.setSubsetString("")  **** need to make sure this is done ...
 
@@ -166,15 +162,13 @@ class TOMsProposalElement(QObject):
                                                             self.thisLayer.fields().indexFromName(
                                                                       "OpenDate"),
                                                                   currProposalOpenDate)
-            QgsMessageLog.logMessage(
-                "In updateRestriction. " + self.thisRestrictionID + " Opened", tag="TOMs panel")
+            TOMsLog.debug("In updateRestriction. {} Opened", self.thisRestrictionID)
         else:  # Close
             statusUpd = self.thisLayer.changeAttributeValue(self.thisRestrictionID,
                                                             self.thisLayer.fields().indexFromName(
                                                                       "CloseDate"),
                                                                   currProposalOpenDate)
-            QgsMessageLog.logMessage(
-                "In updateRestriction. " + self.thisRestrictionID + " Closed", tag="TOMs panel")
+            TOMsLog.debug("In updateRestriction. {} Closed", self.thisRestrictionID)
 
         return statusUpd
 
@@ -184,7 +178,7 @@ class TOMsProposalElement(QObject):
 class TOMsRestriction(TOMsProposalElement):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating TOMsRestriction ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating TOMsRestriction ... ")
 
     def getDisplayGeometry(self):
         pass
@@ -192,7 +186,7 @@ class TOMsRestriction(TOMsProposalElement):
 class Bay(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating BAY ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating BAY ... ")
 
     def getGeometryID(self):
         pass
@@ -203,7 +197,7 @@ class Bay(TOMsRestriction):
 class Line(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating LINE ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating LINE ... ")
 
     def getGeometryID(self):
         pass
@@ -214,7 +208,7 @@ class Line(TOMsRestriction):
 class Sign(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating SIGN ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating SIGN ... ")
 
     def getGeometryID(self):
         pass
@@ -225,7 +219,7 @@ class Sign(TOMsRestriction):
 class TOMsPolygonRestriction(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating POLYGON ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating POLYGON ... ")
 
     def getZoneType(self):
         pass
@@ -236,7 +230,7 @@ class TOMsPolygonRestriction(TOMsRestriction):
 class PedestrianZone(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating PedestrianZone ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating PedestrianZone ... ")
 
     def getGeometryID(self):
         pass
@@ -248,7 +242,7 @@ class PedestrianZone(TOMsRestriction):
 class CPZ(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating CPZ ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating CPZ ... ")
 
     def getGeometryID(self):
         pass
@@ -259,7 +253,7 @@ class CPZ(TOMsRestriction):
 class PTA(TOMsRestriction):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating PTA ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating PTA ... ")
 
     def getGeometryID(self):
         pass
@@ -270,7 +264,7 @@ class PTA(TOMsRestriction):
 class TOMsLabel(TOMsProposalElement):
     def __init__(self, proposalsManager, layerID=None, restriction=None, restrictionID=None):
         super().__init__(proposalsManager, layerID, restriction, restrictionID)
-        QgsMessageLog.logMessage("In factory. Creating Label ... ", tag="TOMs panel")
+        TOMsLog.debug("In factory. Creating Label ... ")
 
     def getGeometryID(self):
         pass
@@ -279,7 +273,7 @@ class ProposalElementFactory():
 
     @staticmethod
     def getProposalElement(proposalsManager, proposalElementType, restriction, RestrictionID):
-        QgsMessageLog.logMessage("In factory. getProposalElement ... " + str(proposalElementType) + ";" + str(restriction), tag="TOMs panel")
+        TOMsLog.debug("In factory. getProposalElement ... {};{}", proposalElementType, restriction)
         try:
             if proposalElementType == RestrictionLayers.BAYS:
                 return Bay(proposalsManager, proposalElementType, restriction, RestrictionID)
@@ -296,7 +290,7 @@ class ProposalElementFactory():
                 return PTA(proposalsManager, proposalElementType, restriction, RestrictionID)
             raise AssertionError("Restriction Type NOT found")
         except AssertionError as _e:
-            QgsMessageLog.logMessage("In ProposalElementFactory. TYPE not found or something else ... ", tag="TOMs panel")
+            TOMsLog.warning("In ProposalElementFactory. TYPE not found or something else ... ")
 
 class RestrictionPolygonFactory():
 
@@ -313,6 +307,5 @@ class RestrictionPolygonFactory():
                 return RestrictionPolygonFactory()
             raise AssertionError("Proposal Type NOT found")
         except AssertionError as _e:
-            QgsMessageLog.logMessage("In ProposalElementFactory. TYPE not found or something else ... ",
-                                     tag="TOMs panel")
+            TOMsLog.warning("In ProposalElementFactory. TYPE not found or something else ... ")
 
@@ -0,0 +1,109 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Builds the subset strings showing the restrictions current at a date - taking into account the current proposal.
+
+For a proposal, restrictions that the proposal closes are hidden and those it opens are shown. Where the restriction
+layer and "RestrictionsInProposals" are tables in the same PostgreSQL database this is done with subqueries against
+"RestrictionsInProposals", i.e., the subset string is the same size whatever the size of the proposal. Otherwise
+(e.g., memory or file based layers) the RestrictionIDs are listed within the subset string.
+"""
+
+from qgis.core import (
+    QgsDataSourceUri
+)
+
+from ..constants import (
+    RestrictionAction
+)
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsProposalFilter(object):
+
+    def __init__(self, restrictionsInProposalsLayer):
+        self.restrictionsInProposalsLayer = restrictionsInProposalsLayer
+        self.restrictionsInProposalsTable = self.__subqueryTable(restrictionsInProposalsLayer)
+
+    @staticmethod
+    def dateFilter(filterDate):
+        """ Restrictions open at filterDate (QDate) """
+
+        dateChoosenFormatted = "'{dateString}'".format(dateString=filterDate.toString('dd-MM-yyyy'))
+
+        return u'"OpenDate" <= to_date({dateChoosenFormatted}, \'dd-MM-yyyy\') AND ("CloseDate" > to_date({dateChoosenFormatted}, \'dd-MM-yyyy\') OR "CloseDate" IS NULL)'.format(
+            dateChoosenFormatted=dateChoosenFormatted)
+
+    @staticmethod
+    def connection(uri):
+        return (uri.service(), uri.host(), uri.port(), uri.database())
+
+    @classmethod
+    def __subqueryTable(cls, layer):
+        """ Returns (connection, quoted table name) if the layer is a PostgreSQL table that can be used within a subquery """
+
+        if layer is None or layer.providerType() != 'postgres':
+            return None
+
+        uri = QgsDataSourceUri(layer.source())
+        if not uri.table() or uri.table().startswith('(') or uri.sql():
+            # query layer or filtered within the source - the subquery would not see the same rows
+            return None
+
+        return (cls.connection(uri), uri.quotedTablename())
+
+    def usesSubquery(self, layer):
+        """ Whether the filter for the layer can use subqueries against RestrictionsInProposals """
+
+        if self.restrictionsInProposalsTable is None or layer.providerType() != 'postgres':
+            return False
+
+        (restrictionsInProposalsConnection, _) = self.restrictionsInProposalsTable
+        return self.connection(QgsDataSourceUri(layer.source())) == restrictionsInProposalsConnection
+
+    def restrictionsInProposalQuery(self, proposalID, layerID, actionOnAcceptance=None):
+
+        (_, restrictionsInProposalsTable) = self.restrictionsInProposalsTable
+
+        query = 'SELECT "RestrictionID" FROM {table} WHERE "ProposalID" = {proposalID} AND "RestrictionTableID" = {layerID}'.format(
+            table=restrictionsInProposalsTable, proposalID=int(proposalID), layerID=int(layerID))
+
+        if actionOnAcceptance is not None:
+            query = '{query} AND "ActionOnProposalAcceptance" = {actionOnAcceptance}'.format(query=query,
+                                                                                             actionOnAcceptance=int(actionOnAcceptance))
+
+        return query
+
+    def layerFilter(self, layer, layerID, filterDate, proposal=None):
+        """ Subset string for the restriction layer (layerID within "RestrictionLayers") at filterDate for the proposal """
+
+        filterString = self.dateFilter(filterDate)
+
+        if proposal is None or proposal.getProposalNr() <= 0:
+            return filterString
+
+        if self.usesSubquery(layer):
+            restrictionsToClose = self.restrictionsInProposalQuery(proposal.getProposalNr(), layerID, RestrictionAction.CLOSE)
+            restrictionsToOpen = self.restrictionsInProposalQuery(proposal.getProposalNr(), layerID, RestrictionAction.OPEN)
+        else:
+            restrictionsToClose = proposal.getRestrictionsToCloseForLayer(layerID)
+            restrictionsToOpen = proposal.getRestrictionsToOpenForLayer(layerID)
+
+        if len(restrictionsToClose) > 0:
+            filterString = '{filterString} AND "RestrictionID" NOT IN ({restrictionsToClose})'.format(filterString=filterString,
+                                                                                                      restrictionsToClose=restrictionsToClose)
+
+        if len(restrictionsToOpen) > 0:
+            filterString = '"RestrictionID" IN ({restrictionsToOpen}) OR ({filterString})'.format(filterString=filterString,
+                                                                                                  restrictionsToOpen=restrictionsToOpen)
+
+        return filterString
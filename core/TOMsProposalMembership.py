@@ -0,0 +1,136 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+The restrictions within a proposal, i.e., its rows of "RestrictionsInProposals".
+
+The rows are read with a single request and held by restriction layer (RestrictionTableID: {RestrictionID: action}).
+Edits to "RestrictionsInProposals" are applied as they are made. After a commit, rollback or reload the rows are
+read again when next required.
+"""
+
+from qgis.PyQt.QtCore import (
+    QObject
+)
+
+from qgis.core import (
+    QgsFeatureRequest
+)
+
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsProposalMembership(QObject):
+
+    FIELDS = ["ProposalID", "RestrictionTableID", "RestrictionID", "ActionOnProposalAcceptance"]
+
+    def __init__(self, restrictionsInProposalsLayer, proposalID):
+
+        QObject.__init__(self)
+
+        self.restrictionsInProposalsLayer = restrictionsInProposalsLayer
+        self.proposalID = proposalID
+
+        self.__rows = None          # fid: (RestrictionTableID, RestrictionID, ActionOnProposalAcceptance)
+        self.__layerIndex = None    # RestrictionTableID: {RestrictionID: ActionOnProposalAcceptance}
+        self.__version = 0          # incremented with each change, e.g., for results derived from the membership
+
+        restrictionsInProposalsLayer.featureAdded.connect(self.onFeatureChanged)
+        restrictionsInProposalsLayer.attributeValueChanged.connect(self.onFeatureChanged)
+        restrictionsInProposalsLayer.featureDeleted.connect(self.onFeatureDeleted)
+        restrictionsInProposalsLayer.afterCommitChanges.connect(self.invalidate)
+        restrictionsInProposalsLayer.afterRollBack.connect(self.invalidate)
+        restrictionsInProposalsLayer.dataSourceChanged.connect(self.invalidate)
+
+    def release(self):
+
+        try:
+            self.restrictionsInProposalsLayer.featureAdded.disconnect(self.onFeatureChanged)
+            self.restrictionsInProposalsLayer.attributeValueChanged.disconnect(self.onFeatureChanged)
+            self.restrictionsInProposalsLayer.featureDeleted.disconnect(self.onFeatureDeleted)
+            self.restrictionsInProposalsLayer.afterCommitChanges.disconnect(self.invalidate)
+            self.restrictionsInProposalsLayer.afterRollBack.disconnect(self.invalidate)
+            self.restrictionsInProposalsLayer.dataSourceChanged.disconnect(self.invalidate)
+        except (TypeError, RuntimeError):
+            # layer already removed
+            pass
+
+    def restrictionsForLayer(self, layerID, actionOnAcceptance=None):
+        """ Returns [(RestrictionID, ActionOnProposalAcceptance)] for the restriction layer (layerID within "RestrictionLayers") """
+
+        restrictions = self.__index().get(layerID, dict())
+
+        return [(restrictionID, action) for (restrictionID, action) in restrictions.items()
+                if actionOnAcceptance is None or action == actionOnAcceptance]
+
+    def restrictionLayerIDs(self):
+        return [layerID for (layerID, restrictions) in self.__index().items() if restrictions]
+
+    def contains(self, restrictionID, layerID):
+        return restrictionID in self.__index().get(layerID, dict())
+
+    def version(self):
+        return self.__version
+
+    def __index(self):
+        if self.__layerIndex is None:
+            self.__load()
+        return self.__layerIndex
+
+    def __load(self):
+
+        TOMsLog.debug("In TOMsProposalMembership. loading proposal {}", self.proposalID)
+
+        request = QgsFeatureRequest().setFilterExpression('"ProposalID" = {}'.format(int(self.proposalID)))
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(self.FIELDS, self.restrictionsInProposalsLayer.fields())
+
+        self.__rows = dict()
+        self.__layerIndex = dict()
+        for row in self.restrictionsInProposalsLayer.getFeatures(request):
+            self.__addRow(row)
+
+    def __addRow(self, row):
+
+        record = (row.attribute("RestrictionTableID"), row.attribute("RestrictionID"), row.attribute("ActionOnProposalAcceptance"))
+        self.__rows[row.id()] = record
+        self.__layerIndex.setdefault(record[0], dict())[record[1]] = record[2]
+
+    def __removeRow(self, fid):
+
+        record = self.__rows.pop(fid, None)
+        if record is not None:
+            self.__layerIndex.get(record[0], dict()).pop(record[1], None)
+
+    def onFeatureChanged(self, fid, *args):
+
+        if self.__layerIndex is None:
+            return
+
+        self.__version += 1
+        self.__removeRow(fid)
+
+        row = self.restrictionsInProposalsLayer.getFeature(fid)
+        if row.isValid() and row.attribute("ProposalID") == self.proposalID:
+            self.__addRow(row)
+
+    def onFeatureDeleted(self, fid):
+
+        if self.__layerIndex is None:
+            return
+
+        self.__version += 1
+        self.__removeRow(fid)
+
+    def invalidate(self):
+        self.__version += 1
+        self.__rows = None
+        self.__layerIndex = None
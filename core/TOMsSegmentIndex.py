@@ -0,0 +1,161 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Grid index of line segments - used to find the nearest segment (and point on it) to a point.
+
+This is plain Python (no QGIS objects) so that an index can be pickled, e.g., to pass to other processes.
+"""
+
+import math
+
+DEFAULT_CELL_SIZE = 50.0
+
+class SegmentGridIndex():
+
+    def __init__(self, cellSize=DEFAULT_CELL_SIZE):
+        self.cellSize = float(cellSize)
+        self.__segments = []          # (x1, y1, x2, y2, key) - None once removed
+        self.__cells = dict()         # (i, j): [segment nr]
+        self.__keySegments = dict()   # key: [segment nr]
+
+    def __len__(self):
+        return len(self.__keySegments)
+
+    def keys(self):
+        return self.__keySegments.keys()
+
+    def addLine(self, key, points):
+        """ Add the segments of the line "points" (sequence of (x, y)) for key (e.g., feature id) """
+
+        segmentNrs = self.__keySegments.setdefault(key, [])
+
+        for (x1, y1), (x2, y2) in zip(points[:-1], points[1:]):
+            segmentNr = len(self.__segments)
+            self.__segments.append((x1, y1, x2, y2, key))
+            segmentNrs.append(segmentNr)
+
+            for cell in self.__cellsForRect(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)):
+                self.__cells.setdefault(cell, []).append(segmentNr)
+
+    def removeKey(self, key):
+
+        for segmentNr in self.__keySegments.pop(key, []):
+            x1, y1, x2, y2, _ = self.__segments[segmentNr]
+            for cell in self.__cellsForRect(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)):
+                cellSegments = self.__cells.get(cell)
+                if cellSegments is not None:
+                    cellSegments.remove(segmentNr)
+                    if len(cellSegments) == 0:
+                        del self.__cells[cell]
+            self.__segments[segmentNr] = None
+
+    def nearest(self, x, y, maxDistance, searchRect=None):
+        """ Returns (distance, (x, y) of nearest point, key) for the nearest line within maxDistance - or None
+
+            If searchRect (xMin, yMin, xMax, yMax) is given, only lines that intersect it are considered (as with a
+            feature request using setFilterRect and ExactIntersect). It needs to lie within maxDistance of (x, y).
+        """
+
+        nearestForKey = dict()   # key: (distance, nearest point)
+        keysInRect = set()
+
+        for segmentNr in self.__segmentsInRect(x - maxDistance, y - maxDistance, x + maxDistance, y + maxDistance):
+            x1, y1, x2, y2, key = self.__segments[segmentNr]
+
+            distance, nearestPt = self.pointSegmentDistance(x, y, x1, y1, x2, y2)
+            if distance < nearestForKey.get(key, (float("inf"), None))[0]:
+                nearestForKey[key] = (distance, nearestPt)
+
+            if searchRect is not None and key not in keysInRect:
+                if self.segmentIntersectsRect(x1, y1, x2, y2, searchRect):
+                    keysInRect.add(key)
+
+        best = None
+        for key, (distance, nearestPt) in nearestForKey.items():
+            if distance > maxDistance:
+                continue
+            if searchRect is not None and key not in keysInRect:
+                continue
+            if best is None or distance < best[0]:
+                best = (distance, nearestPt, key)
+
+        return best
+
+    def nearestInBox(self, x, y, tolerance):
+        """ As nearest, for the lines that intersect the box of size tolerance around (x, y) - as a feature request
+            using the buffered bounding box of the point.
+        """
+        return self.nearest(x, y, tolerance * math.sqrt(2), (x - tolerance, y - tolerance, x + tolerance, y + tolerance))
+
+    @staticmethod
+    def pointSegmentDistance(x, y, x1, y1, x2, y2):
+
+        dx = x2 - x1
+        dy = y2 - y1
+        lengthSquared = dx * dx + dy * dy
+
+        if lengthSquared == 0.0:
+            t = 0.0
+        else:
+            t = ((x - x1) * dx + (y - y1) * dy) / lengthSquared
+            t = max(0.0, min(1.0, t))
+
+        nearestX = x1 + t * dx
+        nearestY = y1 + t * dy
+
+        return math.hypot(x - nearestX, y - nearestY), (nearestX, nearestY)
+
+    @staticmethod
+    def segmentIntersectsRect(x1, y1, x2, y2, rect):
+        # Liang-Barsky clipping
+
+        xMin, yMin, xMax, yMax = rect
+        dx = x2 - x1
+        dy = y2 - y1
+
+        t0 = 0.0
+        t1 = 1.0
+        for p, q in ((-dx, x1 - xMin), (dx, xMax - x1), (-dy, y1 - yMin), (dy, yMax - y1)):
+            if p == 0.0:
+                if q < 0.0:
+                    return False
+            else:
+                t = q / p
+                if p < 0.0:
+                    if t > t1:
+                        return False
+                    t0 = max(t0, t)
+                else:
+                    if t < t0:
+                        return False
+                    t1 = min(t1, t)
+
+        return True
+
+    def __cellsForRect(self, xMin, yMin, xMax, yMax):
+
+        iMin = int(math.floor(xMin / self.cellSize))
+        iMax = int(math.floor(xMax / self.cellSize))
+        jMin = int(math.floor(yMin / self.cellSize))
+        jMax = int(math.floor(yMax / self.cellSize))
+
+        for i in range(iMin, iMax + 1):
+            for j in range(jMin, jMax + 1):
+                yield (i, j)
+
+    def __segmentsInRect(self, xMin, yMin, xMax, yMax):
+
+        found = set()
+        for cell in self.__cellsForRect(xMin, yMin, xMax, yMax):
+            for segmentNr in self.__cells.get(cell, []):
+                if segmentNr not in found:
+                    found.add(segmentNr)
+                    yield segmentNr
@@ -34,6 +34,9 @@ from ..constants import (
     ProposalStatus,
     RestrictionAction
 )
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
 
 class TOMsTile(QObject):
     def __init__(self, proposalsManager, tileNr=None):
@@ -50,13 +53,13 @@ class TOMsTile(QObject):
     def setTilesLayer(self):
         self.tilesLayer = self.tableNames.setLayer("MapGrid")
         if self.tilesLayer is None:
-            QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer. tilesLayer layer NOT set !!!", tag="TOMs panel")
-        QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer... ", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal:setTilesLayer. tilesLayer layer NOT set !!!")
+        TOMsLog.debug("In TOMsProposal:setTilesLayer... ")
 
         self.tilesInAcceptedProposalsLayer = self.tableNames.setLayer("TilesInAcceptedProposals")
         if self.tilesLayer is None:
-            QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer. tilesInAcceptedProposalsLayer layer NOT set !!!", tag="TOMs panel")
-        QgsMessageLog.logMessage("In TOMsProposal:setTilesLayer... tilesInAcceptedProposalsLayer ", tag="TOMs panel")
+            TOMsLog.debug("In TOMsProposal:setTilesLayer. tilesInAcceptedProposalsLayer layer NOT set !!!")
+        TOMsLog.debug("In TOMsProposal:setTilesLayer... tilesInAcceptedProposalsLayer ")
 
     def setTile(self, tileNr):
 
@@ -92,7 +95,7 @@ class TOMsTile(QObject):
 
     def getTileRevisionNrAtDate(self, filterDate=None):
 
-        QgsMessageLog.logMessage("In TOMsTile:getTileRevisionNrAtDate.", tag="TOMs panel")
+        TOMsLog.debug("In TOMsTile:getTileRevisionNrAtDate.")
 
         if filterDate is None:
             filterDate = self.proposalsManager.date()
@@ -101,7 +104,7 @@ class TOMsTile(QObject):
 
         queryString = "\"TileNr\" = " + str(self.thisTileNr)
 
-        QgsMessageLog.logMessage("In getTileRevisionNrAtDate: queryString: " + str(queryString), tag="TOMs panel")
+        TOMsLog.debug("In getTileRevisionNrAtDate: queryString: {}", queryString)
 
         expr = QgsExpression(queryString)
 
@@ -118,26 +121,19 @@ class TOMsTile(QObject):
             #lastProposalOpendate = self.proposalsManager.getProposalOpenDate(lastProposalID)
             lastProposalOpendate = tileProposal.getProposalOpenDate()
 
-            QgsMessageLog.logMessage(
-                "In getTileRevisionNrAtDate: last Proposal: " + str(lastProposalID) + "; " + str(lastRevisionNr),
-                tag="TOMs panel")
+            TOMsLog.debug("In getTileRevisionNrAtDate: last Proposal: {}; {}", lastProposalID, lastRevisionNr)
 
-            QgsMessageLog.logMessage(
-                "In getTileRevisionNrAtDate: last Proposal open date: " + str(lastProposalOpendate) + "; filter date: " + str(filterDate),
-                tag="TOMs panel")
+            TOMsLog.debug("In getTileRevisionNrAtDate: last Proposal open date: {}; filter date: {}", lastProposalOpendate, filterDate)
 
             if lastProposalOpendate <= filterDate:
-                QgsMessageLog.logMessage(
-                    "In getTileRevisionNrAtDate: using Proposal: " + str(lastProposalID) + "; " + str(lastRevisionNr),
-                    tag="TOMs panel")
+                TOMsLog.debug("In getTileRevisionNrAtDate: using Proposal: {}; {}", lastProposalID, lastRevisionNr)
                 return lastRevisionNr, lastProposalOpendate
 
         return 0, None
 
     def updateTileRevisionNr(self):
 
-        QgsMessageLog.logMessage(
-            "In TOMsTile:updateTileRevisionNr. tile" + str(self.thisTileNr) + " currRevNr: ", tag="TOMs panel")
+        TOMsLog.debug("In TOMsTile:updateTileRevisionNr. tile{} currRevNr: ", self.thisTileNr)
 
         # This will update the revision numberwithin "Tiles" and add a record to "TilesWithinAcceptedProposals"
 
@@ -145,9 +141,7 @@ class TOMsTile(QObject):
 
         # check that there are no revisions beyond this date
         if self.lastRevisionDate < currProposal.getProposalOpenDate():
-            QgsMessageLog.logMessage(
-                "In updateTileRevisionNr. tile" + str(self.thisTileNr) + " revision numbers are out of sync",
-                tag="TOMs panel")
+            TOMsLog.debug("In updateTileRevisionNr. tile{} revision numbers are out of sync", self.thisTileNr)
             QMessageBox.information(self.iface.mainWindow(), "ERROR", ("In updateTileRevisionNr. tile" + str(self.thisTileNr) + " revision numbers are out of sync"))
             return False
 
@@ -142,7 +142,7 @@ class TOMsTransaction(QObject):
             self.modified = False
             self.errorOccurred = False
 
-            self.transactionCompleted.connect(self.proposalsManager.updateMapCanvas)
+            self.transactionCompleted.connect(self.proposalsManager.refreshMapCanvas)
 
             return
 
@@ -0,0 +1,306 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Indexes for the zone (CPZ and Parking Tariff Area) layers - attributes by zone name and zone polygons by location.
+
+The label functions need, e.g., the waiting time for the CPZ of every restriction. Rather than looking through all
+the zones each time, the zone layer is read once into a dictionary keyed by CPZ code / PTA name. The index is rebuilt
+(when next required) after the zone layer is edited or reloaded.
+"""
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QThread
+)
+
+from qgis.core import (
+    NULL,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsWkbTypes
+)
+
+import threading
+
+from ..restrictionTypeUtilsClass import Singleton
+from .TOMsZonePolygonIndex import ZonePolygonIndex
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
+class TOMsZoneAttributeIndex(metaclass=Singleton):
+
+    # zone layer: (key field, attributes held)
+    ZONE_LAYERS = {"CPZs": ("CPZ", ["WaitingTimeID"]),
+                   "ParkingTariffAreas": ("Name", ["TimePeriodID", "MaxStayID", "NoReturnTimeID"])
+                   }
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsZoneAttributeIndex.init ...")
+
+        self.__lock = threading.Lock()
+        self.__indexes = dict()        # layer id: {zone key: {attribute: value}}
+        self.__watchedLayers = dict()  # layer id: layer
+
+    def getZoneAttributes(self, layerName, zoneKey, zoneLayer=None):
+        """ Returns the attributes (dict) for the zone with the given CPZ code / PTA name - or None
+
+            zoneLayer is the layer "layerName" (found within the project if not given)
+        """
+
+        if zoneKey is None or zoneKey == NULL:
+            return None
+
+        if zoneLayer is None:
+            layers = QgsProject.instance().mapLayersByName(layerName)
+            if len(layers) == 0:
+                return None
+            zoneLayer = layers[0]
+
+        with self.__lock:
+            index = self.__indexes.get(zoneLayer.id())
+
+        if index is None:
+            if not self.watchLayer(zoneLayer):
+                # not able to watch the layer from here, so can't hold an index
+                return self.__scanLayer(layerName, zoneLayer, zoneKey)
+            index = self.__buildIndex(layerName, zoneLayer)
+
+        return index.get(zoneKey)
+
+    def getZoneAttribute(self, layerName, zoneKey, attribute):
+        zoneAttributes = self.getZoneAttributes(layerName, zoneKey)
+        if zoneAttributes is None:
+            return None
+        return zoneAttributes.get(attribute)
+
+    def watchLayer(self, zoneLayer):
+        """ Rebuild the index when the zone layer is edited or reloaded. Returns False if the layer can't be watched """
+
+        if zoneLayer is None:
+            return False
+
+        layerId = zoneLayer.id()
+
+        with self.__lock:
+            if layerId in self.__watchedLayers:
+                return True
+
+        # connections made from a render thread would not be delivered
+        if QThread.currentThread() != QCoreApplication.instance().thread():
+            return False
+
+        with self.__lock:
+            self.__watchedLayers[layerId] = zoneLayer
+
+        zoneLayer.dataChanged.connect(lambda: self.invalidate(layerId))
+        zoneLayer.dataSourceChanged.connect(lambda: self.invalidate(layerId))
+        zoneLayer.willBeDeleted.connect(lambda: self.forget(layerId))
+
+        return True
+
+    def __zoneAttributes(self, zone, attributes):
+        return dict((attribute, zone.attribute(attribute)) for attribute in attributes)
+
+    def __buildIndex(self, layerName, zoneLayer):
+
+        TOMsLog.debug("In TOMsZoneAttributeIndex. building index for {}", layerName)
+
+        keyField, attributes = self.ZONE_LAYERS[layerName]
+
+        index = dict()
+        for zone in zoneLayer.getFeatures():
+            zoneKey = zone.attribute(keyField)
+            if zoneKey is None or zoneKey == NULL or zoneKey in index:
+                continue   # first zone found is used (as before)
+            index[zoneKey] = self.__zoneAttributes(zone, attributes)
+
+        with self.__lock:
+            self.__indexes[zoneLayer.id()] = index
+
+        return index
+
+    def __scanLayer(self, layerName, zoneLayer, zoneKey):
+
+        keyField, attributes = self.ZONE_LAYERS[layerName]
+
+        for zone in zoneLayer.getFeatures():
+            if zone.attribute(keyField) == zoneKey:
+                return self.__zoneAttributes(zone, attributes)
+
+        return None
+
+    def invalidate(self, layerId):
+        TOMsLog.debug("In TOMsZoneAttributeIndex.invalidate {}", layerId)
+        with self.__lock:
+            self.__indexes.pop(layerId, None)
+
+    def forget(self, layerId):
+        with self.__lock:
+            self.__indexes.pop(layerId, None)
+            self.__watchedLayers.pop(layerId, None)
+
+class TOMsZoneLocator(metaclass=Singleton):
+    """
+    Finds the zone (CPZ, PTA, ...) containing a point.
+
+    For each zone layer a ZonePolygonIndex (as used by TOMsBulkRecompute) and prepared geometries are held. These are updated as zones are edited, and
+    rebuilt (when next required) after changes are committed/rolled back or the layer is reloaded.
+    """
+
+    def __init__(self):
+
+        TOMsLog.debug("In TOMsZoneLocator.init ...")
+
+        self.__lock = threading.RLock()
+        self.__zoneIndexes = dict()     # layer id: ZonePolygonIndex
+        self.__zones = dict()           # layer id: {fid: (zone, prepared geometry)}
+        self.__watchedLayers = dict()   # layer id: layer
+
+    def findZone(self, zoneLayer, point):
+        """ Returns the zone feature containing point (QgsPointXY or point QgsGeometry) - or None """
+
+        pointGeometry = point if isinstance(point, QgsGeometry) else QgsGeometry.fromPointXY(point)
+
+        with self.__lock:
+            watched = zoneLayer.id() in self.__watchedLayers
+
+        if not watched and not self.watchLayer(zoneLayer):
+            # can't keep an index up to date from here. Use the layer's own spatial filter
+            request = QgsFeatureRequest().setFilterRect(pointGeometry.boundingBox())
+            for zone in zoneLayer.getFeatures(request):
+                if zone.geometry().contains(pointGeometry):
+                    return zone
+            return None
+
+        with self.__lock:
+            if zoneLayer.id() not in self.__zoneIndexes:
+                self.__buildIndex(zoneLayer)
+
+            zoneIndex = self.__zoneIndexes[zoneLayer.id()]
+            zones = self.__zones[zoneLayer.id()]
+
+            # lowest fid first - as the original scan through the layer
+            pointXY = pointGeometry.asPoint()
+            for fid in zoneIndex.candidates(pointXY.x(), pointXY.y()):
+                zone, engine = zones.get(fid, (None, None))
+                if engine is not None and engine.contains(pointGeometry.constGet()):
+                    return QgsFeature(zone)
+
+        return None
+
+    def watchLayer(self, zoneLayer):
+        """ Keep the index for the zone layer up to date. Returns False if the layer can't be watched """
+
+        if zoneLayer is None:
+            return False
+
+        layerId = zoneLayer.id()
+
+        with self.__lock:
+            if layerId in self.__watchedLayers:
+                return True
+
+        # connections made from a render thread would not be delivered
+        if QThread.currentThread() != QCoreApplication.instance().thread():
+            return False
+
+        with self.__lock:
+            self.__watchedLayers[layerId] = zoneLayer
+
+        zoneLayer.featureAdded.connect(lambda fid: self.updateZone(layerId, fid))
+        zoneLayer.geometryChanged.connect(lambda fid, geometry: self.updateZone(layerId, fid))
+        zoneLayer.attributeValueChanged.connect(lambda fid, idx, value: self.updateZone(layerId, fid))
+        zoneLayer.featureDeleted.connect(lambda fid: self.removeZone(layerId, fid))
+        zoneLayer.afterCommitChanges.connect(lambda: self.invalidate(layerId))
+        zoneLayer.afterRollBack.connect(lambda: self.invalidate(layerId))
+        zoneLayer.dataSourceChanged.connect(lambda: self.invalidate(layerId))
+        zoneLayer.dataProvider().dataChanged.connect(lambda: self.invalidate(layerId))
+        zoneLayer.willBeDeleted.connect(lambda: self.forget(layerId))
+
+        return True
+
+    def __buildIndex(self, zoneLayer):
+
+        TOMsLog.debug("In TOMsZoneLocator. building index for {}", zoneLayer.name)
+
+        zoneIndex = ZonePolygonIndex()
+        zones = dict()
+
+        for zone in zoneLayer.getFeatures():
+            engine = self.__preparedGeometry(zone)
+            if engine is None:
+                continue
+            zoneIndex.addZone(zone.id(), self.zonePolygons(zone.geometry()))
+            zones[zone.id()] = (zone, engine)
+
+        self.__zoneIndexes[zoneLayer.id()] = zoneIndex
+        self.__zones[zoneLayer.id()] = zones
+
+    @staticmethod
+    def zonePolygons(geometry):
+        """ Returns the polygons of the zone geometry as lists of rings of (x, y) - as needed for ZonePolygonIndex """
+
+        if geometry is None or geometry.isNull():
+            return []
+
+        if QgsWkbTypes.isCurvedType(geometry.wkbType()):
+            geometry = QgsGeometry(geometry.constGet().segmentize())
+
+        polygons = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+        return [[[(pt.x(), pt.y()) for pt in ring] for ring in polygon] for polygon in polygons]
+
+    def __preparedGeometry(self, zone):
+
+        geometry = zone.geometry()
+        if geometry is None or geometry.isNull():
+            return None
+
+        engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        engine.prepareGeometry()
+        return engine
+
+    def updateZone(self, layerId, fid):
+
+        with self.__lock:
+            if layerId not in self.__zoneIndexes:
+                return   # index not yet built
+
+            self.removeZone(layerId, fid)
+
+            zone = self.__watchedLayers[layerId].getFeature(fid)
+            engine = self.__preparedGeometry(zone)
+            if engine is not None:
+                self.__zoneIndexes[layerId].addZone(fid, self.zonePolygons(zone.geometry()))
+                self.__zones[layerId][fid] = (zone, engine)
+
+    def removeZone(self, layerId, fid):
+
+        with self.__lock:
+            if layerId not in self.__zoneIndexes:
+                return
+
+            self.__zones[layerId].pop(fid, None)
+            self.__zoneIndexes[layerId].removeKey(fid)
+
+    def invalidate(self, layerId):
+        TOMsLog.debug("In TOMsZoneLocator.invalidate {}", layerId)
+        with self.__lock:
+            self.__zoneIndexes.pop(layerId, None)
+            self.__zones.pop(layerId, None)
+
+    def forget(self, layerId):
+        with self.__lock:
+            self.invalidate(layerId)
+            self.__watchedLayers.pop(layerId, None)
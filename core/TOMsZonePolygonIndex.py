@@ -0,0 +1,109 @@
+#-----------------------------------------------------------
+# Licensed under the terms of GNU GPL 2
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#---------------------------------------------------------------------
+# Tim Hancock/Matthias Kuhn 2017
+
+"""
+Grid index of zone (multi)polygons - used to find the zone (CPZ, PTA, ...) containing a point.
+
+This is plain Python (no QGIS objects) so that an index can be pickled, e.g., to pass to other processes. It is used
+by TOMsZoneLocator (within QGIS) and TOMsDerivedAttributes (within the worker processes of TOMsBulkRecompute).
+"""
+
+import math
+
+DEFAULT_ZONE_CELL_SIZE = 200.0
+
+class ZonePolygonIndex():
+
+    def __init__(self, cellSize=DEFAULT_ZONE_CELL_SIZE):
+        self.cellSize = float(cellSize)
+        self.__zones = dict()     # key: ((xMin, yMin, xMax, yMax), polygons)
+        self.__cells = dict()     # (i, j): [key]
+
+    def __len__(self):
+        return len(self.__zones)
+
+    def keys(self):
+        return self.__zones.keys()
+
+    def addZone(self, key, polygons):
+        """ Add the zone for key (e.g., feature id). polygons is a list of polygons, each a list of rings (sequence of (x, y)) """
+
+        self.removeKey(key)
+
+        points = [pt for polygon in polygons for ring in polygon for pt in ring]
+        if len(points) == 0:
+            return
+
+        bbox = (min(x for (x, y) in points), min(y for (x, y) in points),
+                max(x for (x, y) in points), max(y for (x, y) in points))
+
+        self.__zones[key] = (bbox, [[list(ring) for ring in polygon] for polygon in polygons])
+
+        for cell in self.__cellsForRect(*bbox):
+            self.__cells.setdefault(cell, []).append(key)
+
+    def removeKey(self, key):
+
+        zone = self.__zones.pop(key, None)
+        if zone is None:
+            return
+
+        for cell in self.__cellsForRect(*zone[0]):
+            cellKeys = self.__cells.get(cell)
+            if cellKeys is not None:
+                cellKeys.remove(key)
+                if len(cellKeys) == 0:
+                    del self.__cells[cell]
+
+    def candidates(self, x, y):
+        """ Returns the keys (sorted) of the zones whose bounding box contains (x, y) """
+
+        cell = (int(math.floor(x / self.cellSize)), int(math.floor(y / self.cellSize)))
+
+        keys = []
+        for key in self.__cells.get(cell, []):
+            (xMin, yMin, xMax, yMax), polygons = self.__zones[key]
+            if xMin <= x <= xMax and yMin <= y <= yMax:
+                keys.append(key)
+
+        return sorted(keys)
+
+    def findZone(self, x, y):
+        """ Returns the key of the zone containing (x, y) - the lowest key if there is more than one - or None """
+
+        for key in self.candidates(x, y):
+            if self.zoneContains(key, x, y):
+                return key
+
+        return None
+
+    def zoneContains(self, key, x, y):
+
+        bbox, polygons = self.__zones[key]
+        return any(self.polygonContains(polygon, x, y) for polygon in polygons)
+
+    @staticmethod
+    def polygonContains(polygon, x, y):
+        # even-odd rule over all the rings, i.e., holes are excluded
+
+        inside = False
+        for ring in polygon:
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                if (y1 > y) != (y2 > y):
+                    if x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                        inside = not inside
+
+        return inside
+
+    def __cellsForRect(self, xMin, yMin, xMax, yMax):
+
+        for i in range(int(math.floor(xMin / self.cellSize)), int(math.floor(xMax / self.cellSize)) + 1):
+            for j in range(int(math.floor(yMin / self.cellSize)), int(math.floor(yMax / self.cellSize)) + 1):
+                yield (i, j)
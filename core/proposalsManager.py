@@ -24,10 +24,11 @@ from qgis.core import (
     # QgsMapLayerRegistry,
     QgsMessageLog, QgsFeature, QgsGeometry,
     QgsFeatureRequest,
-    QgsProject, QgsRectangle
+    QgsProject, QgsRectangle,
+    QgsVectorLayer
 )
 
-from ..restrictionTypeUtilsClass import RestrictionTypeUtilsMixin, TOMSLayers
+from ..restrictionTypeUtilsClass import RestrictionTypeUtilsMixin, TOMSLayers, TOMsParamsSnapshot
 from ..proposalTypeUtilsClass import ProposalTypeUtilsMixin
 from ..constants import (
     ProposalStatus,
@@ -35,7 +36,20 @@ from ..constants import (
     singleton
 )
 from ..core.TOMsProposal import (TOMsProposal)
+from ..core.TOMsDisplayGeometryCache import (TOMsDisplayGeometryCache)
+from ..core.TOMsDisplayGeometryMaterialiser import (TOMsDisplayGeometryMaterialiser)
+from ..core.TOMsLookupCache import (TOMsLookupCache)
+from ..core.TOMsZoneIndex import (TOMsZoneAttributeIndex, TOMsZoneLocator)
+from ..core.TOMsNearestFeature import (TOMsCentreLineIndex, TOMsRoadNameResolver)
+from ..core.TOMsDataSnapshot import (TOMsDataSnapshotManager)
+from ..core.TOMsDisplayGeometryRenderer import (TOMsStyleConverter)
+from ..core.TOMsProposalFilter import (TOMsProposalFilter)
+from ..core.TOMsDateIndex import (TOMsRestrictionDateIndex)
+from ..core.TOMsFeatureKeys import (TOMsFeatureKeys)
 from .TOMsProposalElement import *
+from .TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
 
 @singleton
 class TOMsProposalsManager(RestrictionTypeUtilsMixin, ProposalTypeUtilsMixin, QObject):
@@ -75,6 +89,8 @@ class TOMsProposalsManager(RestrictionTypeUtilsMixin, ProposalTypeUtilsMixin, QO
 
         self.__date = QDate.currentDate()
         self.currProposalFeature = None
+        self.__restrictionsVersion = 0   # incremented when changes to the restrictions are committed
+        self.__unfilteredLayers = dict()  # layer id: (source, unfiltered copy of the layer)
 
         self.canvas = self.iface.mapCanvas()
 
@@ -82,6 +98,62 @@ class TOMsProposalsManager(RestrictionTypeUtilsMixin, ProposalTypeUtilsMixin, QO
 
         self.setTOMsActivated = False
 
+        self.TOMsActivated.connect(self.onTOMsActivated)
+
+    def onTOMsActivated(self):
+        """
+        Set up the items that depend on the TOMs layers being present
+        """
+        QgsMessageLog.logMessage("In TOMsProposalsManager.onTOMsActivated ... ", tag="TOMs panel")
+
+        TOMsParamsSnapshot().refresh()
+
+        displayGeometryCache = TOMsDisplayGeometryCache()
+        displayGeometryMaterialiser = TOMsDisplayGeometryMaterialiser()
+        for layerName in ["Bays", "Lines"]:
+            displayGeometryCache.watchLayer(self.tableNames.setLayer(layerName))
+            displayGeometryMaterialiser.watchLayer(self.tableNames.setLayer(layerName))
+            if TOMsStyleConverter.isEnabled() and self.tableNames.setLayer(layerName) is not None:
+                TOMsStyleConverter.convertLayer(self.tableNames.setLayer(layerName))
+
+        lookupCache = TOMsLookupCache()
+        for layerName in ["TimePeriods", "LengthOfTime", "RestrictionTypes", "BayLineTypes", "SignTypes", "RestrictionPolygonTypes"]:
+            for lookupLayer in QgsProject.instance().mapLayersByName(layerName):
+                lookupCache.watchLayer(lookupLayer)
+
+        zoneAttributeIndex = TOMsZoneAttributeIndex()
+        for layerName in ["CPZs", "ParkingTariffAreas"]:
+            zoneAttributeIndex.watchLayer(self.tableNames.setLayer(layerName))
+            TOMsZoneLocator().watchLayer(self.tableNames.setLayer(layerName))
+
+        # open/close dates - so that the filters only change when the restrictions shown change
+        for (layerID, layerName) in self.getRestrictionLayersList():
+            TOMsRestrictionDateIndex().watchLayer(self.tableNames.setLayer(layerName))
+
+        TOMsCentreLineIndex().watchLayer(self.tableNames.setLayer("RoadCentreLine"))
+        TOMsRoadNameResolver().watchLayer(self.tableNames.setLayer("RoadCasement"))
+
+        # data used by the expression functions (from render threads)
+        TOMsDataSnapshotManager().activate()
+
+    def onTOMsDeactivated(self):
+        """
+        Release the items set up in onTOMsActivated
+        """
+        QgsMessageLog.logMessage("In TOMsProposalsManager.onTOMsDeactivated ... ", tag="TOMs panel")
+
+        TOMsDisplayGeometryCache().unwatchLayers()
+        TOMsDisplayGeometryMaterialiser().unwatchLayers()
+        TOMsDataSnapshotManager().deactivate()
+        TOMsRestrictionDateIndex().unwatchLayers()
+        self.__unfilteredLayers = dict()
+
+        # the project can then be used without the plugin
+        for layerName in ["Bays", "Lines"]:
+            layer = self.tableNames.setLayer(layerName)
+            if layer is not None:
+                TOMsStyleConverter.restoreLayer(layer)
+
     def date(self):
         """
         Get access to the current date
@@ -150,81 +222,115 @@ class TOMsProposalsManager(RestrictionTypeUtilsMixin, ProposalTypeUtilsMixin, QO
         Whenever the current proposal or the date changes we need to update the canvas.
         """
 
-        QgsMessageLog.logMessage('Entering updateMapCanvas', tag="TOMs panel")
+        TOMsLog.debug('Entering updateMapCanvas')
 
-        dateString = self.__date.toString('dd-MM-yyyy')
-        currProposalID = self.currentProposal()
+        currProposal = self.currProposalObject if self.currentProposal() > 0 else None
+        proposalFilter = TOMsProposalFilter(self.tableNames.setLayer("RestrictionsInProposals"))
 
-        dateChoosenFormatted = "'{dateString}'".format(dateString=dateString)
+        # others may have committed restrictions opening/closing between the effective date and the chosen date. The
+        # dates (without geometry) are read again so that the effective dates are current
+        TOMsRestrictionDateIndex().refresh()
 
-        #filterString = '"OpenDate" <= to_date(' + dateChoosenFormatted + ", 'dd-MM-yyyy') AND ((" + '"CloseDate" > to_date(' + dateChoosenFormatted + ", 'dd-MM-yyyy')  OR " + '"CloseDate"  IS  NULL)'
+        changedLayers = []
+        for (layerID, layerName) in self.getRestrictionLayersList():
+            TOMsLog.debug("Considering layer: {}", layerName)
 
-        filterString = u'"OpenDate" \u003C\u003D to_date({dateChoosenFormatted}, \'dd-MM-yyyy\') AND (("CloseDate" \u003E to_date({dateChoosenFormatted}, \'dd-MM-yyyy\')  OR "CloseDate" IS NULL)'.format(dateChoosenFormatted=dateChoosenFormatted)
-        # if QgsMapLayerRegistry.instance().mapLayersByName("RestrictionLayers"):
-        #     self.RestrictionLayers = QgsMapLayerRegistry.instance().mapLayersByName("RestrictionLayers")[0]
+            currLayer = self.tableNames.setLayer(layerName)
+            filterDate = TOMsRestrictionDateIndex().effectiveDate(currLayer, self.__date)
+            layerFilterString = proposalFilter.layerFilter(currLayer, layerID, filterDate, currProposal)
 
-        for (layerID, layerName) in self.getRestrictionLayersList():
-            QgsMessageLog.logMessage(
-                "Considering layer: " + layerName, tag="TOMs panel")
+            TOMsLog.debug("In updateMapCanvas. Layer: {} Date Filter: {}", layerName, layerFilterString)
+            if self.__applyFilter(currLayer, layerFilterString):
+                changedLayers.append(currLayer)
 
-            layerFilterString = filterString
+            # the companion layers may be held elsewhere (e.g., memory layers), so need their own filter
+            for displayLayer in TOMsDisplayGeometryMaterialiser().displayLayers(currLayer):
+                if self.__applyFilter(displayLayer, proposalFilter.layerFilter(displayLayer, layerID, filterDate, currProposal)):
+                    changedLayers.append(displayLayer)
 
-            if currProposalID > 0:   # need to consider a proposal
+        TOMsLog.debug("In updateMapCanvas. {} layers changed", len(changedLayers))
 
-                restrictionsToClose = self.currProposalObject.getRestrictionsToCloseForLayer(layerID)
-                if len(restrictionsToClose) > 0:
-                    layerFilterString = ('{layerString} AND "RestrictionID" NOT IN ({restrictionsToClose}))').format(layerString=layerFilterString, restrictionsToClose=restrictionsToClose)
+        if changedLayers:
+            for currLayer in changedLayers:
+                currLayer.triggerRepaint()
+            self.canvas.refresh()
 
-                restrictionsToOpen = self.currProposalObject.getRestrictionsToOpenForLayer(layerID)
-                if len(restrictionsToOpen) > 0:
-                    layerFilterString = (' "RestrictionID"  IN ({restrictionsToOpen}) OR ({layerString})').format(layerString=layerFilterString, restrictionsToOpen=restrictionsToOpen)
+    def __applyFilter(self, layer, filterString):
+        """ Set the filter on the layer - unless it is already in place. Returns True if the filter was changed """
 
-                if len(restrictionsToClose) == 0:
-                    layerFilterString = layerFilterString + ")"
+        if layer.subsetString() == filterString:
+            return False
 
-            else:
-                layerFilterString = layerFilterString + ")"
+        # each setSubsetString reloads the provider. Signals are blocked so that the canvas is refreshed once for all the layers
+        layer.blockSignals(True)
+        try:
+            layer.setSubsetString(filterString)
+        finally:
+            layer.blockSignals(False)
 
-            QgsMessageLog.logMessage("In updateMapCanvas. Layer: " + layerName + " Date Filter: " + layerFilterString, tag="TOMs panel")
-            self.tableNames.setLayer(layerName).setSubsetString(layerFilterString)
+        layer.subsetStringChanged.emit()
+        return True
 
-            """for (currRestrictionID, currRestriction) in self.__getCurrentRestrictionsForLayer(
-                    layerID):
-                QgsMessageLog.logMessage(
-                    "In updateMapCanvas. Layer: " + layerName + " Factory RestrictionID: " + str(currRestrictionID), tag="TOMs panel")"""
-        pass
+    def refreshMapCanvas(self):
+        """
+        After changes are committed. The filters may not change (e.g., when using subqueries against
+        RestrictionsInProposals) but what they show can
+        """
+        # the edits may have been made within the transaction group - and others may have committed changes
+        self.__restrictionsVersion += 1
+
+        self.updateMapCanvas()
+
+        for (layerID, layerName) in self.getRestrictionLayersList():
+            self.tableNames.setLayer(layerName).triggerRepaint()
+
+    def restrictionsVersion(self):
+        """ Changes whenever changes to the restrictions are committed, e.g., for results derived from their geometry """
+        return self.__restrictionsVersion
+
+    def unfilteredLayer(self, layer):
+        """ A copy of the layer, for reading features outside its filter. Opened once for each layer (and reused) """
+
+        source, unfilteredLayer = self.__unfilteredLayers.get(layer.id(), (None, None))
+        if unfilteredLayer is None or source != layer.source():
+            unfilteredLayer = QgsVectorLayer(layer.source(), layer.name(), layer.providerType())
+            self.__unfilteredLayers[layer.id()] = (layer.source(), unfilteredLayer)
+
+        return unfilteredLayer
 
     def clearRestrictionFilters(self):
         # This is to be used at the close of the plugin to clear any filters that have been set
 
         for (layerID, layerName) in self.getRestrictionLayersList():
-            QgsMessageLog.logMessage("Clearing filter for layer: " + layerName, tag="TOMs panel")
+            TOMsLog.debug("Clearing filter for layer: {}", layerName)
             self.tableNames.setLayer(layerName).setSubsetString('')
+            for displayLayer in TOMsDisplayGeometryMaterialiser().displayLayers(self.tableNames.setLayer(layerName)):
+                displayLayer.setSubsetString('')
 
         pass
 
-    def getCurrentRestrictionsForLayerAtDate(self, layerID, dateString=None):
+    def getCurrentRestrictionsForLayerAtDate(self, layerID, filterDate=None):
 
-        if not dateString:
-            dateString = self.date()
-
-        dateString = self.__date.toString('yyyy-MM-dd')
-        dateChoosenFormatted = "'{dateString}'".format(dateString=dateString)
-
-        filterString = u'"OpenDate" \u003C\u003D to_date({dateChoosenFormatted}) AND (("CloseDate" \u003E to_date({dateChoosenFormatted})  OR "CloseDate" IS NULL))'.format(
-            dateChoosenFormatted=dateChoosenFormatted)
+        if not filterDate:
+            filterDate = self.date()
 
         thisLayer = self.getRestrictionLayerFromID(layerID)
 
-        request = QgsFeatureRequest().setFilterExpression(filterString)
-
-        QgsMessageLog.logMessage("In ProposalsManager:getCurrentRestrictionsForLayerAtDate. Layer: " + thisLayer.name() + " Filter: " + filterString,
-                                 tag="TOMs panel")
+        restrictionsAtDate = TOMsRestrictionDateIndex().restrictionsAtDate(thisLayer, filterDate)
+        if restrictionsAtDate is None:
+            # layer not indexed
+            filterString = TOMsProposalFilter.dateFilter(filterDate)
+            request = QgsFeatureRequest().setFilterExpression(filterString)
+        else:
+            if len(restrictionsAtDate) == 0:
+                return []
+            filterString = TOMsFeatureKeys.filterExpression("RestrictionID", restrictionsAtDate)
+            request = QgsFeatureRequest().setFilterExpression(filterString)
+
+        TOMsLog.debug("In ProposalsManager:getCurrentRestrictionsForLayerAtDate. Layer: {} Filter: {}", thisLayer.name, filterString)
         restrictionList = []
         for currentRestrictionDetails in thisLayer.getFeatures(request):
-            QgsMessageLog.logMessage(
-                "In ProposalsManager:getCurrentRestrictionsForLayerAtDate. Layer: " + thisLayer.name() + " restrictionID: " + str(currentRestrictionDetails["RestrictionID"]),
-                tag="TOMs panel")
+            TOMsLog.debug("In ProposalsManager:getCurrentRestrictionsForLayerAtDate. Layer: {} restrictionID: {}", thisLayer.name, currentRestrictionDetails["RestrictionID"])
             currRestriction = ProposalElementFactory.getProposalElement(self, layerID,
                                                                         currentRestrictionDetails,
                                                                         currentRestrictionDetails["RestrictionID"])
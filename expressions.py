@@ -33,33 +33,38 @@ from qgis.core import (
 import math
 from .generateGeometryUtils import generateGeometryUtils
 from .core.TOMsGeometryElement import ElementGeometryFactory
+from .core.TOMsDisplayGeometryCache import TOMsDisplayGeometryCache
 
 import sys, traceback
+from .core.TOMsMessageLog import TOMsMessageLog
 
 
 """ ****************************** """
 
 
+TOMsLog = TOMsMessageLog.getLog(__name__)
+
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=True, register=True)
-def generate_display_geometry(geometryID, restGeomType, AzimuthToCenterLine, offset, bayWidth, feature, parent):
+def generate_display_geometry(geometryID, restGeomType, AzimuthToCenterLine, offset, bayWidth, feature, parent, context):
+
+    res = None
+
     try:
         """QgsMessageLog.logMessage(
             "In generate_display_geometry: New restriction .................................................................... ID: " + str(
                 geometryID), tag="TOMs panel")"""
 
         # res = generateGeometryUtils.getRestrictionGeometry(feature)
-        res = ElementGeometryFactory.getElementGeometry(feature)
+        res = TOMsDisplayGeometryCache().getElementGeometry(feature, generateGeometryUtils.getDisplayLevelOfDetail(context))
 
     except:
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'generate_display_geometry error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("generate_display_geometry error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     return res
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=True, register=True)
-def generateDisplayGeometry(feature, parent):
+def generateDisplayGeometry(feature, parent, context):
     #def generateDisplayGeometry(restGeomType, AzimuthToCenterLine, offset, bayWidth, feature, parent):
 
     res = None
@@ -70,12 +75,12 @@ def generateDisplayGeometry(feature, parent):
                 geometryID), tag="TOMs panel")"""
 
         # res = generateGeometryUtils.getRestrictionGeometry(feature)
-        res = ElementGeometryFactory.getElementGeometry(feature)
+        res = TOMsDisplayGeometryCache().getElementGeometry(feature, generateGeometryUtils.getDisplayLevelOfDetail(context))
 
     except:
-        QgsMessageLog.logMessage('generateDisplayGeometry', tag="TOMs panel")
+        TOMsLog.debug('generateDisplayGeometry')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage('generateDisplayGeometry error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))), tag="TOMs panel")
+        TOMsLog.warning("generateDisplayGeometry error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     return res
 
@@ -90,11 +95,9 @@ def getAzimuthToRoadCentreLine(feature, parent):
         return int(generateGeometryUtils.calculateAzimuthToRoadCentreLine(feature))
 
     except:
-        QgsMessageLog.logMessage('getAzimuthToRoadCentreLine', tag="TOMs panel")
+        TOMsLog.debug('getAzimuthToRoadCentreLine')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getAzimuthToRoadCentreLine: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getAzimuthToRoadCentreLine: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=True, register=True)
 def getRoadName(feature, parent):
@@ -104,11 +107,9 @@ def getRoadName(feature, parent):
     try:
         newStreetName, newUSRN = generateGeometryUtils.determineRoadName(feature)
     except:
-        QgsMessageLog.logMessage('getRoadName', tag="TOMs panel")
+        TOMsLog.debug('getRoadName')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getRoadName: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getRoadName: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
     return newStreetName
 
 
@@ -121,11 +122,9 @@ def getUSRN(feature, parent):
     try:
         newStreetName, newUSRN = generateGeometryUtils.determineRoadName(feature)
     except:
-        QgsMessageLog.logMessage('getUSRN', tag="TOMs panel")
+        TOMsLog.debug('getUSRN')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getUSRN: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getUSRN: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     return newUSRN
 
@@ -133,99 +132,86 @@ def getUSRN(feature, parent):
 def generate_ZigZag(feature, parent):
 	# Determine road name from the kerb line layer
 
+    res = None
     try:
         res = generateGeometryUtils.zigzag(feature, 2, 1)
     except:
-        QgsMessageLog.logMessage('generate_ZigZag', tag="TOMs panel")
+        TOMsLog.debug('generate_ZigZag')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'generate_ZigZag: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("generate_ZigZag: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
     return res
 
     return newUSRN
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=True, register=True)
-def getWaitingLabelLeader(feature, parent):
+def getWaitingLabelLeader(feature, parent, context):
 	# If the scale is within range (< 1250) and the label has been moved, create a line
 
     #QgsMessageLog.logMessage(
     #    "In getWaitingLabelLeader ", tag="TOMs panel")
     try:
-        labelLeaderGeom = generateGeometryUtils.generateWaitingLabelLeader(feature)
+        labelLeaderGeom = generateGeometryUtils.generateWaitingLabelLeader(feature, context)
     except:
-        QgsMessageLog.logMessage('getWaitingLabelLeader', tag="TOMs panel")
+        TOMsLog.debug('getWaitingLabelLeader')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getWaitingLabelLeader: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getWaitingLabelLeader: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     return labelLeaderGeom
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=True, register=True)
-def getLoadingLabelLeader(feature, parent):
+def getLoadingLabelLeader(feature, parent, context):
 	# If the scale is within range (< 1250) and the label has been moved, create a line
 
     #QgsMessageLog.logMessage(
     #    "In getLoadingLabelLeader ", tag="TOMs panel")
     try:
-        labelLeaderGeom = generateGeometryUtils.generateLoadingLabelLeader(feature)
+        labelLeaderGeom = generateGeometryUtils.generateLoadingLabelLeader(feature, context)
     except:
-        QgsMessageLog.logMessage('getLoadingLabelLeader', tag="TOMs panel")
+        TOMsLog.debug('getLoadingLabelLeader')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getLoadingLabelLeader: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getLoadingLabelLeader: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     return labelLeaderGeom
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=True, register=True)
-def getBayLabelLeader(feature, parent):
+def getBayLabelLeader(feature, parent, context):
 	# If the scale is within range (< 1250) and the label has been moved, create a line
 
     # QgsMessageLog.logMessage("In getBayLabelLeader ", tag="TOMs panel")
     try:
-        labelLeaderGeom = generateGeometryUtils.generateBayLabelLeader(feature)
+        labelLeaderGeom = generateGeometryUtils.generateBayLabelLeader(feature, context)
     except:
-        QgsMessageLog.logMessage('getBayLabelLeader', tag="TOMs panel")
+        TOMsLog.debug('getBayLabelLeader')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getBayLabelLeader: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getBayLabelLeader: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     return labelLeaderGeom
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=True, register=True)
-def getPolygonLabelLeader(feature, parent):
+def getPolygonLabelLeader(feature, parent, context):
 	# If the scale is within range (< 1250) and the label has been moved, create a line
 
     #QgsMessageLog.logMessage("In getBayLabelLeader ", tag="TOMs panel")
     try:
-        labelLeaderGeom = generateGeometryUtils.generatePolygonLabelLeader(feature)
+        labelLeaderGeom = generateGeometryUtils.generatePolygonLabelLeader(feature, context)
     except:
-        QgsMessageLog.logMessage('getPolygonLabelLeader', tag="TOMs panel")
+        TOMsLog.debug('getPolygonLabelLeader')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getPolygonLabelLeader: error in expression function: ' + str(
-                repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getPolygonLabelLeader: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
     return labelLeaderGeom
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=False, register=True)
-def getWaitingRestrictionLabelText(feature, parent):
+def getWaitingRestrictionLabelText(feature, parent, context):
 	# Returns the text to label the feature
 
     #QgsMessageLog.logMessage("In getWaitingRestrictionLabelText:", tag="TOMs panel")
 
     try:
-        waitingText, loadingText = generateGeometryUtils.getWaitingLoadingRestrictionLabelText(feature)
+        waitingText, loadingText = generateGeometryUtils.getWaitingLoadingRestrictionLabelTextForRender(feature, context)
     except:
-        QgsMessageLog.logMessage('getWaitingRestrictionLabelText', tag="TOMs panel")
+        TOMsLog.debug('getWaitingRestrictionLabelText')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getWaitingRestrictionLabelText: error in expression function: ' + str(
-                repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getWaitingRestrictionLabelText: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     #QgsMessageLog.logMessage("In getWaitingRestrictionLabelText ****:" + " Waiting: " + str(waitingText) + " Loading: " + str(loadingText), tag="TOMs panel")
     # waitingText = "Test"
@@ -237,20 +223,18 @@ def getWaitingRestrictionLabelText(feature, parent):
     return None
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=False, register=True)
-def getLoadingRestrictionLabelText(feature, parent):
+def getLoadingRestrictionLabelText(feature, parent, context):
 	# Returns the text to label the feature
 
     #QgsMessageLog.logMessage("In getLoadingRestrictionLabelText:", tag="TOMs panel")
 
     try:
-        waitingText, loadingText = generateGeometryUtils.getWaitingLoadingRestrictionLabelText(feature)
+        waitingText, loadingText = generateGeometryUtils.getWaitingLoadingRestrictionLabelTextForRender(feature, context)
 
     except:
-        QgsMessageLog.logMessage('getLoadingRestrictionLabelText', tag="TOMs panel")
+        TOMsLog.debug('getLoadingRestrictionLabelText')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getLoadingRestrictionLabelText: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getLoadingRestrictionLabelText: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
         """QgsMessageLog.logMessage(
         "In getLoadingRestrictionLabelText ****:" + " Waiting: " + str(waitingText) + " Loading: " + str(loadingText),
@@ -266,78 +250,67 @@ def getLoadingRestrictionLabelText(feature, parent):
     return None
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=False, register=True)
-def getBayTimePeriodLabelText(feature, parent):
+def getBayTimePeriodLabelText(feature, parent, context):
 	# Returns the text to label the feature
 
     try:
         #QgsMessageLog.logMessage("In getBayTimePeriodLabelText:", tag="TOMs panel")
 
-        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelText(feature)
+        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelTextForRender(feature, context)
 
     except:
-        QgsMessageLog.logMessage('getBayTimePeriodLabelText', tag="TOMs panel")
+        TOMsLog.debug('getBayTimePeriodLabelText')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getBayTimePeriodLabelText: error in expression function: ' + str(repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getBayTimePeriodLabelText: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     #QgsMessageLog.logMessage("In getBayTimePeriodLabelText:" + str(timePeriodText), tag="TOMs panel")
 
     return timePeriodText
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=False, register=True)
-def getBayMaxStayLabelText(feature, parent):
+def getBayMaxStayLabelText(feature, parent, context):
 	# Returns the text to label the feature
 
     try:
         #QgsMessageLog.logMessage("In getBayMaxStayLabelText:", tag="TOMs panel")
 
-        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelText(feature)
+        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelTextForRender(feature, context)
 
     except:
-        QgsMessageLog.logMessage('getBayMaxStayLabelText', tag="TOMs panel")
+        TOMsLog.debug('getBayMaxStayLabelText')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getBayMaxStayLabelText: error in expression function: ' + str(
-                repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getBayMaxStayLabelText: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     #QgsMessageLog.logMessage("In getBayMaxStayLabelText: " + str(maxStayText), tag="TOMs panel")
 
     return maxStayText
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=False, register=True)
-def getBayNoReturnLabelText(feature, parent):
+def getBayNoReturnLabelText(feature, parent, context):
 	# Returns the text to label the feature
 
     # QgsMessageLog.logMessage("In getBayNoReturnLabelText:", tag="TOMs panel")
     try:
-        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelText(feature)
+        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelTextForRender(feature, context)
     except:
-        QgsMessageLog.logMessage('getBayNoReturnLabelText', tag="TOMs panel")
+        TOMsLog.debug('getBayNoReturnLabelText')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getBayNoReturnLabelText: error in expression function: ' + str(
-                repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getBayNoReturnLabelText: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
     #QgsMessageLog.logMessage("In getBayNoReturnLabelText: " + str(noReturnText), tag="TOMs panel")
 
     return noReturnText
 
 @qgsfunction(args='auto', group='TOMs2', usesgeometry=False, register=True)
-def getBayLabelText(feature, parent):
+def getBayLabelText(feature, parent, context):
 	# Returns the text to label the feature
 
-    QgsMessageLog.logMessage("In getBayLabelText:", tag="TOMs panel")
+    TOMsLog.debug("In getBayLabelText:")
     try:
-        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelText(feature)
+        maxStayText, noReturnText, timePeriodText = generateGeometryUtils.getBayRestrictionLabelTextForRender(feature, context)
     except:
-        QgsMessageLog.logMessage('getBayLabelText', tag="TOMs panel")
+        TOMsLog.debug('getBayLabelText')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getBayLabelText: error in expression function: ' + str(
-                repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getBayLabelText: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     labelText = ''
 
@@ -367,12 +340,9 @@ def getCPZ(feature, parent):
     try:
         cpzNr, cpzWaitingTimeID = generateGeometryUtils.getCurrentCPZDetails(feature)
     except:
-        QgsMessageLog.logMessage('getCPZ', tag="TOMs panel")
+        TOMsLog.debug('getCPZ')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getCPZ: error in expression function: ' + str(
-                repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getCPZ: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
     #QgsMessageLog.logMessage("In getCPZ: CPZ " + str(cpzNr), tag="TOMs panel")
 
     return cpzNr
@@ -385,12 +355,9 @@ def getPTA(feature, parent):
     try:
         ptaName, ptaMaxStayID, ptaNoReturnTimeID = generateGeometryUtils.getCurrentPTADetails(feature)
     except:
-        QgsMessageLog.logMessage('getPTA', tag="TOMs panel")
+        TOMsLog.debug('getPTA')
         exc_type, exc_value, exc_traceback = sys.exc_info()
-        QgsMessageLog.logMessage(
-            'getPTA: error in expression function: ' + str(
-                repr(traceback.extract_tb(exc_traceback))),
-            tag="TOMs panel")
+        TOMsLog.warning("getPTA: error in expression function: {}", repr(traceback.extract_tb(exc_traceback)))
 
     #QgsMessageLog.logMessage("In getPTA: PTA " + str(ptaName), tag="TOMs panel")
 
@@ -422,7 +389,7 @@ def registerFunctions():
     toms_list = QgsExpression.Functions()
 
     for func in functions:
-        QgsMessageLog.logMessage("Considering function {}".format(func.name()), tag="TOMs panel")
+        TOMsLog.debug("Considering function {}", func.name)
         try:
             if func in toms_list:
                 QgsExpression.unregisterFunction(func.name())
@@ -432,7 +399,7 @@ def registerFunctions():
             pass
 
         if QgsExpression.registerFunction(func):
-            QgsMessageLog.logMessage("Registered expression function {}".format(func.name()), tag="TOMs panel")
+            TOMsLog.debug("Registered expression function {}", func.name)
             #qgis.toms_functions[func.name()] = func
 
     """for title in qgis.toms_functions:
@@ -445,7 +412,7 @@ def unregisterFunctions():
     # Unload all the functions that we created.
     for func in functions:
         QgsExpression.unregisterFunction(func.name())
-        QgsMessageLog.logMessage("Unregistered expression function {}".format(func.name()), tag="TOMs panel")
+        TOMsLog.debug("Unregistered expression function {}", func.name)
         #del qgis.toms_functions[func.name()]
 
     QgsExpression.cleanRegisteredFunctions()
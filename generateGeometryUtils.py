@@ -8,11 +8,17 @@
 #---------------------------------------------------------------------
 # Tim Hancock 2017
 
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QThread
+)
+
 from qgis.PyQt.QtWidgets import (
     QMessageBox
 )
 
 from qgis.core import (
+    NULL,
     QgsExpressionContextUtils,
     QgsMessageLog,
     QgsFeature,
@@ -32,6 +38,11 @@ from qgis.utils import iface
 
 import math
 from cmath import rect, phase
+from .constants import DisplayLevelOfDetail
+from .core import TOMsGeometryCore
+from .core.TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
 
 class generateGeometryUtils:
     # https://gis.stackexchange.com/questions/95528/produce-line-from-components-length-and-angle?noredirect=1&lq=1
@@ -39,10 +50,7 @@ class generateGeometryUtils:
 
     @staticmethod
     def cosdir_azim(azim):
-        az = math.radians(azim)
-        cosa = math.sin(az)
-        cosb = math.cos(az)
-        return cosa, cosb
+        return TOMsGeometryCore.cosdir_azim(azim)
 
     def cosdir_azim_rad(az):
         # az = math.radians(azim)
@@ -52,86 +60,17 @@ class generateGeometryUtils:
 
     @staticmethod
     def turnToCL(Az1, Az2):
-        # function to determine direction of turn to road centre    *** needs to be checked carefully ***
-        # Az1 = Az of current line; Az2 = Az to roadCentreline
-        # QgsMessageLog.logMessage("In turnToCL Az1 = " + str(Az1) + " Az2 = " + str(Az2), tag="TOMs panel")
-
-        AzCL = Az1 - 90.0
-        if AzCL < 0:
-            AzCL = AzCL + 360.0
-
-        # QgsMessageLog.logMessage("In turnToCL AzCL = " + str(AzCL), tag="TOMs panel")
-
-        # Need to check quadrant
-
-        if AzCL >= 0.0 and AzCL <= 90.0:
-            if Az2 >= 270.0 and Az2 <= 359.999:
-                AzCL = AzCL + 360
-        elif Az2 >= 0 and Az2 <= 90:
-            if AzCL >= 270.0 and AzCL <= 359.999:
-                Az2 = Az2 + 360
-
-        g = abs(float(AzCL) - float(Az2))
-
-        # QgsMessageLog.logMessage("In turnToCL Diff = " + str(g), tag="TOMs panel")
-
-        if g < 90:
-            Turn = -90
-        else:
-            Turn = 90
-
-        # QgsMessageLog.logMessage("In turnToCL Turn = " + str(Turn), tag="TOMs panel")
-
-        return Turn
+        # function to determine direction of turn to road centre (Az1 = Az of current line; Az2 = Az to roadCentreline)
+        return TOMsGeometryCore.turnToCL(Az1, Az2)
 
     @staticmethod
     def calcBisector(prevAz, currAz, Turn, WidthRest):
         # function to return Az of bisector
-
-        # QgsMessageLog.logMessage("In calcBisector", tag="TOMs panel")
-        # QgsMessageLog.logMessage("In calcBisector: prevAz: " + str(prevAz) + " currAz: " + str(currAz), tag="TOMs panel")
-
-        prevAzA = generateGeometryUtils.checkDegrees(prevAz + float(Turn))
-        currAzA = generateGeometryUtils.checkDegrees(currAz + float(Turn))
-
-        # QgsMessageLog.logMessage("In calcBisector: prevAzA: " + str(prevAzA) + " currAzA: " + str(currAzA), tag="TOMs panel")
-
-        """
-        if prevAz > 180:
-            revPrevAz = prevAz - float(180)
-        else:
-            revPrevAz = prevAz + float(180)
-        """
-
-        # QgsMessageLog.logMessage("In calcBisector: revPrevAz: " + str(revPrevAz), tag="TOMs panel")
-
-        diffAz = prevAzA - currAzA
-
-        # QgsMessageLog.logMessage("In calcBisector: diffAz: " + str(diffAz), tag="TOMs panel")
-
-        diffAngle = diffAz / float(2)
-        bisectAz = prevAzA - diffAngle
-
-        diffAngle_rad = math.radians(diffAngle)
-        # QgsMessageLog.logMessage("In calcBisector: diffAngle: " + str(diffAngle) + " diffAngle_rad: " + str(diffAngle_rad), tag="TOMs panel")
-        distToPt = float(WidthRest) / math.cos(diffAngle_rad)
-
-        # QgsMessageLog.logMessage("In generate_display_geometry: bisectAz: " + str(bisectAz) + " distToPt:" + str(distToPt), tag="TOMs panel")
-
-        return bisectAz, distToPt
+        return TOMsGeometryCore.calcBisector(prevAz, currAz, Turn, WidthRest)
 
     @staticmethod
     def checkDegrees(Az):
-        newAz = Az
-
-        if Az >= float(360):
-            newAz = Az - float(360)
-        elif Az < float(0):
-            newAz = Az + float(360)
-
-        # QgsMessageLog.logMessage("In checkDegrees: newAz: " + str(newAz), tag="TOMs panel")
-
-        return newAz
+        return TOMsGeometryCore.checkDegrees(Az)
 
     @staticmethod
     def setRoadName(feature):
@@ -147,13 +86,11 @@ class generateGeometryUtils:
     @staticmethod
     def determineRoadName(feature):
 
-        QgsMessageLog.logMessage("In setRoadName(helper):", tag="TOMs panel")
-        QgsMessageLog.logMessage("In setRoadName(helper)2:", tag="TOMs panel")
-
-        RoadCasementLayer = QgsProject.instance().mapLayersByName("RoadCasement")[0]
+        TOMsLog.debug("In setRoadName(helper):")
+        TOMsLog.debug("In setRoadName(helper)2:")
 
         # take the first point from the geometry
-        QgsMessageLog.logMessage("In setRoadName: {}".format(feature.geometry().asWkt()), tag="TOMs panel")
+        TOMsLog.debug("In setRoadName: {}", feature.geometry().asWkt)
 
         """line = generateGeometryUtils.getLineForAz(feature)
 
@@ -168,9 +105,24 @@ class generateGeometryUtils:
 
         tolerance_nearby = 5.0  # somehow need to have this (and layer names) as global variables
 
+        # restrictionTypeUtilsClass imports this module
+        from .core.TOMsNearestFeature import TOMsRoadNameResolver
+        roadNameResolver = TOMsRoadNameResolver()
+
+        snapshot = generateGeometryUtils.getDataSnapshot()
+        if snapshot is not None and not snapshot.hasLayer("RoadCasement"):
+            snapshot = None
+
         if geom:
+            if snapshot is not None:
+                roadName = snapshot.cachedRoadName(geom)
+            else:
+                roadName = roadNameResolver.cachedRoadName(geom)
+            if roadName is not None:
+                return roadName
+
             if geom.type() == QgsWkbTypes.LineGeometry:
-                QgsMessageLog.logMessage("In setRoadName(helper): considering line", tag="TOMs panel")
+                TOMsLog.debug("In setRoadName(helper): considering line")
                 line = generateGeometryUtils.getLineForAz(feature)
 
                 if len(line) == 0:
@@ -181,30 +133,40 @@ class generateGeometryUtils:
                 #secondPt = ptList[0]  # choose second point to (try to) move away from any "ends" (may be best to get midPoint ...)
 
             elif geom.type() == QgsWkbTypes.PointGeometry: # Point
-                QgsMessageLog.logMessage("In setRoadName(helper): considering point", tag="TOMs panel")
+                TOMsLog.debug("In setRoadName(helper): considering point")
                 testPt = feature.geometry().asPoint()
 
                 #tolerance_nearby = 5.0
 
             elif feature.geometry().type() == QgsWkbTypes.PolygonGeometry: # Polygon
-                QgsMessageLog.logMessage("In setRoadName(helper): considering polygon", tag="TOMs panel")
+                TOMsLog.debug("In setRoadName(helper): considering polygon")
                 ptList = feature.geometry().asPolygon()[0]
                 testPt = ptList[
                     0]  # choose second point to (try to) move away from any "ends" (may be best to get midPoint ...)
 
         else:
-            QgsMessageLog.logMessage("In setRoadName: unknown geometry type", tag="TOMs panel")
+            TOMsLog.debug("In setRoadName: unknown geometry type")
             return
 
         #nrPts = len(ptList)
         #QgsMessageLog.logMessage("In setRoadName: number of pts in list: " + str(nrPts), tag="TOMs panel")
 
-        QgsMessageLog.logMessage("In setRoadName: secondPt: " + str(testPt.x()), tag="TOMs panel")
+        TOMsLog.debug("In setRoadName: secondPt: {}", testPt.x)
 
         # check for the feature within RoadCasement_NSG_StreetName layer
         #tolerance_nearby = 1.0  # somehow need to have this (and layer names) as global variables
 
-        nearestRC_feature = generateGeometryUtils.findFeatureAt2(feature, testPt, RoadCasementLayer,
+        if snapshot is not None:
+            roadName = snapshot.roadNameAt(testPt, tolerance_nearby, geom)
+        else:
+            roadName = roadNameResolver.roadNameAt(testPt, tolerance_nearby, geom)
+        if roadName is not None:
+            TOMsLog.debug("In setRoadName: StreetName: {}", roadName[0])
+            return roadName
+
+        RoadCasementLayer = QgsProject.instance().mapLayersByName("RoadCasement")[0]
+
+        nearestRC_feature = generateGeometryUtils.findNearestFeatureAt(testPt, RoadCasementLayer,
                                                                 tolerance_nearby)
 
         if nearestRC_feature:
@@ -216,7 +178,7 @@ class generateGeometryUtils:
             StreetName = nearestRC_feature.attributes()[idx_StreetName]
             USRN = nearestRC_feature.attributes()[idx_USRN]
 
-            QgsMessageLog.logMessage("In setRoadName: StreetName: " + str(StreetName), tag="TOMs panel")
+            TOMsLog.debug("In setRoadName: StreetName: {}", StreetName)
 
             return StreetName, USRN
 
@@ -266,11 +228,11 @@ class generateGeometryUtils:
                 return line
 
             else:
-                QgsMessageLog.logMessage("In getLineForAz(helper): Incorrect geometry found", tag="TOMs panel")
+                TOMsLog.debug("In getLineForAz(helper): Incorrect geometry found")
                 return None
 
         else:
-            QgsMessageLog.logMessage("In getLineForAz(helper): geometry not found", tag="TOMs panel")
+            TOMsLog.warning("In getLineForAz(helper): geometry not found")
             return None
 
     @staticmethod
@@ -280,8 +242,6 @@ class generateGeometryUtils:
 
         # QgsMessageLog.logMessage("In setAzimuthToRoadCentreLine(helper):", tag="TOMs panel")
 
-        RoadCentreLineLayer = QgsProject.instance().mapLayersByName("RoadCentreLine")[0]
-
         """if feature.geometry():
             geom = feature.geometry()
         else:
@@ -305,6 +265,20 @@ class generateGeometryUtils:
 
         # QgsMessageLog.logMessage("In setAzimuthToRoadCentreLine: secondPt: " + str(testPt.x()), tag="TOMs panel")
 
+        snapshot = generateGeometryUtils.getDataSnapshot()
+        if snapshot is not None:
+            Az = snapshot.azimuthToCentreLine(testPt)
+            if Az is not None:
+                return Az
+
+        # restrictionTypeUtilsClass imports this module
+        from .core.TOMsNearestFeature import TOMsCentreLineIndex
+        Az = TOMsCentreLineIndex().azimuthToCentreLine(testPt)
+        if Az is not None:
+            return Az
+
+        RoadCentreLineLayer = QgsProject.instance().mapLayersByName("RoadCentreLine")[0]
+
         # Find all Road Centre Line features within a "reasonable" distance and then check each one to find the shortest distance
 
         tolerance_roadwidth = 25
@@ -341,8 +315,7 @@ class generateGeometryUtils:
             startPt.setX(startPtV2.x())
             startPt.setY(startPtV2.y())"""
 
-            QgsMessageLog.logMessage("In calculateAzimuthToRoadCentreLine: startPoint: " + str(startPt.x()),
-                                     tag="TOMs panel")
+            TOMsLog.debug("In calculateAzimuthToRoadCentreLine: startPoint: {}", startPt.x)
 
             Az = QgsPoint(testPt).azimuth(startPt)
             # Az = generateGeometryUtils.checkDegrees(testPt.azimuth(startPt))
@@ -364,7 +337,7 @@ class generateGeometryUtils:
             If no feature is close to the given coordinate, we return None.
         """
 
-        QgsMessageLog.logMessage("In findFeatureAt2. Incoming layer: " + str(layer) + "tol: " + str(tolerance), tag="TOMs panel")
+        TOMsLog.debug("In findFeatureAt2. Incoming layer: {}tol: {}", layer, tolerance)
 
         searchRect = QgsRectangle(layerPt.x() - tolerance,
                                   layerPt.y() - tolerance,
@@ -376,18 +349,44 @@ class generateGeometryUtils:
         request.setFlags(QgsFeatureRequest.ExactIntersect)
 
         for feature in layer.getFeatures(request):
-            QgsMessageLog.logMessage("In findFeatureAt2. feature found", tag="TOMs panel")
+            TOMsLog.debug("In findFeatureAt2. feature found")
             return feature  # Return first matching feature.
 
         return None
 
+    @staticmethod
+    def findNearestFeatureAt(layerPt, layer, tolerance):
+        """ Find the feature nearest to the given position - from those within the box of size 'tolerance' around it.
+
+            If no feature is close to the given coordinate, we return None.
+        """
+
+        TOMsLog.debug("In findNearestFeatureAt. Incoming layer: {}tol: {}", layer, tolerance)
+
+        searchRect = QgsRectangle(layerPt.x() - tolerance,
+                                  layerPt.y() - tolerance,
+                                  layerPt.x() + tolerance,
+                                  layerPt.y() + tolerance)
+
+        request = QgsFeatureRequest()
+        request.setFilterRect(searchRect)
+        request.setFlags(QgsFeatureRequest.ExactIntersect)
+
+        ptGeom = QgsGeometry.fromPointXY(layerPt)
+        shortestDistance = float("inf")
+        nearestFeature = None
+
+        for feature in layer.getFeatures(request):
+            dist = feature.geometry().distance(ptGeom)
+            if dist < shortestDistance:
+                shortestDistance = dist
+                nearestFeature = feature
+
+        return nearestFeature
+
     @staticmethod
     def getReverseAzimuth(Az):
-        if (Az + 180) > 360:
-            AzimuthToCentreLine = Az - 180
-        else:
-            AzimuthToCentreLine = Az + 180
-        return AzimuthToCentreLine
+        return TOMsGeometryCore.getReverseAzimuth(Az)
 
         """
         @staticmethod
@@ -407,7 +406,7 @@ class generateGeometryUtils:
         # Need to check why the project variable function is not working
 
         restrictionID = feature.attribute("GeometryID")
-        QgsMessageLog.logMessage("In getDisplayGeometry: New restriction .................................................................... ID: " + str(restrictionID), tag="TOMs panel")
+        TOMsLog.debug("In getDisplayGeometry: New restriction .................................................................... ID: {}", restrictionID)
         # restGeomType = feature.attribute("GeomShapeID")
         #AzimuthToCentreLine = float(feature.attribute("AzimuthToRoadCentreLine"))
         #QgsMessageLog.logMessage("In getDisplayGeometry: Az: " + str(AzimuthToCentreLine), tag = "TOMs panel")
@@ -442,237 +441,52 @@ class generateGeometryUtils:
         if len(line) == 0:
             return 0
 
-        # Now have a valid set of points
-
-        # QgsMessageLog.logMessage("In getDisplayGeometry:  Now processing line", tag="TOMs panel")
-
-        ptsList = []
-        parallelPtsList = []
-        nextAz = 0
-        diffEchelonAz = 0
-
-        # now loop through each of the vertices and process as required. New geometry points are added to ptsList
-
-        for i in range(len(line) - 1):
-
-            # QgsMessageLog.logMessage("In getDisplayGeometry: i = " + str(i), tag="TOMs panel")
-
-            Az = line[i].azimuth(line[i + 1])
-
-            # QgsMessageLog.logMessage("In getDisplayGeometry: geometry: " + str(line[i].x()) + " " + str(line[i+1].x()) + " " + str(Az), tag="TOMs panel")
-
-            # if this is the first point
-
-            if i == 0:
-                # determine which way to turn towards CL
-                # QgsMessageLog.logMessage("In generate_display_geometry: considering first point", tag="TOMs panel")
-
-                Turn = generateGeometryUtils.turnToCL(Az, AzimuthToCentreLine)
-
-                newAz = Az + Turn
-                # QgsMessageLog.logMessage("In generate_display_geometry: newAz: " + str(newAz), tag="TOMs panel")
-                cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: cosa : " + str(cosa) + " " + str(cosb), tag="TOMs panel")
-
-                # dx = float(offset) * cosa
-                # dy = float(offset) * cosb
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: dx: " + str(dx) + " dy: " + str(dy), tag="TOMs panel")
-
-                ptsList.append(
-                    QgsPoint(line[i].x() + (float(offset) * cosa), line[i].y() + (float(offset) * cosb)))
-                # QgsMessageLog.logMessage("In geomType: added point 1 ", tag="TOMs panel")
-
-                # Now add the point at the extent. If it is an echelon bay:
-                #   a. calculate the difference between the first Az and the echelon Az (??), and
-                #   b. adjust the angle
-                #   c. *** also need to adjust the length *** Not yet implemented
-
-                #if restGeomType == 5 or restGeomType == 25:  # echelon
-                if restGeomType in [5, 25]:  # echelon
-                    QgsMessageLog.logMessage("In geomType: orientation: " + str(orientation), tag="TOMs panel")
-                    diffEchelonAz = generateGeometryUtils.checkDegrees(orientation - newAz)
-                    newAz = Az + Turn + diffEchelonAz
-                    QgsMessageLog.logMessage("In geomType: newAz: " + str(newAz) + " diffEchelonAz: " + str(diffEchelonAz), tag="TOMs panel")
-                    cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
-                    pass
-
-                ptsList.append(
-                    QgsPoint(line[i].x() + (float(shpExtent) * cosa),
-                             line[i].y() + (float(shpExtent) * cosb)))
-                # QgsMessageLog.logMessage("In geomType: added point 2 ", tag="TOMs panel")
-
-                # ptsList.append(newPoint)
-                # QgsMessageLog.logMessage("In geomType: after append ", tag="TOMs panel")
-
-                # ptsList.append(QgsPoint(line[i].x()+(float(bayWidth)*cosa), line[i].y()+(float(bayWidth)*cosb)))
-
-            else:
-
-                # now pass along the feature
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: considering point: " + str(i), tag="TOMs panel")
-
-                # need to work out half of bisected angle
-
-                # QgsMessageLog.logMessage("In generate_display_geometry: prevAz: " + str(prevAz) + " currAz: " + str(Az), tag="TOMs panel")
-
-                newAz, distWidth = generateGeometryUtils.calcBisector(prevAz, Az, Turn, shpExtent)
-
-                cosa, cosb = generateGeometryUtils.cosdir_azim(newAz + diffEchelonAz)
-                ptsList.append(
-                    QgsPoint(line[i].x() + (float(distWidth) * cosa), line[i].y() + (float(distWidth) * cosb)))
-
-                parallelPtsList.append(
-                    QgsPoint(line[i].x() + (float(distWidth) * cosa), line[i].y() + (float(distWidth) * cosb)))
-
-            # QgsMessageLog.logMessage("In generate_display_geometry: point appended", tag="TOMs panel")
-
-            prevAz = Az
-
-        # QgsMessageLog.logMessage("In generate_display_geometry: newPoint 1: " + str(ptsList[1].x()) + " " + str(ptsList[1].y()), tag="TOMs panel")
-
-        # have reached the end of the feature. Now need to deal with last point.
-        # Use Azimuth from last segment but change the points
-
-        # QgsMessageLog.logMessage("In generate_display_geometry: feature processed. Now at last point ", tag="TOMs panel")
-
-       # standard bay
-        newAz = Az + Turn + diffEchelonAz
-        # QgsMessageLog.logMessage("In generate_display_geometry: newAz: " + str(newAz), tag="TOMs panel")
-        cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
-
-        ptsList.append(QgsPoint(line[len(line) - 1].x() + (float(shpExtent) * cosa),
-                                line[len(line) - 1].y() + (float(shpExtent) * cosb)))
-
-        # add end point (without any consideration of Echelon)
-
-        newAz = Az + Turn
-        cosa, cosb = generateGeometryUtils.cosdir_azim(newAz)
+        # Now have a valid set of points. The shape is generated as for TOMsGeometryElement.getShape
 
-        ptsList.append(QgsPoint(line[len(line) - 1].x() + (float(offset) * cosa),
-                                line[len(line) - 1].y() + (float(offset) * cosb)))
-
-        newLine = QgsGeometry.fromPolyline(ptsList)
-        parallelLine = QgsGeometry.fromPolyline(parallelPtsList)
-
-        #QgsMessageLog.logMessage("In getDisplayGeometry:  newGeometry ********: " + newLine.asWkt(), tag="TOMs panel")
+        ptsList, parallelPtsList = TOMsGeometryCore.getShape([(pt.x(), pt.y()) for pt in line], shpExtent,
+                                                             AzimuthToCentreLine, offset, restGeomType, orientation)
 
+        newLine = QgsGeometry.fromPolyline([QgsPoint(x, y) for (x, y) in ptsList])
+        parallelPtsList = [QgsPoint(x, y) for (x, y) in parallelPtsList]
 
         return newLine, parallelPtsList
 
     @staticmethod
-    def zigzag(feature, wavelength, amplitude, restGeometryType, offset, shpExtent, orientation, AzimuthToCentreLine):
+    def zigzag(feature, wavelength, amplitude, restGeometryType=None, offset=None, shpExtent=None, orientation=None, AzimuthToCentreLine=None):
+        """ Zig-zag along the kerb line of the feature - generated as for generatedGeometryZigZagType.getZigZag, i.e.,
+            between offset (default BayOffsetFromKerb) and shpExtent (default offset + amplitude) from the kerb.
+            restGeometryType and orientation are not used (kept for existing callers).
         """
-            Taken from: https://www.google.fr/url?sa=t&rct=j&q=&esrc=s&source=web&cd=8&cad=rja&uact=8&ved=0ahUKEwi06c6nkMzWAhWCwxoKHWHMC34QFghEMAc&url=http%3A%2F%2Fwww.geoinformations.developpement-durable.gouv.fr%2Ffichier%2Fodt%2Fgenerateur_de_zigzag_v1_cle0d3366.odt%3Farg%3D177834503%26cle%3Df6f59e5a812d5c3e7a829f05497213f839936080%26file%3Dodt%252Fgenerateur_de_zigzag_v1_cle0d3366.odt&usg=AOvVaw0JoVM0llmrvSCdxOEaGCOH
-            www.geoinformations.developpement-durable.gouv.fr
-
-           transforme une geometrie lineaire en zigzag
-           <h4>Syntax</h4>
-           <pre>zigzag(geom, longueur, amplitude)</pre>
-
-           <h4>Exemple</h4>
-           zigzag($geometry,200,100)
-
-        """
-
-        QgsMessageLog.logMessage("In zigzag", tag="TOMs panel")
-
-        line, parallelLine = generateGeometryUtils.getDisplayGeometry(feature, restGeometryType, offset, shpExtent, orientation, AzimuthToCentreLine)
-
-        #QgsMessageLog.logMessage("In zigzag - have geometry + " + line.asWkt(), tag="TOMs panel")
-
-        length = line.length()
-        #QgsMessageLog.logMessage(
-        #    "In zigzag - have geometry. Length = " + str(length) + " wavelength: " + str(wavelength),
-        #    tag="TOMs panel")
-
-        segments = int(length / wavelength)
-        # Find equally spaced points that approximate the line
-        #QgsMessageLog.logMessage("In zigzag - have geometry. segments = " + str(segments), tag="TOMs panel")
-
-        points = []
-        countSegments = 0
-        while countSegments <= segments:
-            # QgsMessageLog.logMessage("In zigzag - countSegment = " + str(countSegments), tag="TOMs panel")
-            interpolateDistance = int(countSegments * int(wavelength))
-            # QgsMessageLog.logMessage("In zigzag - interpolateDistance = " + str(interpolateDistance), tag="TOMs panel")
-            points.append(line.interpolate(float(interpolateDistance)).asPoint())
-            # QgsMessageLog.logMessage("In zigzag - added Point", tag="TOMs panel")
-            countSegments = countSegments + 1
-
-        #QgsMessageLog.logMessage("In zigzag - have points: nrPts = " + str(len(points)), tag="TOMs panel")
-
-        # Calculate the azimuths of the approximating line segments
-
-        azimuths = []
-
-        for i in range(len(points) - 1):
-            # QgsMessageLog.logMessage("In zigzag - creating Az: i = " + str(i), tag="TOMs panel")
-            azimuths.append((points[i].azimuth(points[i + 1])))
-
-        #QgsMessageLog.logMessage("In zigzag - after azimuths: i " + str(i) + " len(az): " + str(len(azimuths)),
-        #                         tag="TOMs panel")
-
-        # Average consecutive azimuths and rotate 90 deg counterclockwise
-
-        # newAz, distWidth = generateGeometryUtils.calcBisector(prevAz, Az, Turn, shpExtent)
-
-        zigzagazimuths = [azimuths[0] - math.pi / 2]
-        zigzagazimuths.extend([generateGeometryUtils.meanAngle(azimuths[i], azimuths[i - 1]) - math.pi / 2 for i in
-                               range(len(points) - 1)])
-        zigzagazimuths.append(azimuths[-1] - math.pi / 2)
-
-        #QgsMessageLog.logMessage("In zigzag - about to create shape", tag="TOMs panel")
-
-        cosa = 0.0
-        cosb = 0.0
-
-        # Offset the points along the zigzagazimuths
-        zigzagpoints = []
-        for i in range(len(points) - 1):
-            # Alternate the sign
-
-            #QgsMessageLog.logMessage("In zigzag - sign: " + str(i - 2 * math.floor(i / 2)), tag="TOMs panel")
-
-            # currX = points[i].x()
-            # currY = points[i].y()
-
-            dst = amplitude * 1 - 2 * (i - 2 * math.floor(
-                i / 2))  # b = a - m.*floor(a./m)  is the same as   b = mod( a , m )      Thus: i - 2 * math.floor(i/2)
-            #QgsMessageLog.logMessage("In zigzag - dst: " + str(dst) + " Az: " + str(azimuths[i]), tag="TOMs panel")
-
-            # currAz = zigzagazimuths[i]
-            cosa, cosb = generateGeometryUtils.cosdir_azim(azimuths[i])
-
-            #QgsMessageLog.logMessage("In zigzag - cosa: " + str(cosa), tag="TOMs panel")
 
-            zigzagpoints.append(
-                QgsPoint(points[i].x() + (float(offset) * cosa), points[i].y() + (float(offset) * cosb)))
+        TOMsLog.debug("In zigzag")
 
-            #QgsMessageLog.logMessage("In zigzag - point added: " + str(i), tag="TOMs panel")
-            # zigzagpoints.append(QgsPoint(points[i][0] + math.sin(zigzagazimuths[i]) * dst, points[i][1] + math.cos(zigzagazimuths[i]) * dst))
+        line = generateGeometryUtils.getLineForAz(feature)
+        if len(line) == 0:
+            return 0
 
-        # Create new feature from the list of zigzag points
-        gLine = QgsGeometry.fromPolyline(zigzagpoints)
+        if offset is None:
+            offset = float(generateGeometryUtils.getDisplayParam("BayOffsetFromKerb"))
+        if shpExtent is None:
+            shpExtent = float(offset) + amplitude
+        if AzimuthToCentreLine is None:
+            AzimuthToCentreLine = float(feature.attribute("AzimuthToRoadCentreLine"))
 
-        #QgsMessageLog.logMessage("In zigzag - shape created", tag="TOMs panel")
+        ptsList = TOMsGeometryCore.getZigZag([[(pt.x(), pt.y()) for pt in line]], AzimuthToCentreLine, offset, shpExtent,
+                                             wavelength)
 
-        return gLine
+        return QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for (x, y) in ptsList])
 
     @staticmethod
     def meanAngle(a1, a2):
         return phase((rect(1, a1) + rect(1, a2)) / 2.0)
 
     @staticmethod
-    def generateWaitingLabelLeader(feature):
+    def generateWaitingLabelLeader(feature, context=None):
 
         #QgsMessageLog.logMessage("In generateWaitingLabelLeader", tag="TOMs panel")
         # check to see scale
 
-        minScale = float(generateGeometryUtils.getMininumScaleForDisplay())
-        currScale = float(iface.mapCanvas().scale())
+        currScale, minScale = generateGeometryUtils.getLabelLeaderScales(context)
 
         #QgsMessageLog.logMessage("In generateLabelLeader. Current scale: " + str(currScale) + " min scale: " + str(minScale), tag="TOMs panel")
 
@@ -693,13 +507,12 @@ class generateGeometryUtils:
         return None
 
     @staticmethod
-    def generateLoadingLabelLeader(feature):
+    def generateLoadingLabelLeader(feature, context=None):
 
         #QgsMessageLog.logMessage("In generateLoadingLabelLeader", tag="TOMs panel")
         # check to see scale
 
-        minScale = float(generateGeometryUtils.getMininumScaleForDisplay())
-        currScale = float(iface.mapCanvas().scale())
+        currScale, minScale = generateGeometryUtils.getLabelLeaderScales(context)
 
         #QgsMessageLog.logMessage("In generateLabelLeader. Current scale: " + str(currScale) + " min scale: " + str(minScale), tag="TOMs panel")
 
@@ -720,23 +533,21 @@ class generateGeometryUtils:
         return None
 
     @staticmethod
-    def generateBayLabelLeader(feature):
+    def generateBayLabelLeader(feature, context=None):
 
         #QgsMessageLog.logMessage("In generateBayLabelLeader", tag="TOMs panel")
         # check to see scale
 
-        minScale = float(generateGeometryUtils.getMininumScaleForDisplay())
-        currScale = float(iface.mapCanvas().scale())
+        currScale, minScale = generateGeometryUtils.getLabelLeaderScales(context)
 
-        QgsMessageLog.logMessage("In generateBayLabelLeader. Current scale: " + str(currScale) + " min scale: " + str(minScale), tag="TOMs panel")
+        TOMsLog.debug("In generateBayLabelLeader. Current scale: {} min scale: {}", currScale, minScale)
 
         if currScale <= minScale:
 
             if feature.attribute("label_X"):
 
                 length = feature.geometry().length()
-                QgsMessageLog.logMessage(
-                    "In generateBayLabelLeader. labelX set for " + str(feature.attribute("GeometryID")), tag="TOMs panel")
+                TOMsLog.debug("In generateBayLabelLeader. labelX set for {}", feature.attribute("GeometryID"))
 
                 """
                 # now generate line
@@ -768,21 +579,19 @@ class generateGeometryUtils:
         return None
 
     @staticmethod
-    def generatePolygonLabelLeader(feature):
+    def generatePolygonLabelLeader(feature, context=None):
 
         #QgsMessageLog.logMessage("In generateBayLabelLeader", tag="TOMs panel")
         # check to see scale
 
-        minScale = float(generateGeometryUtils.getMininumScaleForDisplay())
-        currScale = float(iface.mapCanvas().scale())
+        currScale, minScale = generateGeometryUtils.getLabelLeaderScales(context)
 
         #QgsMessageLog.logMessage("In generateLabelLeader. Current scale: " + str(currScale) + " min scale: " + str(minScale), tag="TOMs panel")
 
         if currScale <= minScale:
 
             if feature.attribute("labelX"):
-                QgsMessageLog.logMessage(
-                    "In generatePolygonLabelLeader. labelX set for " + str(feature.attribute("GeometryID")), tag="TOMs panel")
+                TOMsLog.debug("In generatePolygonLabelLeader. labelX set for {}", feature.attribute("GeometryID"))
 
                 pt = feature.geometry().nearestPoint()
 
@@ -795,11 +604,46 @@ class generateGeometryUtils:
 
         return None
 
+    @staticmethod
+    def getLabelLeaderScales(context=None):
+        """ Returns (current scale, minimum scale for display) for the render job using the expression context.
+
+            The scale is taken from the context (map_scale) - so that a layout is drawn at its own scale - and only from
+            the canvas if the context doesn't have one. Both are held in the context, i.e., found once per render job.
+        """
+
+        if context is not None and context.hasCachedValue("TOMs_currScale"):
+            return context.cachedValue("TOMs_currScale"), context.cachedValue("TOMs_minScale")
+
+        currScale = None
+        if context is not None:
+            currScale = context.variable("map_scale")
+
+        if currScale is None:
+            if iface is not None and QThread.currentThread() == QCoreApplication.instance().thread():
+                currScale = iface.mapCanvas().scale()
+            else:
+                currScale = 0.0  # no map to take a scale from, so show everything
+
+        currScale = float(currScale)
+        minScale = float(generateGeometryUtils.getMininumScaleForDisplay())
+
+        if context is not None:
+            context.setCachedValue("TOMs_currScale", currScale)
+            context.setCachedValue("TOMs_minScale", minScale)
+
+        return currScale, minScale
+
     @staticmethod
     def getMininumScaleForDisplay():
         #QgsMessageLog.logMessage("In getMininumScaleForDisplay", tag="TOMs panel")
 
-        minScale = QgsExpressionContextUtils.projectScope(QgsProject.instance()).variable('MinimumTextDisplayScale')
+        snapshot = generateGeometryUtils.getDataSnapshot()
+        if snapshot is not None:
+            minScale = snapshot.param('MinimumTextDisplayScale')
+        else:
+            from .restrictionTypeUtilsClass import TOMsParamsSnapshot  # restrictionTypeUtilsClass imports this module
+            minScale = TOMsParamsSnapshot().param('MinimumTextDisplayScale')
 
         #QgsMessageLog.logMessage("In getMininumScaleForDisplay. minScale(1): " + str(minScale), tag="TOMs panel")
 
@@ -809,21 +653,103 @@ class generateGeometryUtils:
 
         return minScale
 
+    @staticmethod
+    def getDisplayParam(param):
+
+        snapshot = generateGeometryUtils.getDataSnapshot()
+        if snapshot is not None:
+            return snapshot.param(param)
+
+        from .restrictionTypeUtilsClass import TOMsParamsSnapshot  # restrictionTypeUtilsClass imports this module
+        return TOMsParamsSnapshot().param(param)
+
+    @staticmethod
+    def getLevelOfDetailScales():
+        """ Returns {level of detail: scale beyond which it is used} for the levels set up in the project """
+
+        scales = dict()
+        for (levelOfDetail, param) in [(DisplayLevelOfDetail.SIMPLIFIED, "SimplifiedGeometryDisplayScale"),
+                                       (DisplayLevelOfDetail.KERB_LINE, "KerbLineGeometryDisplayScale")]:
+            try:
+                scales[levelOfDetail] = float(generateGeometryUtils.getDisplayParam(param))
+            except (TypeError, ValueError):
+                pass   # not set up - always show the detail
+
+        return scales
+
+    @staticmethod
+    def getDisplayLevelOfDetail(context=None):
+        """ Returns the DisplayLevelOfDetail for the render job using the expression context (held in the context).
+
+            Full detail is used if there is no context, within print layouts or if the variable ForceFullDetail is set
+            (e.g., for a layout, or as false to allow reduced detail within a layout).
+        """
+
+        if context is None:
+            return DisplayLevelOfDetail.FULL
+
+        if context.hasCachedValue("TOMs_levelOfDetail"):
+            return context.cachedValue("TOMs_levelOfDetail")
+
+        levelOfDetail = DisplayLevelOfDetail.FULL
+
+        forceFullDetail = context.variable("ForceFullDetail")
+        if forceFullDetail is None or forceFullDetail == NULL or len(str(forceFullDetail)) == 0:
+            forceFullDetail = context.hasVariable("layout_name")
+        else:
+            forceFullDetail = str(forceFullDetail).lower() in ["1", "true", "yes"]
+
+        currScale = context.variable("map_scale")
+        if not forceFullDetail and currScale is not None:
+            for (level, scale) in generateGeometryUtils.getLevelOfDetailScales().items():
+                if float(currScale) > scale:
+                    levelOfDetail = max(levelOfDetail, level)
+
+        context.setCachedValue("TOMs_levelOfDetail", levelOfDetail)
+
+        return levelOfDetail
+
+    @staticmethod
+    def getWaitingLoadingRestrictionLabelTextForRender(feature, context=None):
+        # the waiting and loading label functions both use this - so only work it out once for each feature in a render
+        return generateGeometryUtils.getMemoisedLabelText(feature, generateGeometryUtils.getWaitingLoadingRestrictionLabelText, context)
+
+    @staticmethod
+    def getBayRestrictionLabelTextForRender(feature, context=None):
+        return generateGeometryUtils.getMemoisedLabelText(feature, generateGeometryUtils.getBayRestrictionLabelText, context)
+
+    @staticmethod
+    def getMemoisedLabelText(feature, labelFunction, context=None):
+        """ Returns labelFunction(feature) - held within the expression context, i.e., for the render job.
+
+            Each render job (canvas, print layout, atlas page, ...) has its own context, so the label text is worked out
+            again, with the current lookups and zones, for each render - and is not shared between render threads.
+        """
+
+        if context is None:
+            return labelFunction(feature)
+
+        cacheKey = "TOMs_{function}_{fid}".format(function=labelFunction.__name__, fid=feature.id())
+        if context.hasCachedValue(cacheKey):
+            return tuple(context.cachedValue(cacheKey))
+
+        value = labelFunction(feature)
+        context.setCachedValue(cacheKey, list(value))
+        return value
+
     @staticmethod
     def getWaitingLoadingRestrictionLabelText(feature):
 
-        QgsMessageLog.logMessage("In getWaitingLoadingRestrictionLabelText", tag="TOMs panel")
+        TOMsLog.debug("In getWaitingLoadingRestrictionLabelText")
 
         waitingTimeID = feature.attribute("NoWaitingTimeID")
         loadingTimeID = feature.attribute("NoLoadingTimeID")
         GeometryID = feature.attribute("GeometryID")
 
-        TimePeriodsLayer = QgsProject.instance().mapLayersByName("TimePeriods")[0]
-
-        waitDesc = generateGeometryUtils.getLookupLabelText(TimePeriodsLayer, waitingTimeID)
-        loadDesc = generateGeometryUtils.getLookupLabelText(TimePeriodsLayer, loadingTimeID)
+        waitDesc = generateGeometryUtils.getLookupLabelTextForLayer("TimePeriods", waitingTimeID)
+        loadDesc = generateGeometryUtils.getLookupLabelTextForLayer("TimePeriods", loadingTimeID)
 
-        QgsMessageLog.logMessage("In getWaitingLoadingRestrictionLabelText(1): waiting: " + str(waitDesc) + " loading: " + str(loadDesc), tag="TOMs panel")
+        TOMsLog.debug("In getWaitingLoadingRestrictionLabelText(1): waiting: {} loading: {}", waitDesc, loadDesc)
 
         restrictionCPZ = feature.attribute("CPZ")
         CPZWaitingTimeID = generateGeometryUtils.getCPZWaitingTimeID(restrictionCPZ)
@@ -844,7 +770,7 @@ class generateGeometryUtils:
         if loadingTimeID == 1:  # 'At Any Time'
             loadDesc = None """
 
-        QgsMessageLog.logMessage("In getWaitingLoadingRestrictionLabelText(" + GeometryID + "): waiting: " + str(waitDesc) + " loading: " + str(loadDesc), tag="TOMs panel")
+        TOMsLog.debug("In getWaitingLoadingRestrictionLabelText({}): waiting: {} loading: {}", GeometryID, waitDesc, loadDesc)
         return waitDesc, loadDesc
 
     @staticmethod
@@ -856,15 +782,11 @@ class generateGeometryUtils:
         noReturnID = feature.attribute("NoReturnID")
         timePeriodID = feature.attribute("TimePeriodID")
 
-        lengthOfTimeLayer = QgsProject.instance().mapLayersByName("LengthOfTime")[0]
-
-        TimePeriodsLayer = QgsProject.instance().mapLayersByName("TimePeriods")[0]
-
         #QgsMessageLog.logMessage("In getBayRestrictionLabelText (2)", tag="TOMs panel")
 
-        maxStayDesc = generateGeometryUtils.getLookupLabelText(lengthOfTimeLayer, maxStayID)
-        noReturnDesc = generateGeometryUtils.getLookupLabelText(lengthOfTimeLayer, noReturnID)
-        timePeriodDesc = generateGeometryUtils.getLookupLabelText(TimePeriodsLayer, timePeriodID)
+        maxStayDesc = generateGeometryUtils.getLookupLabelTextForLayer("LengthOfTime", maxStayID)
+        noReturnDesc = generateGeometryUtils.getLookupLabelTextForLayer("LengthOfTime", noReturnID)
+        timePeriodDesc = generateGeometryUtils.getLookupLabelTextForLayer("TimePeriods", timePeriodID)
 
         #QgsMessageLog.logMessage("In getBayRestrictionLabelText. maxStay: " + str(maxStayDesc), tag="TOMs panel")
 
@@ -877,17 +799,14 @@ class generateGeometryUtils:
         #TariffZoneNoReturnID = generateGeometryUtils.getTariffZoneNoReturnID(restrictionPTA)
         #TariffZoneTimePeriodID = generateGeometryUtils.getTariffZoneTimePeriodID(restrictionPTA)
 
-        QgsMessageLog.logMessage(
-            "In getBayRestrictionLabelText (1): " + str(CPZWaitingTimeID) + " PTA hours: " + str(TariffZoneTimePeriodID),
-            tag="TOMs panel")
-        QgsMessageLog.logMessage("In getBayRestrictionLabelText. bay hours: " + str(timePeriodID), tag="TOMs panel")
+        TOMsLog.debug("In getBayRestrictionLabelText (1): {} PTA hours: {}", CPZWaitingTimeID, TariffZoneTimePeriodID)
+        TOMsLog.debug("In getBayRestrictionLabelText. bay hours: {}", timePeriodID)
 
         if timePeriodID == 1:  # 'At Any Time'
             timePeriodDesc = None
 
         if CPZWaitingTimeID:
-            QgsMessageLog.logMessage("In getBayRestrictionLabelText: " + str(CPZWaitingTimeID) + " " + str(timePeriodID),
-                                     tag="TOMs panel")
+            TOMsLog.debug("In getBayRestrictionLabelText: {} {}", CPZWaitingTimeID, timePeriodID)
             if CPZWaitingTimeID == timePeriodID:
                 timePeriodDesc = None
 
@@ -906,7 +825,7 @@ class generateGeometryUtils:
             if TariffZoneNoReturnID == noReturnID:
                 noReturnDesc = None
 
-        QgsMessageLog.logMessage("In getBayRestrictionLabelText. timePeriodDesc (2): " + str(timePeriodDesc), tag="TOMs panel")
+        TOMsLog.debug("In getBayRestrictionLabelText. timePeriodDesc (2): {}", timePeriodDesc)
 
         return maxStayDesc, noReturnDesc, timePeriodDesc
 
@@ -915,45 +834,46 @@ class generateGeometryUtils:
 
         #QgsMessageLog.logMessage("In getLookupDescription", tag="TOMs panel")
 
-        query = "\"Code\" = " + str(code)
-        request = QgsFeatureRequest().setFilterExpression(query)
-
-        #QgsMessageLog.logMessage("In getLookupDescription. queryStatus: " + str(query), tag="TOMs panel")
-
-        for row in lookupLayer.getFeatures(request):
-            #QgsMessageLog.logMessage("In getLookupDescription: found row " + str(row.attribute("Description")), tag="TOMs panel")
-            return row.attribute("Description") # make assumption that only one row
-
-        return None
+        from .core.TOMsLookupCache import TOMsLookupCache  # restrictionTypeUtilsClass imports this module
+        return TOMsLookupCache().getDescription(lookupLayer, code)
 
     @staticmethod
     def getLookupLabelText(lookupLayer, code):
 
         #QgsMessageLog.logMessage("In getLookupLabelText", tag="TOMs panel")
 
-        query = "\"Code\" = " + str(code)
-        request = QgsFeatureRequest().setFilterExpression(query)
+        from .core.TOMsLookupCache import TOMsLookupCache  # restrictionTypeUtilsClass imports this module
+        return TOMsLookupCache().getLabelText(lookupLayer, code)
 
-        #QgsMessageLog.logMessage("In getLookupLabelText. queryStatus: " + str(query), tag="TOMs panel")
+    @staticmethod
+    def getLookupLabelTextForLayer(lookupLayerName, code):
+        # uses the data snapshot where available, i.e., without reference to the project
 
-        for row in lookupLayer.getFeatures(request):
-            #QgsMessageLog.logMessage("In getLookupLabelText: found row " + str(row.attribute("LabelText")), tag="TOMs panel")
-            return row.attribute("LabelText") # make assumption that only one row
+        snapshot = generateGeometryUtils.getDataSnapshot()
+        if snapshot is not None and snapshot.hasLayer(lookupLayerName):
+            return snapshot.lookupLabelText(lookupLayerName, code)
 
-        return None
+        lookupLayer = QgsProject.instance().mapLayersByName(lookupLayerName)[0]
+        return generateGeometryUtils.getLookupLabelText(lookupLayer, code)
+
+    @staticmethod
+    def getDataSnapshot():
+        """ Returns the current TOMsDataSnapshot (the data used by the expression functions) - or None if TOMs is not active """
+
+        from .core.TOMsDataSnapshot import TOMsDataSnapshotManager  # restrictionTypeUtilsClass imports this module
+        return TOMsDataSnapshotManager().current()
 
     @staticmethod
     def getCurrentCPZDetails(feature):
 
-        QgsMessageLog.logMessage("In getCurrentCPZDetails", tag="TOMs panel")
-        CPZLayer = QgsProject.instance().mapLayersByName("CPZs")[0]
+        TOMsLog.debug("In getCurrentCPZDetails")
 
         restrictionID = feature.attribute("GeometryID")
         #QgsMessageLog.logMessage("In getCurrentCPZDetails. restriction: " + str(restrictionID), tag="TOMs panel")
 
         geom = feature.geometry()
 
-        currentCPZFeature = generateGeometryUtils.getPolygonForRestriction(feature, CPZLayer)
+        currentCPZFeature = generateGeometryUtils.getZoneForRestriction(feature, "CPZs")
 
         if currentCPZFeature:
 
@@ -969,14 +889,13 @@ class generateGeometryUtils:
     def getCurrentPTADetails(feature):
 
         #QgsMessageLog.logMessage("In getCurrentPTADetails", tag="TOMs panel")
-        PTALayer = QgsProject.instance().mapLayersByName("ParkingTariffAreas")[0]
 
         restrictionID = feature.attribute("GeometryID")
         #QgsMessageLog.logMessage("In getCurrentPTADetails. restriction: " + str(restrictionID), tag="TOMs panel")
 
         geom = feature.geometry()
 
-        currentPTAFeature = generateGeometryUtils.getPolygonForRestriction(feature, PTALayer)
+        currentPTAFeature = generateGeometryUtils.getZoneForRestriction(feature, "ParkingTariffAreas")
 
         if currentPTAFeature:
 
@@ -991,6 +910,20 @@ class generateGeometryUtils:
 
         return None, None, None
 
+    @staticmethod
+    def getZoneForRestriction(restriction, zoneLayerName):
+        # uses the data snapshot where available, i.e., without reference to the project
+
+        snapshot = generateGeometryUtils.getDataSnapshot()
+        if snapshot is not None and snapshot.hasLayer(zoneLayerName):
+            line = generateGeometryUtils.getLineForAz(restriction)
+            if line:
+                return snapshot.findZone(zoneLayerName, line[0])
+            return None
+
+        zoneLayer = QgsProject.instance().mapLayersByName(zoneLayerName)[0]
+        return generateGeometryUtils.getPolygonForRestriction(restriction, zoneLayer)
+
     @staticmethod
     def getPolygonForRestriction(restriction, layer):
         # def findFeatureAt(self, pos, excludeFeature=None):
@@ -1014,28 +947,30 @@ class generateGeometryUtils:
             testPt = line[0]  # choose second point to (try to) move away from any "ends" (may be best to get midPoint ...)
             #QgsMessageLog.logMessage("In getPolygonForRestriction." + str(testPt.x()), tag="TOMs panel")
 
-            for poly in layer.getFeatures():
-                if poly.geometry().contains(QgsGeometry.fromPointXY(testPt)):
-                    #QgsMessageLog.logMessage("In getPolygonForRestriction. feature found", tag="TOMs panel")
-                    return poly
+            from .core.TOMsZoneIndex import TOMsZoneLocator  # restrictionTypeUtilsClass imports this module
+            return TOMsZoneLocator().findZone(layer, testPt)
 
         return None
 
+    @staticmethod
+    def getZoneAttributes(zoneLayerName, zoneKey):
+
+        snapshot = generateGeometryUtils.getDataSnapshot()
+        if snapshot is not None and snapshot.hasLayer(zoneLayerName):
+            return snapshot.zoneAttributes(zoneLayerName, zoneKey)
+
+        from .core.TOMsZoneIndex import TOMsZoneAttributeIndex  # restrictionTypeUtilsClass imports this module
+        return TOMsZoneAttributeIndex().getZoneAttributes(zoneLayerName, zoneKey)
+
     @staticmethod
     def getCPZWaitingTimeID(cpzNr):
 
         #QgsMessageLog.logMessage("In getCPZWaitingTimeID", tag="TOMs panel")
 
-        CPZLayer = QgsProject.instance().mapLayersByName("CPZs")[0]
+        cpzDetails = generateGeometryUtils.getZoneAttributes("CPZs", cpzNr)
 
-        for poly in CPZLayer.getFeatures():
-
-            currentCPZ = poly.attribute("CPZ")
-            if currentCPZ == cpzNr:
-                #QgsMessageLog.logMessage("In getCPZWaitingTimeID. Found CPZ.", tag="TOMs panel")
-                cpzWaitingTimeID = poly.attribute("WaitingTimeID")
-                #QgsMessageLog.logMessage("In getCPZWaitingTimeID. ID." + str(cpzWaitingTimeID), tag="TOMs panel")
-                return cpzWaitingTimeID
+        if cpzDetails:
+            return cpzDetails["WaitingTimeID"]
 
         return None
 
@@ -1044,18 +979,10 @@ class generateGeometryUtils:
 
         #QgsMessageLog.logMessage("In getTariffZoneDetails", tag="TOMs panel")
 
-        tpaLayer = QgsProject.instance().mapLayersByName("ParkingTariffAreas")[0]
-
-        for poly in tpaLayer.getFeatures():
+        ptaDetails = generateGeometryUtils.getZoneAttributes("ParkingTariffAreas", tpaNr)
 
-            currentPTA = poly.attribute("Name")
-            if currentPTA == tpaNr:
-                #QgsMessageLog.logMessage("In getTariffZoneDetails. Found PTA.", tag="TOMs panel")
-                ptaTimePeriodID = poly.attribute("TimePeriodID")
-                ptaMaxStayID = poly.attribute("MaxStayID")
-                ptaNoReturnTimeID = poly.attribute("NoReturnTimeID")
-                #QgsMessageLog.logMessage("In getTariffZoneMaxStayID. ID." + str(ptaMaxStayID), tag="TOMs panel")
-                return ptaTimePeriodID, ptaMaxStayID, ptaNoReturnTimeID
+        if ptaDetails:
+            return ptaDetails["TimePeriodID"], ptaDetails["MaxStayID"], ptaDetails["NoReturnTimeID"]
 
         return None, None, None
 
@@ -1064,16 +991,10 @@ class generateGeometryUtils:
 
         #QgsMessageLog.logMessage("In getTariffZoneMaxStayID", tag="TOMs panel")
 
-        tpaLayer = QgsProject.instance().mapLayersByName("ParkingTariffAreas")[0]
+        ptaDetails = generateGeometryUtils.getZoneAttributes("ParkingTariffAreas", tpaNr)
 
-        for poly in tpaLayer.getFeatures():
-
-            currentPTA = poly.attribute("Name")
-            if currentPTA == tpaNr:
-                #QgsMessageLog.logMessage("In getTariffZoneMaxStayID. Found PTA.", tag="TOMs panel")
-                ptaMaxStayID = poly.attribute("MaxStayID")
-                #QgsMessageLog.logMessage("In getTariffZoneMaxStayID. ID." + str(ptaMaxStayID), tag="TOMs panel")
-                return ptaMaxStayID
+        if ptaDetails:
+            return ptaDetails["MaxStayID"]
 
         return None
 
@@ -1082,16 +1003,10 @@ class generateGeometryUtils:
 
         #QgsMessageLog.logMessage("In getTariffZoneNoReturnID", tag="TOMs panel")
 
-        tpaLayer = QgsProject.instance().mapLayersByName("ParkingTariffAreas")[0]
-
-        for poly in tpaLayer.getFeatures():
+        ptaDetails = generateGeometryUtils.getZoneAttributes("ParkingTariffAreas", tpaNr)
 
-            currentPTA = poly.attribute("Name")
-            if currentPTA == tpaNr:
-                #QgsMessageLog.logMessage("In getTariffZoneNoReturnID. Found PTA.", tag="TOMs panel")
-                ptaNoReturnID = poly.attribute("NoReturnTimeID")
-                #QgsMessageLog.logMessage("In getTariffZoneNoReturnID. ID." + str(ptaNoReturnID), tag="TOMs panel")
-                return ptaNoReturnID
+        if ptaDetails:
+            return ptaDetails["NoReturnTimeID"]
 
         return None
 
@@ -1100,16 +1015,10 @@ class generateGeometryUtils:
 
         #QgsMessageLog.logMessage("In getTariffZoneTimePeriodID", tag="TOMs panel")
 
-        tpaLayer = QgsProject.instance().mapLayersByName("ParkingTariffAreas")[0]
-
-        for poly in tpaLayer.getFeatures():
+        ptaDetails = generateGeometryUtils.getZoneAttributes("ParkingTariffAreas", tpaNr)
 
-            currentPTA = poly.attribute("Name")
-            if currentPTA == tpaNr:
-                #QgsMessageLog.logMessage("In getTariffZoneTimePeriodID. Found PTA.", tag="TOMs panel")
-                ptaTimePeriodID = poly.attribute("TimePeriodID")
-                #QgsMessageLog.logMessage("In getTariffZoneTimePeriodID. ID." + str(ptaTimePeriodID), tag="TOMs panel")
-                return ptaTimePeriodID
+        if ptaDetails:
+            return ptaDetails["TimePeriodID"]
 
         return None
 
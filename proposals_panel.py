@@ -225,6 +225,8 @@ class proposalsPanel(RestrictionTypeUtilsMixin):
 
         self.proposalsManager.clearRestrictionFilters()
 
+        self.proposalsManager.onTOMsDeactivated()
+
         pass
 
     def createProposalcb(self):
@@ -48,6 +48,8 @@ from qgis.gui import *
 import functools
 import time
 import os
+import queue
+import threading
 
 from .constants import (
     ProposalStatus,
@@ -62,6 +64,9 @@ from .core.TOMsTransaction import (TOMsTransaction)
 from abc import ABCMeta
 import datetime
 import uuid
+from .core.TOMsMessageLog import TOMsMessageLog
+
+TOMsLog = TOMsMessageLog.getLog(__name__)
 
 class TOMsParams(QObject):
 
@@ -230,23 +235,216 @@ class Singleton(type):
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
 
+class TOMsParamsSnapshot(metaclass=Singleton):
+    """
+    Process wide, read only copy of the TOMs project parameters.
+
+    The values are read once (when TOMs is activated or on first use) and re-read only when the project variables change.
+    Each refresh replaces the dictionary (rather than changing it) and increments the version, so readers (including
+    render threads) always see a consistent set of values and can use the version to check whether anything they
+    derived from the parameters is out of date.
+    """
+
+    TOMsParamsList = ["BayWidth",
+                      "BayLength",
+                      "BayOffsetFromKerb",
+                      "LineOffsetFromKerb",
+                      "CrossoverShapeWidth",
+                      "PhotoPath",
+                      "MinimumTextDisplayScale",
+                      "SimplifiedGeometryDisplayScale",
+                      "KerbLineGeometryDisplayScale",
+                      "MaterialiseDisplayGeometry",
+                      "UseDisplayGeometryRenderer"
+                      ]
+
+    def __init__(self):
+        QgsMessageLog.logMessage("In TOMsParamsSnapshot.init ...", tag="TOMs panel")
+
+        self.__params = None
+        self.__version = 0
+
+        QgsProject.instance().customVariablesChanged.connect(self.refresh)
+
+    def refresh(self):
+
+        QgsMessageLog.logMessage("In TOMsParamsSnapshot.refresh ...", tag="TOMs panel")
+
+        projectScope = QgsExpressionContextUtils.projectScope(QgsProject.instance())
+
+        newParams = dict()
+        for param in self.TOMsParamsList:
+            currParam = projectScope.variable(param)
+            if currParam is None or len(str(currParam)) == 0:
+                QgsMessageLog.logMessage("In TOMsParamsSnapshot.refresh. Property " + param + " is not present", tag="TOMs panel")
+                currParam = None
+            newParams[param] = currParam
+
+        if newParams != self.__params:
+            self.__params = newParams
+            self.__version += 1
+            QgsMessageLog.logMessage("In TOMsParamsSnapshot.refresh. version " + str(self.__version) + ": " + str(newParams), tag="TOMs panel")
+
+        return self.__version
+
+    def __currentParams(self):
+        params = self.__params
+        if params is None:
+            self.refresh()
+            params = self.__params
+        return params
+
+    def param(self, param):
+        return self.__currentParams().get(param)
+
+    def params(self):
+        return dict(self.__currentParams())
+
+    def version(self):
+        self.__currentParams()
+        return self.__version
+
 class Logger(metaclass=Singleton):
+    """
+    Writes the QGIS messages to a daily log file within QGIS_LOGFILE_PATH.
+
+    Messages are queued and written in batches by a background thread (which keeps the file open), so that logging does
+    not hold up the GUI thread. A new file is started each day and when the current file reaches MAX_FILE_SIZE.
+    close() (called when the plugin is unloaded) writes any outstanding messages. If the log file can't be written, the
+    messages are dropped - flush() and close() wait at most FLUSH_TIMEOUT for the writer.
+    """
+
+    MAX_FILE_SIZE = 10 * 1024 * 1024   # bytes
+    FLUSH_INTERVAL = 1.0                # seconds
+    FLUSH_TIMEOUT = 5.0                 # seconds
+    MAX_BATCH_SIZE = 1000               # messages
+
     def __init__(self, iface):
         # Set up log file and collect any relevant messages
-        logFilePath = os.environ.get('QGIS_LOGFILE_PATH')
+        self.logFilePath = os.environ.get('QGIS_LOGFILE_PATH')
+        self.filename = None
+
+        self.__queue = queue.Queue()
+        self.__thread = None
+        self.__logfile = None
+        self.__logDate = None
+        self.__fileNr = 0
 
-        if logFilePath:
-            QgsMessageLog.logMessage("LogFilePath: " + str(logFilePath), tag="TOMs panel")
+        if self.logFilePath:
+            QgsMessageLog.logMessage("LogFilePath: " + str(self.logFilePath), tag="TOMs panel")
+
+            self.__thread = threading.Thread(target=self.__writeMessages, name="TOMsLogWriter", daemon=True)
+            self.__thread.start()
 
-            logfile = 'qgis_' + datetime.date.today().strftime("%Y%m%d") + '.log'
-            self.filename = os.path.join(logFilePath, logfile)
-            QgsMessageLog.logMessage("Sorting out log file" + self.filename, tag="TOMs panel")
             QgsApplication.instance().messageLog().messageReceived.connect(self.write_log_message)
+            # messages that are only to go to the log file (see TOMsMessageLog)
+            TOMsMessageLog.setFileWriter(self.write_log_message)
 
     def write_log_message(self, message, tag, level):
-        # filename = os.path.join('C:\Users\Tim\Documents\MHTC', 'qgis.log')
-        with open(self.filename, 'a') as logfile:
-            logfile.write('{dateDetails}:: {message}\n'.format(dateDetails= time.strftime("%Y%m%d:%H%M%S"), message=message))
+        # time is taken when the message is received (rather than when it is written)
+        if self.__thread is not None:
+            self.__queue.put('{dateDetails}:: {message}\n'.format(dateDetails=time.strftime("%Y%m%d:%H%M%S"), message=message))
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """ Wait until all the queued messages have been written. Returns False if this took longer than timeout """
+
+        if self.__thread is None:
+            return True
+
+        written = threading.Event()
+        self.__queue.put(written)   # set by the writer once the messages before it are written
+        return written.wait(timeout)
+
+    def close(self):
+
+        if self.__thread is None:
+            return
+
+        TOMsMessageLog.setFileWriter(None)
+        try:
+            QgsApplication.instance().messageLog().messageReceived.disconnect(self.write_log_message)
+        except TypeError:
+            pass
+
+        self.__queue.put(None)   # stop the writer (after the outstanding messages)
+        self.__thread.join(self.FLUSH_TIMEOUT)
+        self.__thread = None
+
+    def __writeMessages(self):
+
+        running = True
+        while running:
+            try:
+                batch = [self.__queue.get(timeout=self.FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+
+            while len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+
+            messages = [message for message in batch if isinstance(message, str)]
+
+            try:
+                if len(messages) > 0:
+                    logfile = self.__currentLogFile()
+                    logfile.write(''.join(messages))
+                    logfile.flush()
+            except Exception:
+                # nowhere to report this ... the messages are dropped and the file is opened again for the next batch
+                self.__closeLogFile()
+
+            for message in batch:
+                if isinstance(message, threading.Event):
+                    message.set()   # see flush
+
+        self.__closeLogFile()
+
+    def __currentLogFile(self):
+        # new file each day - or when the current file is too big
+
+        today = datetime.date.today()
+        if self.__logfile is None or today != self.__logDate:
+            self.__openLogFile(today, 0)
+        elif self.__logfile.tell() >= self.MAX_FILE_SIZE:
+            self.__openLogFile(today, self.__fileNr + 1)
+
+        return self.__logfile
+
+    def __openLogFile(self, logDate, fileNr):
+
+        self.__closeLogFile()
+
+        while True:
+            logfile = 'qgis_' + logDate.strftime("%Y%m%d")
+            if fileNr > 0:
+                logfile = logfile + '_' + str(fileNr)
+            filename = os.path.join(self.logFilePath, logfile + '.log')
+            if not os.path.exists(filename) or os.path.getsize(filename) < self.MAX_FILE_SIZE:
+                break
+            fileNr += 1
+
+        # only recorded once the file is open - otherwise it is tried again with the next batch
+        self.__logfile = open(filename, 'a')
+        self.filename = filename
+        self.__logDate = logDate
+        self.__fileNr = fileNr
+
+    def __closeLogFile(self):
+
+        logfile = self.__logfile
+        self.__logfile = None
+        if logfile is not None:
+            try:
+                logfile.close()
+            except Exception:
+                pass
 
 class RestrictionTypeUtilsMixin():
     #def __init__(self):
@@ -834,7 +1032,7 @@ class RestrictionTypeUtilsMixin():
         FIELD2 = dialog.findChild(QLabel, "Photo_Widget_02")
         FIELD3 = dialog.findChild(QLabel, "Photo_Widget_03")
 
-        path_absolute = QgsExpressionContextUtils.projectScope(QgsProject.instance()).variable('PhotoPath')
+        path_absolute = TOMsParamsSnapshot().param('PhotoPath')
         if path_absolute == None:
             reply = QMessageBox.information(None, "Information", "Please set value for PhotoPath.", QMessageBox.Ok)
             return
@@ -1384,7 +1582,7 @@ class RestrictionTypeUtilsMixin():
 
         # get the tile(s) for a given restriction
 
-        QgsMessageLog.logMessage("In getTileForRestriction. ", tag="TOMs panel")
+        TOMsLog.debug("In getTileForRestriction. ")
 
         #a.geometry().intersects(f.geometry()):
 
@@ -1396,7 +1594,7 @@ class RestrictionTypeUtilsMixin():
             if tile.geometry().intersects(currRestriction.geometry()):
                 # get revision number and add tile to list
                 #currRevisionNrForTile = self.getTileRevisionNr(tile)
-                QgsMessageLog.logMessage("In getTileForRestriction. Tile: " + str(tile.attribute("id")) + "; " + str(tile.attribute("RevisionNr")) + "; " + str(tile.attribute("LastRevisionDate")), tag="TOMs panel")
+                TOMsLog.debug("In getTileForRestriction. Tile: {}; {}; {}", tile.attribute("id"), tile.attribute("RevisionNr"), tile.attribute("LastRevisionDate"))
 
                 # check revision nr, etc
                 currTileNr = tile.attribute("id")
@@ -1421,23 +1619,16 @@ class RestrictionTypeUtilsMixin():
 
                 #idxRevisionNr = self.tableNames.TILES_IN_ACCEPTED_PROPOSALS.fields().indexFromName("RevisionNr")
 
-                QgsMessageLog.logMessage(
-                            "In getTileForRestriction: Tile: " + str(tile.attribute("id")) + "; " + str(
-                                tile.attribute("RevisionNr")) + "; " + str(tile.attribute("LastRevisionDate")) + "; " + str(idxTileID),
-                            tag="TOMs panel")
+                TOMsLog.debug("In getTileForRestriction: Tile: {}; {}; {}; {}", tile.attribute("id"), tile.attribute("RevisionNr"), tile.attribute("LastRevisionDate"), idxTileID)
 
                 #self.tileSet.add((tile))
                 #self.addFeatureToSet(self.tileSet, tile, self.tableNames.MAP_GRID.fields().indexFromName("id"))
 
                 if self.checkFeatureInSet(self.tileSet, tile, self.tableNames.setLayer("MapGrid").fields().indexFromName("id")) == False:
-                    QgsMessageLog.logMessage(
-                        "In addFeatureToSet. Adding: " + str(currTileNr) + " ; " + str(len(self.tileSet)),
-                        tag="TOMs panel")
+                    TOMsLog.debug("In addFeatureToSet. Adding: {} ; {}", currTileNr, len(self.tileSet))
                     self.tileSet.add((tile))
 
-                QgsMessageLog.logMessage(
-                            "In getTileForRestriction. len tileSet: " + str(len(self.tileSet)),
-                            tag="TOMs panel")
+                TOMsLog.debug("In getTileForRestriction. len tileSet: {}", len(self.tileSet))
 
                 pass
 
@@ -1564,16 +1755,7 @@ class RestrictionTypeUtilsMixin():
 
         #QgsMessageLog.logMessage("In getLookupDescription", tag="TOMs panel")
 
-        query = "\"Code\" = " + str(code)
-        request = QgsFeatureRequest().setFilterExpression(query)
-
-        #QgsMessageLog.logMessage("In getLookupDescription. queryStatus: " + str(query), tag="TOMs panel")
-
-        for row in lookupLayer.getFeatures(request):
-            #QgsMessageLog.logMessage("In getLookupDescription: found row " + str(row.attribute("Description")), tag="TOMs panel")
-            return row.attribute("Description") # make assumption that only one row
-
-        return None
+        return generateGeometryUtils.getLookupDescription(lookupLayer, code)
 
     def setupPanelTabs(self, iface, parent):
 
@@ -0,0 +1,93 @@
+# coding=utf-8
+"""Tests for the data snapshot used by the expression functions.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProject,
+    QgsVectorLayer
+)
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+TOMsDataSnapshot = importlib.import_module(PLUGIN + '.core.TOMsDataSnapshot').TOMsDataSnapshot
+
+
+def addFeature(layer, attributes, wkt=None):
+    feature = QgsFeature(layer.fields())
+    feature.setAttributes(attributes)
+    if wkt is not None:
+        feature.setGeometry(QgsGeometry.fromWkt(wkt))
+    layer.dataProvider().addFeatures([feature])
+
+
+class TOMsDataSnapshotTest(unittest.TestCase):
+    """Lookups, zones and road names through the shared indexes"""
+
+    def setUp(self):
+        self.timePeriods = QgsVectorLayer('None?field=Code:integer&field=LabelText:string&field=Description:string',
+                                          'TimePeriods', 'memory')
+        addFeature(self.timePeriods, [1, 'At Any Time', 'At Any Time'])
+
+        self.cpzs = QgsVectorLayer('Polygon?crs=epsg:27700&field=CPZ:string&field=WaitingTimeID:integer', 'CPZs', 'memory')
+        addFeature(self.cpzs, ['A', 1], 'Polygon((0 0, 100 0, 100 100, 0 100, 0 0))')
+
+        self.casement = QgsVectorLayer('LineString?crs=epsg:27700&field=StreetName:string&field=USRN:string',
+                                       'RoadCasement', 'memory')
+        addFeature(self.casement, ['High Street', '123'], 'LineString(0 10, 100 10)')
+
+        QgsProject.instance().addMapLayers([self.timePeriods, self.cpzs, self.casement])
+        self.snapshot = TOMsDataSnapshot.build(1)
+
+    def tearDown(self):
+        QgsProject.instance().removeMapLayers([self.timePeriods.id(), self.cpzs.id(), self.casement.id()])
+
+    def test_layers(self):
+        self.assertTrue(self.snapshot.hasLayer('CPZs'))
+        self.assertFalse(self.snapshot.hasLayer('RoadCentreLine'))
+        self.assertIsNone(self.snapshot.azimuthToCentreLine(QgsPointXY(50, 12)))
+
+    def test_lookups(self):
+        self.assertEqual(self.snapshot.lookupLabelText('TimePeriods', 1), 'At Any Time')
+        self.assertEqual(self.snapshot.zoneAttributes('CPZs', 'A'), {'WaitingTimeID': 1})
+        self.assertEqual(self.snapshot.findZone('CPZs', QgsPointXY(50, 50))['CPZ'], 'A')
+        self.assertIsNone(self.snapshot.findZone('CPZs', QgsPointXY(150, 50)))
+        self.assertEqual(self.snapshot.roadNameAt(QgsPointXY(50, 12), 5.0), ('High Street', '123'))
+
+    def test_edits(self):
+        # the snapshot sees changes to the layers without being rebuilt
+        self.snapshot.findZone('CPZs', QgsPointXY(50, 50))
+
+        self.cpzs.startEditing()
+        zone = QgsFeature(self.cpzs.fields())
+        zone.setAttributes(['B', 2])
+        zone.setGeometry(QgsGeometry.fromWkt('Polygon((100 0, 200 0, 200 100, 100 100, 100 0))'))
+        self.cpzs.addFeature(zone)
+        self.cpzs.commitChanges()
+
+        self.assertEqual(self.snapshot.findZone('CPZs', QgsPointXY(150, 50))['CPZ'], 'B')
+        self.assertEqual(self.snapshot.zoneAttributes('CPZs', 'B'), {'WaitingTimeID': 2})
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsDataSnapshotTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,149 @@
+# coding=utf-8
+"""Tests for the index of the open/close dates of the restrictions.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import datetime
+import tempfile
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsFeature,
+    QgsProject,
+    QgsTransactionGroup,
+    QgsVectorFileWriter,
+    QgsVectorLayer
+)
+from qgis.PyQt.QtCore import QDate
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+TOMsDateIndex = importlib.import_module(PLUGIN + '.core.TOMsDateIndex')
+RestrictionIntervals = TOMsDateIndex.RestrictionIntervals
+
+
+def day(month, dayOfMonth):
+    return datetime.date(2020, month, dayOfMonth)
+
+
+def restrictionLayer(features):
+    """ File backed restriction layer (a memory layer can't be opened again through its source) """
+
+    memoryLayer = QgsVectorLayer('LineString?crs=epsg:27700&field=RestrictionID:string&field=OpenDate:date&field=CloseDate:date',
+                                 'Bays', 'memory')
+    for attributes in features:
+        feature = QgsFeature(memoryLayer.fields())
+        feature.setAttributes(attributes)
+        memoryLayer.dataProvider().addFeatures([feature])
+
+    fileName = os.path.join(tempfile.mkdtemp(), 'Bays.gpkg')
+    QgsVectorFileWriter.writeAsVectorFormat(memoryLayer, fileName, 'utf-8', memoryLayer.crs(), 'GPKG')
+
+    layer = QgsVectorLayer(fileName + '|layername=Bays', 'Bays', 'ogr')
+    QgsProject.instance().addMapLayer(layer)
+    return layer
+
+
+class TOMsDateIndexTest(unittest.TestCase):
+    """Restrictions current at a date and the effective date for the filters"""
+
+    def setUp(self):
+        self.intervals = RestrictionIntervals()
+        self.intervals.setInterval('a', day(1, 1), None)
+        self.intervals.setInterval('b', day(1, 1), day(3, 1))
+        self.intervals.setInterval('c', day(3, 1), None)
+        self.intervals.setInterval('d', None, None)   # not yet open (within a proposal)
+
+    def test_current_at(self):
+        self.assertEqual(sorted(self.intervals.currentAt(day(2, 15))), ['a', 'b'])
+        self.assertEqual(sorted(self.intervals.currentAt(day(3, 1))), ['a', 'c'])
+        self.assertEqual(self.intervals.currentAt(datetime.date(2019, 6, 1)), [])
+
+    def test_changed_between(self):
+        self.assertEqual(self.intervals.changedBetween(day(2, 1), day(4, 1)), (['c'], ['b']))
+        self.assertEqual(self.intervals.changedBetween(day(4, 1), day(2, 1)), (['b'], ['c']))
+        self.assertEqual(self.intervals.changedBetween(day(1, 2), day(2, 28)), ([], []))
+
+    def test_effective_date(self):
+        self.assertEqual(self.intervals.effectiveDate(day(2, 15)), day(1, 1))
+        self.assertEqual(self.intervals.effectiveDate(day(3, 1)), day(3, 1))
+        self.assertEqual(self.intervals.effectiveDate(day(11, 5)), day(3, 1))
+        self.assertEqual(self.intervals.effectiveDate(datetime.date(2019, 6, 1)), datetime.date(2019, 12, 31))
+
+        self.intervals.remove('c')
+        self.assertEqual(self.intervals.effectiveDate(day(11, 5)), day(3, 1))
+        self.intervals.remove('b')
+        self.assertEqual(self.intervals.effectiveDate(day(11, 5)), day(1, 1))
+
+    def test_committed_changes(self):
+        layer = restrictionLayer([['a', QDate(2020, 1, 1), None]])
+
+        dateIndex = TOMsDateIndex.TOMsRestrictionDateIndex()
+        dateIndex.watchLayer(layer)
+        try:
+            self.assertEqual(dateIndex.effectiveDate(layer, QDate(2020, 6, 1)), QDate(2020, 1, 1))
+
+            layer.startEditing()
+            fid = next(layer.getFeatures()).id()
+            layer.changeAttributeValue(fid, layer.fields().indexFromName('CloseDate'), QDate(2020, 5, 1))
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes([None, 'b', QDate(2020, 5, 1), None])
+            layer.addFeature(feature)
+            layer.commitChanges()
+
+            self.assertEqual(dateIndex.effectiveDate(layer, QDate(2020, 6, 1)), QDate(2020, 5, 1))
+            self.assertEqual(dateIndex.restrictionsAtDate(layer, QDate(2020, 6, 1)), ['b'])
+        finally:
+            dateIndex.unwatchLayers()
+            QgsProject.instance().removeMapLayer(layer.id())
+
+    def test_transaction_group_changes(self):
+        # the restriction layers are edited within a transaction group, i.e., without the committed* signals
+        layer = restrictionLayer([['a', QDate(2020, 1, 1), None], ['x', QDate(2020, 1, 1), None]])
+        transactionGroup = QgsTransactionGroup()
+        self.assertTrue(transactionGroup.addLayer(layer))
+
+        dateIndex = TOMsDateIndex.TOMsRestrictionDateIndex()
+        dateIndex.watchLayer(layer)
+        try:
+            self.assertEqual(dateIndex.effectiveDate(layer, QDate(2020, 6, 1)), QDate(2020, 1, 1))
+
+            self.assertTrue(layer.startEditing())
+            fids = dict((currFeature['RestrictionID'], currFeature.id()) for currFeature in layer.getFeatures())
+            layer.changeAttributeValue(fids['a'], layer.fields().indexFromName('CloseDate'), QDate(2020, 5, 1))
+            layer.deleteFeature(fids['x'])
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes([None, 'b', QDate(2020, 5, 1), None])
+            layer.addFeature(feature)
+
+            # within the transaction - the changes are applied by RestrictionID
+            self.assertEqual(dateIndex.effectiveDate(layer, QDate(2020, 6, 1)), QDate(2020, 5, 1))
+            self.assertEqual(dateIndex.restrictionsAtDate(layer, QDate(2020, 6, 1)), ['b'])
+
+            self.assertTrue(layer.commitChanges())
+            dateIndex.refresh()   # as in TOMsProposalsManager.updateMapCanvas
+
+            self.assertEqual(dateIndex.effectiveDate(layer, QDate(2020, 6, 1)), QDate(2020, 5, 1))
+            self.assertEqual(dateIndex.restrictionsAtDate(layer, QDate(2020, 6, 1)), ['b'])
+        finally:
+            dateIndex.unwatchLayers()
+            QgsProject.instance().removeMapLayer(layer.id())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsDateIndexTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
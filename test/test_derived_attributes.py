@@ -0,0 +1,119 @@
+# coding=utf-8
+"""Tests for the derived attribute calculations used by the bulk recalculation (no QGIS needed).
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import pickle
+import importlib
+import unittest
+import multiprocessing
+import concurrent.futures
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+TOMsSegmentIndex = importlib.import_module(PLUGIN + '.core.TOMsSegmentIndex')
+TOMsZonePolygonIndex = importlib.import_module(PLUGIN + '.core.TOMsZonePolygonIndex')
+TOMsDerivedAttributes = importlib.import_module(PLUGIN + '.core.TOMsDerivedAttributes')
+
+FIELDS = ["AzimuthToRoadCentreLine", "RoadName", "USRN", "CPZ"]
+
+
+def makeIndexes():
+
+    centreLines = TOMsSegmentIndex.SegmentGridIndex()
+    centreLines.addLine(1, [(0.0, 10.0), (100.0, 10.0)])
+
+    casement = TOMsSegmentIndex.SegmentGridIndex()
+    casement.addLine(7, [(0.0, 0.0), (100.0, 0.0)])
+
+    # zones keyed by fid - as TOMsZoneLocator
+    zones = TOMsZonePolygonIndex.ZonePolygonIndex()
+    zones.addZone(3, [[[(0.0, -50.0), (50.0, -50.0), (50.0, 50.0), (0.0, 50.0)]]])
+    # zone with a hole
+    zones.addZone(4, [[[(50.0, -50.0), (150.0, -50.0), (150.0, 50.0), (50.0, 50.0)],
+                       [(90.0, -10.0), (110.0, -10.0), (110.0, 10.0), (90.0, 10.0)]]])
+
+    return TOMsDerivedAttributes.DerivedAttributeIndexes(centreLines, casement,
+                                                         {7: {"StreetName": "High Street", "USRN": 1234}},
+                                                         {"CPZ": (zones, {3: "A", 4: "B"})})
+
+
+class TOMsDerivedAttributesTest(unittest.TestCase):
+    """Derived attributes from plain coordinates"""
+
+    def setUp(self):
+        self.indexes = makeIndexes()
+
+    def test_derived_attributes(self):
+        values = self.indexes.derivedAttributes(FIELDS, (20.0, 1.0), (20.0, 0.5))
+        self.assertEqual(values, {"AzimuthToRoadCentreLine": 0, "RoadName": "High Street", "USRN": 1234, "CPZ": "A"})
+
+        values = self.indexes.derivedAttributes(FIELDS, (20.0, 19.0), (60.0, 0.5))
+        self.assertEqual(values["AzimuthToRoadCentreLine"], 180)
+        self.assertEqual(values["CPZ"], "B")
+
+    def test_no_road_keeps_name(self):
+        values = self.indexes.derivedAttributes(FIELDS, None, (20.0, 30.0))
+        self.assertNotIn("RoadName", values)
+        self.assertNotIn("AzimuthToRoadCentreLine", values)
+        self.assertEqual(values["CPZ"], "A")
+
+    def test_zone_hole_and_outside(self):
+        zones, zoneValues = self.indexes.zones["CPZ"]
+        self.assertIsNone(zones.findZone(100.0, 0.0))
+        self.assertIsNone(zones.findZone(500.0, 0.0))
+        self.assertIsNone(self.indexes.zoneValue("CPZ", 100.0, 0.0))
+
+    def test_zone_changes(self):
+        zones, zoneValues = self.indexes.zones["CPZ"]
+
+        # overlapping zones - the lowest key is used
+        zones.addZone(1, [[[(40.0, -50.0), (60.0, -50.0), (60.0, 50.0), (40.0, 50.0)]]])
+        self.assertEqual(zones.candidates(45.0, 0.0), [1, 3])
+        self.assertEqual(zones.findZone(45.0, 0.0), 1)
+
+        zones.removeKey(1)
+        self.assertEqual(zones.findZone(45.0, 0.0), 3)
+
+        # replaced geometry
+        zones.addZone(3, [[[(0.0, -50.0), (20.0, -50.0), (20.0, 50.0), (0.0, 50.0)]]])
+        self.assertIsNone(zones.findZone(45.0, 0.0))
+        self.assertEqual(len(zones), 2)
+
+    def test_nearest_in_box(self):
+        # within maxDistance but not within the box around the point
+        self.assertIsNone(self.indexes.casement.nearestInBox(-5.5, 1.0, 5.0))
+        self.assertEqual(self.indexes.roadName(-5.5, 1.0), (None, None))
+        self.assertEqual(self.indexes.casement.nearestInBox(20.0, 4.0, 5.0), (4.0, (20.0, 0.0), 7))
+        self.assertEqual(self.indexes.azimuthToCentreLine(20.0, 40.0), 0)
+
+    def test_indexes_pickle(self):
+        indexes = pickle.loads(pickle.dumps(self.indexes))
+        self.assertEqual(indexes.derivedAttributes(FIELDS, (20.0, 1.0), (60.0, 0.5)),
+                         self.indexes.derivedAttributes(FIELDS, (20.0, 1.0), (60.0, 0.5)))
+
+    def test_worker_processes(self):
+        records = [(fid, (float(fid), 1.0), (float(fid), 0.5)) for fid in range(0, 140, 7)]
+        expected = TOMsDerivedAttributes.computeChunk(self.indexes, FIELDS, records)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"),
+                                                    initializer=TOMsDerivedAttributes.initWorker,
+                                                    initargs=(self.indexes,)) as pool:
+            results = pool.submit(TOMsDerivedAttributes.computeWorkerChunk, FIELDS, records).result()
+
+        self.assertEqual(results, expected)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsDerivedAttributesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
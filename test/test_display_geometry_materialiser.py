@@ -0,0 +1,132 @@
+# coding=utf-8
+"""Tests for keeping the companion display geometry layers current.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import tempfile
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsExpressionContextUtils,
+    QgsFeature,
+    QgsGeometry,
+    QgsProject,
+    QgsTransactionGroup,
+    QgsVectorFileWriter,
+    QgsVectorLayer
+)
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+TOMsDisplayGeometryMaterialiser = importlib.import_module(PLUGIN + '.core.TOMsDisplayGeometryMaterialiser').TOMsDisplayGeometryMaterialiser
+TOMsParamsSnapshot = importlib.import_module(PLUGIN + '.restrictionTypeUtilsClass').TOMsParamsSnapshot
+
+
+class TOMsDisplayGeometryMaterialiserTest(unittest.TestCase):
+    """Changes made within a transaction group, recorded by GeometryID"""
+
+    def setUp(self):
+        memoryLayer = QgsVectorLayer('LineString?crs=epsg:27700&field=GeometryID:string', 'Bays', 'memory')
+        feature = QgsFeature(memoryLayer.fields())
+        feature.setAttributes(['a'])
+        feature.setGeometry(QgsGeometry.fromWkt('LineString(0 0, 10 0)'))
+        memoryLayer.dataProvider().addFeatures([feature])
+
+        fileName = os.path.join(tempfile.mkdtemp(), 'Bays.gpkg')
+        QgsVectorFileWriter.writeAsVectorFormat(memoryLayer, fileName, 'utf-8', memoryLayer.crs(), 'GPKG')
+
+        self.layer = QgsVectorLayer(fileName + '|layername=Bays', 'Bays', 'ogr')
+        self.displayLayers = [QgsVectorLayer('MultiLineString?crs=epsg:27700&field=GeometryID:string', 'Bays_DisplayLines', 'memory'),
+                              QgsVectorLayer('MultiPolygon?crs=epsg:27700&field=GeometryID:string', 'Bays_DisplayPolygons', 'memory')]
+        QgsProject.instance().addMapLayers([self.layer] + self.displayLayers)
+        self.layerIds = [layer.id() for layer in [self.layer] + self.displayLayers]
+        self.transactionGroup = QgsTransactionGroup()
+        self.assertTrue(self.transactionGroup.addLayer(self.layer))
+
+        QgsExpressionContextUtils.setProjectVariable(QgsProject.instance(), 'MaterialiseDisplayGeometry', 'true')
+        TOMsParamsSnapshot().refresh()
+
+        # record the restrictions to be (re)generated rather than generating them
+        self.materialised = []
+        self.removed = []
+        self.materialiser = TOMsDisplayGeometryMaterialiser()
+        self.materialiser.materialiseLayer = lambda layer, geometryIDs=None: self.materialised.append(geometryIDs)
+        self.materialiser.removeFeatures = lambda layer, geometryIDs: self.removed.append(sorted(geometryIDs))
+
+    def tearDown(self):
+        self.materialiser.unwatchLayers()
+        del self.materialiser.materialiseLayer
+        del self.materialiser.removeFeatures
+
+        QgsExpressionContextUtils.removeProjectVariable(QgsProject.instance(), 'MaterialiseDisplayGeometry')
+        TOMsParamsSnapshot().refresh()
+        QgsProject.instance().removeMapLayers([layerId for layerId in self.layerIds
+                                               if QgsProject.instance().mapLayer(layerId) is not None])
+
+    def test_transaction_group_changes(self):
+        self.materialiser.watchLayer(self.layer)
+        self.assertEqual(self.materialised, [None])   # companion layers are empty
+        self.materialised.clear()
+
+        self.assertTrue(self.layer.startEditing())
+        fid = next(self.layer.getFeatures()).id()
+        self.layer.changeGeometry(fid, QgsGeometry.fromWkt('LineString(0 1, 10 1)'))
+        feature = QgsFeature(self.layer.fields())
+        feature.setAttributes([None, 'c'])
+        feature.setGeometry(QgsGeometry.fromWkt('LineString(0 5, 10 5)'))
+        self.layer.addFeature(feature)
+        newFid = [currFeature.id() for currFeature in self.layer.getFeatures() if currFeature['GeometryID'] == 'c'][0]
+
+        # nothing until the changes are committed
+        self.assertEqual(self.materialised, [])
+
+        self.assertTrue(self.layer.commitChanges())
+        self.assertEqual([sorted(geometryIDs) for geometryIDs in self.materialised], [['a', 'c']])
+
+        self.materialised.clear()
+        self.assertTrue(self.layer.startEditing())
+        self.layer.deleteFeature(newFid)
+        self.assertTrue(self.layer.rollBack())
+        self.assertTrue(self.layer.startEditing())
+        self.layer.deleteFeature(fid)
+        self.assertTrue(self.layer.commitChanges())
+        self.assertEqual(self.removed, [['a']])
+        self.assertEqual(self.materialised, [])
+
+    def test_changed_key(self):
+        self.materialiser.watchLayer(self.layer)
+        self.materialised.clear()
+
+        self.assertTrue(self.layer.startEditing())
+        fid = next(self.layer.getFeatures()).id()
+        self.layer.changeAttributeValue(fid, self.layer.fields().indexFromName('GeometryID'), 'b')
+        self.assertTrue(self.layer.commitChanges())
+
+        self.assertEqual(self.removed, [['a']])
+        self.assertEqual(self.materialised, [['b']])
+
+    def test_without_companion_layers(self):
+        QgsProject.instance().removeMapLayers([layer.id() for layer in self.displayLayers])
+
+        self.materialiser.watchLayer(self.layer)
+        self.assertEqual(self.materialiser.displayLayers(self.layer), [])
+        self.assertEqual(self.materialised, [])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsDisplayGeometryMaterialiserTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
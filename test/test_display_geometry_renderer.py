@@ -0,0 +1,127 @@
+# coding=utf-8
+"""Tests for the display geometry renderer and the conversion of the styles to use it.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import tempfile
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsExpressionContextUtils,
+    QgsFeatureRenderer,
+    QgsProject,
+    QgsReadWriteContext,
+    QgsVectorLayer
+)
+from qgis.PyQt.QtXml import QDomDocument
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+TOMsDisplayGeometryRenderer = importlib.import_module(PLUGIN + '.core.TOMsDisplayGeometryRenderer')
+TOMsStyleConverter = TOMsDisplayGeometryRenderer.TOMsStyleConverter
+TOMsParamsSnapshot = importlib.import_module(PLUGIN + '.restrictionTypeUtilsClass').TOMsParamsSnapshot
+
+STYLE_DIR = os.path.join(PLUGIN_DIR, 'StyleTemplates')
+
+
+class TOMsDisplayGeometryRendererTest(unittest.TestCase):
+    """Conversion of the styles and saving/loading the renderer"""
+
+    @classmethod
+    def setUpClass(cls):
+        TOMsDisplayGeometryRenderer.registerRenderer()
+
+    def test_convert_expression(self):
+        expression = 'generate_display_geometry("RestrictionTypeID", "GeomShapeID", "AzimuthToRoadCentreLine", @BayOffsetFromKerb, @BayWidth)'
+        converted = TOMsStyleConverter.convertExpression(expression)
+
+        self.assertEqual(converted, 'coalesce(@toms_display_geometry, {})'.format(expression))
+        self.assertIsNone(TOMsStyleConverter.convertExpression(converted))
+        self.assertIsNone(TOMsStyleConverter.convertExpression('buffer($geometry, 1)'))
+
+    def test_convert_qml(self):
+        with open(os.path.join(STYLE_DIR, 'TOMs_Bays.qml'), encoding='utf-8') as qmlFile:
+            qml = qmlFile.read()
+
+        converted = TOMsStyleConverter.convertQml(qml)
+
+        self.assertNotIn('v="generate_display_geometry', converted)
+        self.assertEqual(converted.count('coalesce(@toms_display_geometry'), qml.count('v="generate_display_geometry'))
+        self.assertEqual(TOMsStyleConverter.convertQml(converted), converted)
+
+        document = QDomDocument()
+        self.assertTrue(document.setContent(converted)[0])
+        renderer = QgsFeatureRenderer.load(document.documentElement().firstChildElement('renderer-v2'), QgsReadWriteContext())
+        self.assertEqual(renderer.type(), TOMsDisplayGeometryRenderer.TOMsDisplayGeometryRenderer.RENDERER_TYPE)
+        self.assertEqual(renderer.embeddedRenderer().type(), 'RuleRenderer')
+        self.assertTrue(renderer.orderByEnabled())
+
+    def test_convert_and_restore_layer(self):
+        layer = QgsVectorLayer('LineString?crs=epsg:27700&field=GeometryID:string&field=RestrictionTypeID:integer'
+                               '&field=GeomShapeID:integer&field=AzimuthToRoadCentreLine:double', 'Bays', 'memory')
+        message, status = layer.loadNamedStyle(os.path.join(STYLE_DIR, 'TOMs_Lines.qml'))
+        self.assertTrue(status, message)
+
+        self.assertTrue(TOMsStyleConverter.convertLayer(layer))
+        self.assertFalse(TOMsStyleConverter.convertLayer(layer))
+
+        document = QDomDocument()
+        element = layer.renderer().save(document, QgsReadWriteContext())
+        reloaded = QgsFeatureRenderer.load(element, QgsReadWriteContext())
+        self.assertEqual(reloaded.type(), layer.renderer().type())
+
+        self.assertTrue(TOMsStyleConverter.restoreLayer(layer))
+        self.assertEqual(layer.renderer().type(), 'RuleRenderer')
+
+    def test_is_enabled(self):
+        project = QgsProject.instance()
+
+        QgsExpressionContextUtils.setProjectVariable(project, 'UseDisplayGeometryRenderer', 'true')
+        TOMsParamsSnapshot().refresh()
+        self.assertTrue(TOMsStyleConverter.isEnabled())
+
+        QgsExpressionContextUtils.removeProjectVariable(project, 'UseDisplayGeometryRenderer')
+        TOMsParamsSnapshot().refresh()
+        self.assertFalse(TOMsStyleConverter.isEnabled())
+
+    def test_project_saved_without_renderer(self):
+        layer = QgsVectorLayer('LineString?crs=epsg:27700&field=GeometryID:string&field=RestrictionTypeID:integer'
+                               '&field=GeomShapeID:integer&field=AzimuthToRoadCentreLine:double', 'Lines', 'memory')
+        message, status = layer.loadNamedStyle(os.path.join(STYLE_DIR, 'TOMs_Lines.qml'))
+        self.assertTrue(status, message)
+        self.assertTrue(TOMsStyleConverter.convertLayer(layer))
+
+        project = QgsProject.instance()
+        project.addMapLayer(layer)
+        try:
+            fileName = os.path.join(tempfile.mkdtemp(), 'TOMs.qgs')
+            self.assertTrue(project.write(fileName))
+
+            with open(fileName, encoding='utf-8') as projectFile:
+                projectXml = projectFile.read()
+            self.assertNotIn(TOMsDisplayGeometryRenderer.TOMsDisplayGeometryRenderer.RENDERER_TYPE, projectXml)
+            self.assertIn('type="RuleRenderer"', projectXml)
+
+            # the layer is still drawn with the renderer
+            self.assertEqual(layer.renderer().type(), TOMsDisplayGeometryRenderer.TOMsDisplayGeometryRenderer.RENDERER_TYPE)
+        finally:
+            project.removeMapLayer(layer.id())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsDisplayGeometryRendererTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
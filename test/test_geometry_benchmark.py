@@ -0,0 +1,215 @@
+# coding=utf-8
+"""Benchmark for the display geometry generation (ElementGeometryFactory and the legacy getDisplayGeometry).
+
+Synthetic restrictions are generated for every RestrictionGeometryTypes value (with different numbers of vertices,
+NrBays and orientations) and the geometries generated without a GUI. The throughput (features per second) and memory
+allocated are reported for each type.
+
+Throughput is compared against the baseline in geometry_benchmark_baseline.json. To reduce the effect of the machine
+used, throughput is held relative to a fixed pure Python workload. A test fails if the relative throughput for a type
+drops by more than TOMS_BENCHMARK_THRESHOLD (default 0.25, i.e., 25%) from the baseline. The comparison fails if there
+is no baseline, or no value within it for a type - the baseline is recorded (on the machine used to run the benchmark)
+with TOMS_BENCHMARK_UPDATE=1.
+
+The benchmark takes a while, so it is only run when TOMS_BENCHMARK is set.
+
+Environment variables:
+    TOMS_BENCHMARK=1              run the benchmark
+    TOMS_BENCHMARK_UPDATE=1       record the current results as the baseline (then commit the baseline file)
+    TOMS_BENCHMARK_THRESHOLD=0.3  allowed drop in throughput
+    TOMS_BENCHMARK_ROUNDS=5       number of times each set of features is generated (best time is used)
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import importlib
+import tracemalloc
+import unittest
+
+from qgis.core import (
+    QgsGeometry,
+    QgsPointXY
+)
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+constants = importlib.import_module(PLUGIN + '.constants')
+TOMsGeometryElement = importlib.import_module(PLUGIN + '.core.TOMsGeometryElement')
+generateGeometryUtils = importlib.import_module(PLUGIN + '.generateGeometryUtils').generateGeometryUtils
+utilities = importlib.import_module(PLUGIN + '.test.utilities')
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geometry_benchmark_baseline.json')
+
+THRESHOLD = float(os.environ.get('TOMS_BENCHMARK_THRESHOLD', 0.25))
+ROUNDS = int(os.environ.get('TOMS_BENCHMARK_ROUNDS', 5))
+UPDATE_BASELINE = os.environ.get('TOMS_BENCHMARK_UPDATE', '0') == '1'
+RUN_BENCHMARK = os.environ.get('TOMS_BENCHMARK', '0') == '1' or UPDATE_BASELINE
+
+PARAMS = utilities.GEOMETRY_PARAMS
+
+VERTEX_COUNTS = [2, 10, 50]
+NR_BAYS = [-1, 1, 6]
+ORIENTATIONS = [None, 45]
+AZIMUTHS_TO_CENTRE_LINE = [10.0, 190.0]
+
+
+def restrictionGeometryTypes():
+    return sorted(value for (name, value) in vars(constants.RestrictionGeometryTypes).items()
+                  if not name.startswith('_'))
+
+
+def kerbLine(nrVertices, seed):
+    # gently curving kerb line, about 6 m between vertices
+    points = []
+    for i in range(nrVertices):
+        angle = 0.05 * i + 0.3 * seed
+        points.append(QgsPointXY(1000.0 + 6.0 * i * math.cos(angle), 2000.0 + 6.0 * i * math.sin(angle) + seed))
+    return QgsGeometry.fromPolylineXY(points)
+
+
+def makeFeatures(geomShapeID):
+
+    features = []
+    fid = 0
+    for nrVertices in VERTEX_COUNTS:
+        for nrBays in NR_BAYS:
+            for orientation in ORIENTATIONS:
+                for azimuthToCentreLine in AZIMUTHS_TO_CENTRE_LINE:
+                    fid = fid + 1
+                    features.append(utilities.makeRestriction(kerbLine(nrVertices, fid), geomShapeID, azimuthToCentreLine,
+                                                              nrBays, orientation, fid, 'B{}'.format(fid)))
+
+    return features
+
+
+def calibrate():
+    """ Returns the operations per second for a fixed pure Python workload (best of ROUNDS) """
+
+    best = None
+    for i in range(ROUNDS):
+        start = time.perf_counter()
+        total = 0.0
+        for j in range(200000):
+            total = total + math.sin(j) * math.cos(j)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return 200000 / best
+
+
+def measure(function, features):
+    """ Returns (features per second (best of ROUNDS), bytes allocated, nr of errors) """
+
+    errors = 0
+    best = None
+    for i in range(ROUNDS):
+        start = time.perf_counter()
+        for feature in features:
+            try:
+                function(feature)
+            except Exception:
+                errors = errors + 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    for feature in features:
+        try:
+            function(feature)
+        except Exception:
+            pass
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return len(features) / best, peak, errors // ROUNDS
+
+
+def legacyDisplayGeometry(feature):
+    return generateGeometryUtils.getDisplayGeometry(feature, feature.attribute('GeomShapeID'),
+                                                    PARAMS['BayOffsetFromKerb'], PARAMS['BayWidth'],
+                                                    feature.attribute('BayOrientation'),
+                                                    feature.attribute('AzimuthToRoadCentreLine'))
+
+
+@unittest.skipUnless(RUN_BENCHMARK, 'set TOMS_BENCHMARK=1 to run the geometry benchmark')
+class TOMsGeometryBenchmark(unittest.TestCase):
+    """Throughput of the display geometry generation for each restriction geometry type"""
+
+    @classmethod
+    def setUpClass(cls):
+        utilities.setProjectVariables(PARAMS)
+
+        cls.calibration = calibrate()
+        cls.results = dict()
+
+        for geomShapeID in restrictionGeometryTypes():
+            features = makeFeatures(geomShapeID)
+            for (name, function) in [('factory', TOMsGeometryElement.ElementGeometryFactory.getElementGeometry),
+                                     ('legacy', legacyDisplayGeometry)]:
+                throughput, allocated, errors = measure(function, features)
+                cls.results['{}:{}'.format(name, geomShapeID)] = {'throughput': throughput,
+                                                                   'relative': throughput / cls.calibration,
+                                                                   'allocated': allocated,
+                                                                   'errors': errors}
+
+        cls.report()
+
+        if UPDATE_BASELINE:
+            with open(BASELINE_FILE, 'w') as baselineFile:
+                json.dump(dict((key, {'relative': result['relative']}) for (key, result) in cls.results.items()),
+                          baselineFile, indent=2, sort_keys=True)
+                baselineFile.write('\n')
+
+    @classmethod
+    def report(cls):
+        sys.stderr.write('\nGeometry benchmark (calibration {:.0f} ops/s)\n'.format(cls.calibration))
+        sys.stderr.write('{:<12}{:>14}{:>12}{:>14}{:>8}\n'.format('type', 'features/s', 'relative', 'peak bytes', 'errors'))
+        for (key, result) in sorted(cls.results.items()):
+            sys.stderr.write('{:<12}{:>14.0f}{:>12.6f}{:>14}{:>8}\n'.format(key, result['throughput'], result['relative'],
+                                                                           result['allocated'], result['errors']))
+
+    def test_factory_generates_all_types(self):
+        for geomShapeID in restrictionGeometryTypes():
+            self.assertEqual(self.results['factory:{}'.format(geomShapeID)]['errors'], 0, geomShapeID)
+
+    def test_throughput_against_baseline(self):
+        self.assertTrue(os.path.exists(BASELINE_FILE),
+                        'no baseline - record one with TOMS_BENCHMARK_UPDATE=1 and commit {}'.format(BASELINE_FILE))
+
+        if UPDATE_BASELINE:
+            self.skipTest('baseline updated')
+
+        with open(BASELINE_FILE) as baselineFile:
+            baseline = json.load(baselineFile)
+
+        recorded = dict((key, value.get('relative')) for (key, value) in baseline.items())
+        missing = sorted(key for key in self.results if recorded.get(key) is None)
+        self.assertEqual(missing, [], 'no throughput within the baseline - record it with TOMS_BENCHMARK_UPDATE=1')
+
+        regressions = []
+        for (key, result) in sorted(self.results.items()):
+            expected = recorded[key]
+            if result['relative'] < expected * (1.0 - THRESHOLD):
+                regressions.append('{}: {:.6f} (baseline {:.6f})'.format(key, result['relative'], expected))
+
+        self.assertEqual(regressions, [], 'throughput has dropped by more than {:.0%}'.format(THRESHOLD))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsGeometryBenchmark)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,61 @@
+# coding=utf-8
+"""Tests for the display geometry generation on plain coordinates (no QGIS needed).
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import importlib
+import unittest
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+constants = importlib.import_module(PLUGIN + '.constants')
+TOMsGeometryCore = importlib.import_module(PLUGIN + '.core.TOMsGeometryCore')
+
+BAY_WIDTH = 2.0
+BAY_OFFSET_FROM_KERB = 0.25
+
+
+class TOMsGeometryCoreTest(unittest.TestCase):
+    """Shapes generated from plain coordinates (the display geometry types are tested through ElementGeometryFactory)"""
+
+    def assertPointsAlmostEqual(self, points, expected):
+        self.assertEqual(len(points), len(expected))
+        for (pt, expectedPt) in zip(points, expected):
+            self.assertAlmostEqual(pt[0], expectedPt[0], places=6)
+            self.assertAlmostEqual(pt[1], expectedPt[1], places=6)
+
+    def test_parallel_bay_golden(self):
+        shape, parallel = TOMsGeometryCore.getShape([(0.0, 0.0), (10.0, 0.0)], BAY_WIDTH, 0.0, BAY_OFFSET_FROM_KERB,
+                                                    constants.RestrictionGeometryTypes.PARALLEL_BAY, 0)
+        self.assertPointsAlmostEqual(shape, [(0, 0.25), (0, 2), (10, 2), (10, 0.25)])
+        self.assertPointsAlmostEqual(parallel, [(0, 0.25), (10, 0.25)])
+
+    def test_parallel_line_golden(self):
+        shape, parallel = TOMsGeometryCore.getShape([(0.0, 0.0), (10.0, 0.0)], BAY_OFFSET_FROM_KERB, 0.0,
+                                                    BAY_OFFSET_FROM_KERB,
+                                                    constants.RestrictionGeometryTypes.PARALLEL_LINE, 0)
+        self.assertPointsAlmostEqual(parallel, [(0, 0.25), (10, 0.25)])
+
+    def test_zigzag_golden(self):
+        coords = TOMsGeometryCore.getZigZag([[(0.0, 0.0), (12.0, 0.0)]], 0.0, BAY_OFFSET_FROM_KERB, BAY_WIDTH / 2)
+        self.assertPointsAlmostEqual(coords, [(0, 0.25), (0, 1), (1.5, 0.25), (3, 1), (4.5, 0.25), (6, 1),
+                                              (7.5, 0.25), (9, 1), (10.5, 0.25), (12, 1), (12, 0.25)])
+
+    def test_short_line(self):
+        with self.assertRaises(ValueError):
+            TOMsGeometryCore.getShape([(0.0, 0.0)], 2.0, 0.0, 0.25, constants.RestrictionGeometryTypes.PARALLEL_BAY, 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsGeometryCoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
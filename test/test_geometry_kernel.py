@@ -0,0 +1,161 @@
+# coding=utf-8
+"""Tests that the vectorised geometry kernel gives the same shapes (and zig-zags) as the original vertex loops.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsGeometry
+)
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+constants = importlib.import_module(PLUGIN + '.constants')
+TOMsGeometryElement = importlib.import_module(PLUGIN + '.core.TOMsGeometryElement')
+TOMsGeometryKernel = importlib.import_module(PLUGIN + '.core.TOMsGeometryKernel')
+generateGeometryUtils = importlib.import_module(PLUGIN + '.generateGeometryUtils').generateGeometryUtils
+utilities = importlib.import_module(PLUGIN + '.test.utilities')
+
+LINES = ['LineString (0 0, 10 0)',
+         'LineString (0 0, 10 0, 20 5)',
+         'LineString (100 100, 104 107, 110 109, 118 108, 121 101, 120 90)',
+         'LineString (5 5, 4 15, 6 25, 5 35)',
+         'MultiLineString ((0 0, 12 3, 30 3),(50 50, 60 60))'
+         ]
+
+AZIMUTHS_TO_CENTRE_LINE = [0.0, 95.0, 181.0, 300.0]
+
+ORIENTATIONS = [None, 45, '30']
+
+TOLERANCE = 1e-9
+
+
+def restrictionGeometryTypes():
+    return [value for (name, value) in vars(constants.RestrictionGeometryTypes).items()
+            if not name.startswith('_')]
+
+
+def makeFeature(wkt, geomShapeID, azimuthToCentreLine, orientation):
+    return utilities.makeRestriction(wkt, geomShapeID, azimuthToCentreLine, 4, orientation)
+
+
+class TOMsGeometryKernelTest(unittest.TestCase):
+    """Compare the NumPy kernel against the original loop in TOMsGeometryElement.getShape"""
+
+    @classmethod
+    def setUpClass(cls):
+        utilities.setProjectVariables(utilities.GEOMETRY_PARAMS)
+
+    def tearDown(self):
+        TOMsGeometryElement.TOMsGeometryElement.useGeometryKernel = TOMsGeometryKernel.HAS_NUMPY
+
+    def generate(self, feature, useKernel):
+        TOMsGeometryElement.TOMsGeometryElement.useGeometryKernel = useKernel
+        return TOMsGeometryElement.ElementGeometryFactory.getElementGeometry(feature)
+
+    def assertSameGeometry(self, expected, actual, message):
+        if not isinstance(expected, QgsGeometry):
+            self.assertEqual(expected, actual, message)
+            return
+        expectedVertices = [(pt.x(), pt.y()) for pt in expected.vertices()]
+        actualVertices = [(pt.x(), pt.y()) for pt in actual.vertices()]
+        self.assertEqual(len(expectedVertices), len(actualVertices), message)
+        for (expectedPt, actualPt) in zip(expectedVertices, actualVertices):
+            self.assertAlmostEqual(expectedPt[0], actualPt[0], delta=TOLERANCE, msg=message)
+            self.assertAlmostEqual(expectedPt[1], actualPt[1], delta=TOLERANCE, msg=message)
+
+    @unittest.skipUnless(TOMsGeometryKernel.HAS_NUMPY, 'numpy not available')
+    def test_kernel_matches_loop_for_all_geometry_types(self):
+        for geomShapeID in restrictionGeometryTypes():
+            for wkt in LINES:
+                for azimuthToCentreLine in AZIMUTHS_TO_CENTRE_LINE:
+                    for orientation in ORIENTATIONS:
+                        feature = makeFeature(wkt, geomShapeID, azimuthToCentreLine, orientation)
+                        message = '{} {} {} {}'.format(geomShapeID, wkt, azimuthToCentreLine, orientation)
+                        self.assertSameGeometry(self.generate(feature, False), self.generate(feature, True), message)
+
+    def test_factory_generates_all_geometry_types(self):
+        for geomShapeID in restrictionGeometryTypes():
+            for useKernel in set([False, TOMsGeometryKernel.HAS_NUMPY]):
+                feature = makeFeature(LINES[1], geomShapeID, 190.0, 45)
+                self.assertIsNotNone(self.generate(feature, useKernel), geomShapeID)
+
+    def test_shape_golden(self):
+        # straight kerb line running east with the centre line to the north
+        feature = makeFeature('LineString (0 0, 10 0)', constants.RestrictionGeometryTypes.PARALLEL_BAY, 0.0, None)
+        expectedShape = [(0, 0.25), (0, 2), (10, 2), (10, 0.25)]
+        expectedParallel = [(0, 0.25), (10, 0.25)]
+
+        for useKernel in set([False, TOMsGeometryKernel.HAS_NUMPY]):
+            TOMsGeometryElement.TOMsGeometryElement.useGeometryKernel = useKernel
+            element = TOMsGeometryElement.generatedGeometryBayLineType(feature)
+            shape, parallelLine = element.getShape()
+            self.assertEqual([(pt.x(), pt.y()) for pt in shape.vertices()], expectedShape)
+            self.assertEqual([(pt.x(), pt.y()) for pt in parallelLine.vertices()], expectedParallel)
+
+    @unittest.skipUnless(TOMsGeometryKernel.HAS_NUMPY, 'numpy not available')
+    def test_zigzag_kernel_matches_loop(self):
+        lines = LINES + ['LineString (0 0, 0.5 0, 0.5 0, 7 3, 30 -2, 31 40)',
+                         'LineString (200 200, 230 240)']
+        for wkt in lines:
+            for azimuthToCentreLine in AZIMUTHS_TO_CENTRE_LINE:
+                for wavelength in [None, 2.0, 3.7]:
+                    feature = makeFeature(wkt, constants.RestrictionGeometryTypes.ZIG_ZAG, azimuthToCentreLine, None)
+                    message = '{} {} {}'.format(wkt, azimuthToCentreLine, wavelength)
+
+                    zigzags = []
+                    for useKernel in [False, True]:
+                        TOMsGeometryElement.TOMsGeometryElement.useGeometryKernel = useKernel
+                        zigzags.append(TOMsGeometryElement.generatedGeometryZigZagType(feature).getZigZag(wavelength))
+                    self.assertSameGeometry(zigzags[0], zigzags[1], message)
+
+    def test_zigzag_golden(self):
+        # straight kerb line running east with the centre line to the north
+        feature = makeFeature('LineString (0 0, 12 0)', constants.RestrictionGeometryTypes.ZIG_ZAG, 0.0, None)
+        expected = [(0, 0.25), (0, 1), (1.5, 0.25), (3, 1), (4.5, 0.25), (6, 1), (7.5, 0.25), (9, 1),
+                    (10.5, 0.25), (12, 1), (12, 0.25)]
+
+        for useKernel in set([False, TOMsGeometryKernel.HAS_NUMPY]):
+            TOMsGeometryElement.TOMsGeometryElement.useGeometryKernel = useKernel
+            zigzag = TOMsGeometryElement.generatedGeometryZigZagType(feature).getZigZag()
+            actual = [(pt.x(), pt.y()) for pt in zigzag.vertices()]
+            self.assertEqual(len(expected), len(actual))
+            for (expectedPt, actualPt) in zip(expected, actual):
+                self.assertAlmostEqual(expectedPt[0], actualPt[0], delta=TOLERANCE)
+                self.assertAlmostEqual(expectedPt[1], actualPt[1], delta=TOLERANCE)
+
+    def test_legacy_zigzag_matches_factory(self):
+        # generate_ZigZag uses the legacy function - with the same parameters as the factory
+        feature = makeFeature('LineString (0 0, 12 0, 20 6)', constants.RestrictionGeometryTypes.ZIG_ZAG, 181.0, None)
+        params = utilities.GEOMETRY_PARAMS
+
+        TOMsGeometryElement.TOMsGeometryElement.useGeometryKernel = False
+        expected = TOMsGeometryElement.generatedGeometryZigZagType(feature).getZigZag(3.0)
+        actual = generateGeometryUtils.zigzag(feature, 3.0, params['BayWidth'] / 2 - params['BayOffsetFromKerb'])
+        self.assertSameGeometry(expected, actual, 'legacy zigzag')
+
+    @unittest.skipUnless(TOMsGeometryKernel.HAS_NUMPY, 'numpy not available')
+    def test_line_coordinates(self):
+        coords = TOMsGeometryKernel.lineCoordinates(QgsGeometry.fromWkt(LINES[4]))
+        self.assertEqual(coords.tolist(), [[0, 0], [12, 3], [30, 3]])
+        self.assertIsNone(TOMsGeometryKernel.lineCoordinates(QgsGeometry.fromWkt('Point (1 1)')))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsGeometryKernelTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
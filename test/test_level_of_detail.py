@@ -0,0 +1,88 @@
+# coding=utf-8
+"""Tests for the scale dependent level of detail of the display geometry.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsExpressionContext,
+    QgsExpressionContextScope,
+    QgsWkbTypes
+)
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+constants = importlib.import_module(PLUGIN + '.constants')
+TOMsGeometryElement = importlib.import_module(PLUGIN + '.core.TOMsGeometryElement')
+generateGeometryUtils = importlib.import_module(PLUGIN + '.generateGeometryUtils').generateGeometryUtils
+utilities = importlib.import_module(PLUGIN + '.test.utilities')
+
+DisplayLevelOfDetail = constants.DisplayLevelOfDetail
+
+PARAMS = dict(utilities.GEOMETRY_PARAMS, SimplifiedGeometryDisplayScale=5000, KerbLineGeometryDisplayScale=10000)
+
+
+def makeContext(scale, **variables):
+    scope = QgsExpressionContextScope()
+    scope.setVariable('map_scale', scale)
+    for (name, value) in variables.items():
+        scope.setVariable(name, value)
+    context = QgsExpressionContext()
+    context.appendScope(scope)
+    return context
+
+
+class TOMsLevelOfDetailTest(unittest.TestCase):
+    """Level of detail from the scale and the geometry generated for it"""
+
+    @classmethod
+    def setUpClass(cls):
+        utilities.setProjectVariables(PARAMS)
+
+    def test_level_from_scale(self):
+        self.assertEqual(generateGeometryUtils.getDisplayLevelOfDetail(None), DisplayLevelOfDetail.FULL)
+        self.assertEqual(generateGeometryUtils.getDisplayLevelOfDetail(makeContext(1000)), DisplayLevelOfDetail.FULL)
+        self.assertEqual(generateGeometryUtils.getDisplayLevelOfDetail(makeContext(7500)), DisplayLevelOfDetail.SIMPLIFIED)
+        self.assertEqual(generateGeometryUtils.getDisplayLevelOfDetail(makeContext(25000)), DisplayLevelOfDetail.KERB_LINE)
+
+    def test_layout_forces_full_detail(self):
+        self.assertEqual(generateGeometryUtils.getDisplayLevelOfDetail(makeContext(25000, layout_name='A3')),
+                         DisplayLevelOfDetail.FULL)
+        self.assertEqual(generateGeometryUtils.getDisplayLevelOfDetail(makeContext(25000, layout_name='A3', ForceFullDetail=False)),
+                         DisplayLevelOfDetail.KERB_LINE)
+        self.assertEqual(generateGeometryUtils.getDisplayLevelOfDetail(makeContext(25000, ForceFullDetail=True)),
+                         DisplayLevelOfDetail.FULL)
+
+    def test_zigzag_as_kerb_line(self):
+        feature = utilities.makeRestriction('LineString (0 0, 12 0)', constants.RestrictionGeometryTypes.ZIG_ZAG)
+        geometry = TOMsGeometryElement.ElementGeometryFactory.getElementGeometry(feature, DisplayLevelOfDetail.SIMPLIFIED)
+
+        self.assertEqual([(pt.x(), pt.y()) for pt in geometry.vertices()], [(0, 0.25), (0, 0.25), (12, 0.25), (12, 0.25)])
+
+    def test_polygon_remains_polygon(self):
+        feature = utilities.makeRestriction('LineString (0 0, 10 0.01, 20 0, 30 0.01, 40 0)', constants.RestrictionGeometryTypes.PARALLEL_BAY_POLYGON)
+        full = TOMsGeometryElement.ElementGeometryFactory.getElementGeometry(feature)
+        simplified = TOMsGeometryElement.ElementGeometryFactory.getElementGeometry(feature, DisplayLevelOfDetail.KERB_LINE)
+
+        self.assertEqual(simplified.type(), QgsWkbTypes.PolygonGeometry)
+        self.assertLess(len(list(simplified.vertices())), len(list(full.vertices())))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsLevelOfDetailTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Tests for the subset strings used to show the restrictions for a date and proposal.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsVectorLayer
+)
+from qgis.PyQt.QtCore import QDate
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+TOMsProposalFilter = importlib.import_module(PLUGIN + '.core.TOMsProposalFilter').TOMsProposalFilter
+
+CONNECTION = "dbname='toms' host=localhost port=5432 sslmode=disable"
+
+
+def postgresLayer(table, connection=CONNECTION):
+    return QgsVectorLayer('{} key=\'id\' table="toms"."{}"'.format(connection, table), table, 'postgres')
+
+
+class Proposal(object):
+
+    def getProposalNr(self):
+        return 3
+
+    def getRestrictionsToOpenForLayer(self, layerID):
+        return "'a','b'"
+
+    def getRestrictionsToCloseForLayer(self, layerID):
+        return "'c'"
+
+
+class TOMsProposalFilterTest(unittest.TestCase):
+    """Subquery and list based filters"""
+
+    def setUp(self):
+        self.date = QDate(2020, 4, 1)
+        self.dateFilter = TOMsProposalFilter.dateFilter(self.date)
+
+    def test_no_proposal(self):
+        proposalFilter = TOMsProposalFilter(postgresLayer('RestrictionsInProposals'))
+        self.assertEqual(proposalFilter.layerFilter(postgresLayer('Bays'), 2, self.date), self.dateFilter)
+
+    def test_subquery(self):
+        proposalFilter = TOMsProposalFilter(postgresLayer('RestrictionsInProposals'))
+        filterString = proposalFilter.layerFilter(postgresLayer('Bays'), 2, self.date, Proposal())
+
+        self.assertEqual(filterString,
+                         '"RestrictionID" IN (SELECT "RestrictionID" FROM "toms"."RestrictionsInProposals" WHERE "ProposalID" = 3 '
+                         'AND "RestrictionTableID" = 2 AND "ActionOnProposalAcceptance" = 1) OR ({} AND "RestrictionID" NOT IN '
+                         '(SELECT "RestrictionID" FROM "toms"."RestrictionsInProposals" WHERE "ProposalID" = 3 '
+                         'AND "RestrictionTableID" = 2 AND "ActionOnProposalAcceptance" = 2))'.format(self.dateFilter))
+
+    def test_list_fallback(self):
+        expected = '"RestrictionID" IN (\'a\',\'b\') OR ({} AND "RestrictionID" NOT IN (\'c\'))'.format(self.dateFilter)
+
+        # companion layer held in memory
+        proposalFilter = TOMsProposalFilter(postgresLayer('RestrictionsInProposals'))
+        memoryLayer = QgsVectorLayer('LineString?field=RestrictionID:string', 'Bays_DisplayLines', 'memory')
+        self.assertEqual(proposalFilter.layerFilter(memoryLayer, 2, self.date, Proposal()), expected)
+
+        # different database
+        otherLayer = postgresLayer('Bays', "dbname='other' host=localhost port=5432 sslmode=disable")
+        self.assertEqual(proposalFilter.layerFilter(otherLayer, 2, self.date, Proposal()), expected)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsProposalFilterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
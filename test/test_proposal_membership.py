@@ -0,0 +1,88 @@
+# coding=utf-8
+"""Tests for the in memory index of the restrictions within a proposal.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import importlib
+import unittest
+
+from qgis.core import (
+    QgsFeature,
+    QgsVectorLayer
+)
+from qgis.testing import start_app
+
+start_app()
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+PLUGIN = os.path.basename(PLUGIN_DIR)
+
+TOMsProposalMembership = importlib.import_module(PLUGIN + '.core.TOMsProposalMembership').TOMsProposalMembership
+
+
+def addRow(layer, proposalID, layerID, restrictionID, action):
+    row = QgsFeature(layer.fields())
+    row.setAttributes([proposalID, layerID, restrictionID, action])
+    layer.addFeature(row)
+    return row
+
+
+class TOMsProposalMembershipTest(unittest.TestCase):
+    """Loading the proposal and following edits to RestrictionsInProposals"""
+
+    def setUp(self):
+        self.layer = QgsVectorLayer('None?field=ProposalID:integer&field=RestrictionTableID:integer'
+                                    '&field=RestrictionID:string&field=ActionOnProposalAcceptance:integer',
+                                    'RestrictionsInProposals', 'memory')
+        self.layer.startEditing()
+        addRow(self.layer, 3, 2, 'a', 1)
+        addRow(self.layer, 3, 2, 'b', 2)
+        addRow(self.layer, 3, 3, 'c', 1)
+        addRow(self.layer, 4, 2, 'd', 1)
+        self.layer.commitChanges()
+
+        self.membership = TOMsProposalMembership(self.layer, 3)
+
+    def tearDown(self):
+        self.membership.release()
+
+    def test_load(self):
+        self.assertEqual(sorted(self.membership.restrictionsForLayer(2)), [('a', 1), ('b', 2)])
+        self.assertEqual(self.membership.restrictionsForLayer(2, 2), [('b', 2)])
+        self.assertEqual(sorted(self.membership.restrictionLayerIDs()), [2, 3])
+        self.assertFalse(self.membership.contains('d', 2))
+
+    def test_edits(self):
+        self.membership.restrictionsForLayer(2)
+
+        self.layer.startEditing()
+        addRow(self.layer, 3, 2, 'e', 2)
+        addRow(self.layer, 4, 2, 'f', 2)
+        self.assertTrue(self.membership.contains('e', 2))
+        self.assertFalse(self.membership.contains('f', 2))
+
+        fid = [row.id() for row in self.layer.getFeatures() if row['RestrictionID'] == 'a'][0]
+        self.layer.changeAttributeValue(fid, self.layer.fields().indexFromName('ActionOnProposalAcceptance'), 2)
+        self.assertEqual(sorted(self.membership.restrictionsForLayer(2, 2)), [('a', 2), ('b', 2), ('e', 2)])
+
+        fid = [row.id() for row in self.layer.getFeatures() if row['RestrictionID'] == 'c'][0]
+        self.layer.deleteFeature(fid)
+        self.assertEqual(self.membership.restrictionLayerIDs(), [2])
+
+        self.layer.rollBack()
+        self.assertEqual(sorted(self.membership.restrictionsForLayer(2)), [('a', 1), ('b', 2)])
+        self.assertEqual(sorted(self.membership.restrictionLayerIDs()), [2, 3])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TOMsProposalMembershipTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
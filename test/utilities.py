@@ -1,8 +1,10 @@
 # coding=utf-8
 """Common functionality used by regression tests."""
 
+import os
 import sys
 import logging
+import importlib
 
 
 LOGGER = logging.getLogger('QGIS')
@@ -59,3 +61,53 @@ def get_qgis_app():
         IFACE = QgisInterface(CANVAS)
 
     return QGIS_APP, CANVAS, IFACE, PARENT
+
+
+# project variables used when generating the display geometry
+GEOMETRY_PARAMS = {'BayWidth': 2.0,
+                   'BayLength': 5.0,
+                   'BayOffsetFromKerb': 0.25,
+                   'LineOffsetFromKerb': 0.3,
+                   'CrossoverShapeWidth': 1.5,
+                   'MinimumTextDisplayScale': 1250
+                   }
+
+
+def pluginModule(name):
+    """ Import a module of the plugin (e.g., 'core.TOMsGeometryElement') - the plugin directory is a package """
+
+    pluginDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if os.path.dirname(pluginDir) not in sys.path:
+        sys.path.insert(0, os.path.dirname(pluginDir))
+    return importlib.import_module(os.path.basename(pluginDir) + '.' + name)
+
+
+def setProjectVariables(params):
+    """ Set the project variables and refresh the TOMs parameters read from them """
+
+    from qgis.core import QgsProject, QgsExpressionContextUtils
+
+    project = QgsProject.instance()
+    for (name, value) in params.items():
+        QgsExpressionContextUtils.setProjectVariable(project, name, value)
+    pluginModule('restrictionTypeUtilsClass').TOMsParamsSnapshot().refresh()
+
+
+def makeRestriction(geometry, geomShapeID, azimuthToCentreLine=0.0, nrBays=-1, orientation=None, fid=1, geometryID='T1'):
+    """ Restriction feature with the fields used to generate its display geometry. geometry is WKT or QgsGeometry """
+
+    from qgis.core import QgsFeature, QgsField, QgsFields, QgsGeometry
+    from qgis.PyQt.QtCore import QVariant
+
+    fields = QgsFields()
+    fields.append(QgsField('GeometryID', QVariant.String))
+    fields.append(QgsField('GeomShapeID', QVariant.Int))
+    fields.append(QgsField('AzimuthToRoadCentreLine', QVariant.Double))
+    fields.append(QgsField('NrBays', QVariant.Int))
+    fields.append(QgsField('BayOrientation', QVariant.String))
+
+    feature = QgsFeature(fields)
+    feature.setId(fid)
+    feature.setGeometry(QgsGeometry.fromWkt(geometry) if isinstance(geometry, str) else geometry)
+    feature.setAttributes([geometryID, geomShapeID, azimuthToCentreLine, nrBays, orientation])
+    return feature